@@ -1,21 +1,196 @@
+import datetime
+import json
+
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, File
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import User, File, Job
+from .search import MAX_QUERY_LENGTH, search_files
+
+
+def estimated_count(queryset):
+    """Число строк по статистике PostgreSQL или None для других СУБД
+
+    Для запроса без условий берется reltuples таблицы, для остальных - оценка
+    планировщика (EXPLAIN). Обе не требуют чтения строк.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 - таблица еще не анализировалась
+        return int(row[0]) if row and row[0] >= 0 else None
+    plan = json.loads(queryset.explain(format="json"))
+    # Драйвер может вернуть как список планов, так и сам план
+    if isinstance(plan, list):
+        plan = plan[0]
+    return int(plan["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки с оценкой числа строк вместо COUNT(*) для больших таблиц
+
+    Если оценка меньше ADMIN_ESTIMATED_COUNT_MIN, строки считаются точно.
+    Число страниц при оценке приблизительное.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_MIN:
+            return estimate
+        return super().count
+
+
+class DateHierarchyQuerySet(QuerySet):
+    """QuerySet, в котором годы, месяцы и дни для date_hierarchy ищутся по индексу
+
+    Вместо DISTINCT по всем строкам каждый следующий период находится запросом
+    "первая дата не раньше начала периода" (ORDER BY ... LIMIT 1 по индексу),
+    поэтому запросов столько, сколько периодов в списке.
+    """
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        if kind not in ("year", "month", "day"):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        dates = self.order_by(field_name).values_list(field_name, flat=True)
+        periods = []
+        value = dates.first()
+        while value is not None:
+            if timezone.is_aware(value):
+                value = timezone.localtime(value, tzinfo)
+            period = truncate_date(value, kind)
+            periods.append(period)
+            value = dates.filter(
+                **{f"{field_name}__gte": next_period(period, kind)}
+            ).first()
+        return periods if order == "ASC" else periods[::-1]
+
+
+def truncate_date(value, kind):
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind in ("year", "month"):
+        value = value.replace(day=1)
+    if kind == "year":
+        value = value.replace(month=1)
+    return value
+
+
+def next_period(period, kind):
+    if kind == "year":
+        return period.replace(year=period.year + 1)
+    if kind == "month":
+        if period.month == 12:
+            return period.replace(year=period.year + 1, month=1)
+        return period.replace(month=period.month + 1)
+    return period + datetime.timedelta(days=1)
+
+
+class UserAutocompleteFilter(admin.SimpleListFilter):
+    """Фильтр по пользователю с поиском вместо списка всех пользователей"""
+
+    title = "пользователю"
+    parameter_name = "user"
+    template = "admin/cloud_storage/autocomplete_filter.html"
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.admin_site = model_admin.admin_site
+
+    def lookups(self, request, model_admin):
+        return []
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        try:
+            return queryset.filter(user_id=int(self.value()))
+        except ValueError:
+            raise IncorrectLookupParameters("Неверный ID пользователя")
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+            "display": "Все",
+        }
+
+    def widget(self):
+        """Поле автодополнения (select2) с выбранным пользователем"""
+        field = forms.ModelChoiceField(
+            User.objects.all(),
+            widget=AutocompleteSelect(
+                File._meta.get_field("user"),
+                self.admin_site,
+                attrs={"data-filter-parameter": self.parameter_name},
+            ),
+        )
+        return field.widget.render(self.parameter_name, self.value())
+
+    @staticmethod
+    def media():
+        widget = AutocompleteSelect(File._meta.get_field("user"), admin.site)
+        return widget.media + forms.Media(
+            js=["admin/js/jquery.init.js", "cloud_storage/admin/autocomplete_filter.js"]
+        )
 
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
-    list_display = ["username", "email", "full_name", "is_admin", "is_active"]
+    list_display = [
+        "username",
+        "email",
+        "full_name",
+        "is_admin",
+        "is_active",
+        "files_count",
+        "storage_used",
+    ]
     list_filter = ["is_admin", "is_active", "is_staff"]
+    readonly_fields = ["files_count", "total_bytes"]
     fieldsets = BaseUserAdmin.fieldsets + (
         (
             "Дополнительная информация",
-            {"fields": ("full_name", "is_admin", "storage_path")},
+            {
+                "fields": (
+                    "full_name",
+                    "is_admin",
+                    "storage_path",
+                    "files_count",
+                    "total_bytes",
+                )
+            },
         ),
     )
     add_fieldsets = BaseUserAdmin.add_fieldsets + (
         ("Дополнительная информация", {"fields": ("full_name", "is_admin")}),
     )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description="Объем файлов", ordering="total_bytes")
+    def storage_used(self, obj):
+        # Счетчики хранятся в строке пользователя - без запросов к файлам
+        return filesizeformat(obj.total_bytes)
 
 
 @admin.register(File)
@@ -27,6 +202,37 @@ class FileAdmin(admin.ModelAdmin):
         "upload_date",
         "last_download_date",
     ]
-    list_filter = ["upload_date", "user"]
+    list_select_related = ["user"]
+    list_filter = ["upload_date", UserAutocompleteFilter]
     search_fields = ["original_name", "comment"]
     readonly_fields = ["special_link", "upload_date", "last_download_date"]
+    autocomplete_fields = ["user"]
+    raw_id_fields = ["blob"]
+    date_hierarchy = "upload_date"
+    # Сортировка только по колонке с индексом (file_upload_date_idx)
+    sortable_by = ["upload_date"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    @property
+    def media(self):
+        return super().media + UserAutocompleteFilter.media()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateHierarchyQuerySet(queryset.model, queryset.query, queryset.db)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексам cloud_storage.search вместо ILIKE по всей таблице
+        if not search_term.strip():
+            return queryset, False
+        return search_files(queryset, search_term[:MAX_QUERY_LENGTH]), False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["name", "status", "priority", "attempts", "run_at", "finished_at"]
+    list_filter = ["status", "name"]
+    search_fields = ["name", "idempotency_key", "last_error"]
+    readonly_fields = ["created_at", "finished_at", "locked_by", "locked_at"]
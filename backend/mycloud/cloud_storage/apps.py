@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CloudStorageConfig(AppConfig):
     name = "cloud_storage"
+
+    def ready(self):
+        from . import metrics, signals, tasks  # noqa: F401
@@ -0,0 +1,157 @@
+"""
+Потоковая упаковка нескольких файлов в ZIP или TAR
+
+Архив формируется на лету блоками по мере отправки клиенту: ни на диске,
+ни в памяти целиком он не собирается. Уже сжатые форматы кладутся в ZIP
+без повторного сжатия.
+
+Размер записи TAR задается в заголовке до содержимого, поэтому файлы, чей
+размер в хранилище расходится с базой, в архив не попадают, а если
+содержимое все же оказалось короче заголовка, поток прерывается: смещенные
+записи испортили бы весь оставшийся архив.
+"""
+
+import logging
+import os
+import tarfile
+import time
+import zipfile
+
+from .storage import get_storage
+
+logger = logging.getLogger("cloud_storage")
+
+# Расширения уже сжатых форматов - повторное сжатие только тратит CPU
+STORED_EXTENSIONS = {
+    ".7z",
+    ".avi",
+    ".bz2",
+    ".docx",
+    ".gif",
+    ".gz",
+    ".jpeg",
+    ".jpg",
+    ".mkv",
+    ".mov",
+    ".mp3",
+    ".mp4",
+    ".ogg",
+    ".png",
+    ".pptx",
+    ".rar",
+    ".webm",
+    ".webp",
+    ".xlsx",
+    ".xz",
+    ".zip",
+    ".zst",
+}
+
+
+class ArchiveSizeMismatch(Exception):
+    """Прочитано не столько байтов файла, сколько указано в заголовке TAR"""
+
+
+class StreamBuffer:
+    """Файлоподобный приемник, из которого забираются записанные байты"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Накопленные байты одним блоком (пустой список, если писать нечего)"""
+        if not self.chunks:
+            return []
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return [data]
+
+
+def archive_entries(files):
+    """(файл, имя в архиве) без дубликатов и разделителей пути"""
+    storage = get_storage()
+    used = set()
+    for file_obj in files:
+        try:
+            size = storage.size(file_obj.file_path)
+        except FileNotFoundError:
+            logger.error("Файл не найден в хранилище: %s", file_obj.file_path)
+            continue
+        if size != file_obj.size:
+            logger.error(
+                "Размер файла в хранилище (%s) не совпадает с базой (%s): %s",
+                size,
+                file_obj.size,
+                file_obj.file_path,
+            )
+            continue
+        name = file_obj.original_name.replace("/", "_").replace("\\", "_")
+        name = name.lstrip(".") or "file"
+        base, extension = os.path.splitext(name)
+        counter = 1
+        while name in used:
+            name = f"{base} ({counter}){extension}"
+            counter += 1
+        used.add(name)
+        yield file_obj, name
+
+
+def read_blocks(file_obj):
+    return get_storage().read_range(file_obj.file_path, 0, file_obj.size - 1)
+
+
+def zip_stream(files):
+    """Генератор ZIP-архива (zip64, дескрипторы данных после содержимого)"""
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", allowZip64=True) as archive:
+        for file_obj, name in archive_entries(files):
+            info = zipfile.ZipInfo(
+                name, date_time=time.localtime(file_obj.upload_date.timestamp())[:6]
+            )
+            extension = os.path.splitext(name)[1].lower()
+            info.compress_type = (
+                zipfile.ZIP_STORED
+                if extension in STORED_EXTENSIONS
+                else zipfile.ZIP_DEFLATED
+            )
+            with archive.open(info, mode="w", force_zip64=True) as destination:
+                for data in read_blocks(file_obj):
+                    destination.write(data)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    yield from buffer.drain()
+
+
+def tar_stream(files):
+    """Генератор TAR-архива (заголовки пишутся вручную, без буферизации файла)"""
+    for file_obj, name in archive_entries(files):
+        info = tarfile.TarInfo(name)
+        info.size = file_obj.size
+        info.mtime = int(file_obj.upload_date.timestamp())
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        written = 0
+        for data in read_blocks(file_obj):
+            written += len(data)
+            yield data
+        if written != info.size:
+            raise ArchiveSizeMismatch(
+                f"{file_obj.file_path}: прочитано {written} байт из {info.size}"
+            )
+        remainder = info.size % tarfile.BLOCKSIZE
+        if remainder:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+ARCHIVE_FORMATS = {
+    "zip": (zip_stream, "application/zip"),
+    "tar": (tar_stream, "application/x-tar"),
+}
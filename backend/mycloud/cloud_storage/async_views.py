@@ -0,0 +1,182 @@
+"""
+Асинхронные версии эндпоинтов отдачи файлов для работы под ASGI
+
+Включаются настройкой ASYNC_FILE_SERVING и обслуживают те же URL, что и
+синхронные FileViewSet.download, FileViewSet.view, download_by_link и
+отдача по подписанным ссылкам.
+Пока клиент медленно принимает файл, процесс продолжает обслуживать
+другие запросы, а не держит под него поток.
+
+Проверки в хранилище и формирование ответа (stat файла, сжатые копии,
+подпись ссылки S3) выполняются в потоке через sync_to_async; в цикле
+событий остается только передача тела.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from rest_framework import exceptions
+
+from .authentication import CachedTokenAuthentication
+from .caching import aget_cached_file, aget_shared_file
+from .delivery import serve_file
+from .download_stats import record_download
+from .models import File
+from .share_tokens import InvalidShareToken, acheck_token, share_response
+from .storage import get_storage
+from .views import file_queryset
+
+logger = logging.getLogger("cloud_storage")
+
+
+@sync_to_async
+def get_request_user(request):
+    """Пользователь по токену или по сессии, как в DRF"""
+    try:
+        result = CachedTokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return None
+    if result is not None:
+        return result[0]
+    if request.user.is_authenticated:
+        return request.user
+    return None
+
+
+async def aserve_file(request, file_obj, inline=False):
+    """serve_file в потоке: асинхронным остается только тело ответа"""
+    return await sync_to_async(serve_file)(
+        request, file_obj, inline=inline, asynchronous=True
+    )
+
+
+def unauthorized():
+    return JsonResponse({"detail": "Учетные данные не были предоставлены."}, status=401)
+
+
+async def get_file(request, user, pk):
+    try:
+        return await file_queryset(user, request.GET.get("user_id")).aget(pk=pk)
+    except File.DoesNotExist:
+        raise Http404("Файл не найден")
+
+
+async def download(request, pk):
+    """Скачивание файла (ASGI)"""
+    user = await get_request_user(request)
+    if user is None:
+        return unauthorized()
+    file_obj = await get_file(request, user, pk)
+    storage = get_storage()
+
+    logger.info(
+        "Попытка скачивания файла: %s (ID: %s) пользователем: %s",
+        file_obj.original_name,
+        file_obj.id,
+        user.username,
+        extra={"event": "download"},
+    )
+
+    if not await sync_to_async(storage.exists)(file_obj.file_path):
+        logger.error("Файл не найден в хранилище: %s", file_obj.file_path)
+        raise Http404("Файл не найден")
+
+    await sync_to_async(record_download)(file_obj)
+    logger.info(
+        "Файл успешно скачан: %s пользователем: %s",
+        file_obj.original_name,
+        user.username,
+        extra={"event": "download"},
+    )
+    return await aserve_file(request, file_obj)
+
+
+async def view(request, pk):
+    """Просмотр файла в браузере (ASGI)"""
+    user = await get_request_user(request)
+    if user is None:
+        return unauthorized()
+    file_obj = await get_file(request, user, pk)
+    storage = get_storage()
+
+    if not await sync_to_async(storage.exists)(file_obj.file_path):
+        logger.error("Файл не найден в хранилище: %s", file_obj.file_path)
+        raise Http404("Файл не найден")
+
+    logger.info(
+        "Файл открыт для просмотра: %s пользователем: %s",
+        file_obj.original_name,
+        user.username,
+        extra={"event": "view"},
+    )
+    return await aserve_file(request, file_obj, inline=True)
+
+
+async def download_by_link(request, special_link):
+    """Скачивание файла по специальной ссылке (ASGI)"""
+    logger.info(
+        "Попытка скачивания файла по специальной ссылке: %s",
+        special_link,
+        extra={"event": "share_link"},
+    )
+    file_obj = await aget_shared_file(special_link)
+    if file_obj is None:
+        logger.warning(
+            "Попытка скачивания несуществующего файла по ссылке: %s", special_link
+        )
+        raise Http404("Файл не найден")
+
+    storage = get_storage()
+    if not await sync_to_async(storage.exists)(file_obj.file_path):
+        logger.error(
+            "Файл не найден в хранилище по ссылке %s: %s",
+            special_link,
+            file_obj.file_path,
+        )
+        raise Http404("Файл не найден")
+
+    await sync_to_async(record_download)(file_obj)
+    logger.info(
+        "Файл успешно скачан по специальной ссылке: %s",
+        file_obj.original_name,
+        extra={"event": "share_link"},
+    )
+    return await aserve_file(request, file_obj)
+
+
+async def serve_by_token(request, token, operation):
+    """Отдача файла по подписанной ссылке (ASGI)"""
+    try:
+        share_token = await acheck_token(token, operation)
+    except InvalidShareToken as e:
+        logger.warning("Отклонена подписанная ссылка (%s): %s", operation, e)
+        return JsonResponse({"error": str(e)}, status=e.status)
+
+    file_obj = await aget_cached_file(share_token.file_id)
+    storage = get_storage()
+    if file_obj is None or not await sync_to_async(storage.exists)(file_obj.file_path):
+        logger.warning("Файл по подписанной ссылке %s не найден", share_token.token_id)
+        raise Http404("Файл не найден")
+
+    if operation == "download":
+        await sync_to_async(record_download)(file_obj)
+    logger.info(
+        "Файл отдан по подписанной ссылке %s (%s): %s",
+        share_token.token_id,
+        operation,
+        file_obj.original_name,
+        extra={"event": "share_link"},
+    )
+    response = await aserve_file(request, file_obj, inline=operation == "view")
+    return share_response(response, share_token)
+
+
+async def download_by_token(request, token):
+    """Скачивание файла по подписанной ссылке (ASGI)"""
+    return await serve_by_token(request, token, "download")
+
+
+async def view_by_token(request, token):
+    """Просмотр файла по подписанной ссылке (ASGI)"""
+    return await serve_by_token(request, token, "view")
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from .caching import token_cache_key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который берет токен и пользователя из кеша
+
+    Запись сбрасывается при изменении пользователя или удалении токена
+    (см. signals), так что отключенный пользователь теряет доступ сразу.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, (user, token), settings.AUTH_CACHE_TIMEOUT)
+        return user, token
@@ -0,0 +1,429 @@
+"""
+Нагрузочные замеры API (manage.py benchmark)
+
+Сценарии обращаются по HTTP к уже запущенному серверу, а данные для них
+(пользователи bench_*, их файлы и блобы) создаются напрямую в БД сервера,
+поэтому команда запускается с теми же настройками, что и сервер.
+
+- upload: загрузка файлов, запросов в секунду и МБ/с
+- download: скачивание файлов разного размера, МБ/с
+- list: задержка списка файлов в зависимости от числа файлов
+- admin_users: задержка списка пользователей у администратора в зависимости
+  от числа пользователей
+- share_link: скачивание по специальной ссылке без авторизации
+
+Результат - JSON с описанием окружения (коммит, БД, настройки отдачи),
+который можно сохранить и сравнить с замером другого коммита.
+"""
+
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .blobs import acquire_blob, store_blob, write_temp
+from .bulk import bulk_delete_files
+from .models import Blob, File, User
+
+SCENARIOS = ("upload", "download", "list", "admin_users", "share_link")
+BENCH_PREFIX = "bench_"
+LIST_CONTENT = b"benchmark " * 100
+
+
+def parse_size(value):
+    """Размер с суффиксом K, M или G: 4K, 16M"""
+    value = value.strip().upper()
+    multiplier = 1
+    for suffix, factor in (("K", 1024), ("M", 1024**2), ("G", 1024**3)):
+        if value.endswith(suffix):
+            value, multiplier = value[:-1], factor
+            break
+    return int(value) * multiplier
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Client:
+    """HTTP-клиент с keep-alive: измеряется работа сервера, а не TCP клиента"""
+
+    def __init__(self, base_url, token=None):
+        self.base_url = base_url
+        self.token = token
+        self.connect()
+
+    def connect(self):
+        parts = urlsplit(self.base_url)
+        connection_class = (
+            HTTPSConnection if parts.scheme == "https" else HTTPConnection
+        )
+        self.connection = connection_class(parts.netloc, timeout=300)
+        self.prefix = parts.path.rstrip("/")
+
+    def request(self, method, path, body=None, headers=None):
+        """(статус, тело ответа)"""
+        headers = dict(headers or {})
+        if self.token:
+            headers["Authorization"] = f"Token {self.token}"
+        try:
+            if self.connection.sock is None:
+                # Сервер без keep-alive закрывает соединение после ответа
+                self.connection.connect()
+                # Без задержки отправки мелких пакетов: иначе задержка ответа
+                # упирается в отложенное подтверждение TCP (~40 мс)
+                self.connection.sock.setsockopt(
+                    socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
+                )
+            self.connection.request(method, self.prefix + path, body, headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except OSError:
+            # Сервер закрыл соединение - следующий запрос откроет новое
+            self.connection.close()
+            self.connect()
+            return 0, b""
+
+    def get(self, path):
+        return self.request("GET", path)
+
+    def upload(self, path, name, content):
+        boundary = uuid.uuid4().hex
+        body = b"".join(
+            [
+                f"--{boundary}\r\n".encode(),
+                f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'.encode(),
+                b"Content-Type: application/octet-stream\r\n\r\n",
+                content,
+                f"\r\n--{boundary}--\r\n".encode(),
+            ]
+        )
+        return self.request(
+            "POST",
+            path,
+            body,
+            {"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+
+
+def measure(base_url, token, make_request, requests, concurrency):
+    """Выполняет requests запросов в concurrency потоков
+
+    make_request(client, номер) возвращает (статус, тело). Возвращает
+    задержки, число ошибок, объем успешных ответов и общее время.
+    """
+    latencies = []
+    totals = {"errors": 0, "bytes": 0}
+    lock = threading.Lock()
+    per_client = max(1, requests // concurrency)
+
+    def worker(offset):
+        client = Client(base_url, token)
+        local = []
+        errors = received = 0
+        for number in range(offset, offset + per_client):
+            started = time.perf_counter()
+            status, body = make_request(client, number)
+            local.append(time.perf_counter() - started)
+            # Тела ответов с ошибкой в объем передачи не входят
+            if 200 <= status < 300:
+                received += len(body)
+            else:
+                errors += 1
+        with lock:
+            latencies.extend(local)
+            totals["errors"] += errors
+            totals["bytes"] += received
+
+    threads = [
+        threading.Thread(target=worker, args=(index * per_client,))
+        for index in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return latencies, totals["errors"], totals["bytes"], elapsed
+
+
+def summarize(scenario, params, concurrency, latencies, errors, elapsed, nbytes=None):
+    result = {
+        "scenario": scenario,
+        "params": params,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+    if nbytes is not None:
+        result["mb_per_s"] = nbytes / elapsed / 1024**2
+    return result
+
+
+def bench_user(name, admin=False):
+    """Пользователь для замеров без ограничения квоты и его токен"""
+    username = f"{BENCH_PREFIX}{name}"
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        user = User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password=os.urandom(16).hex(),
+            full_name="Benchmark",
+            is_admin=admin,
+            storage_quota=0,
+        )
+    token, _ = Token.objects.get_or_create(user=user)
+    return user, token.key
+
+
+def seed_files(user, count, content=LIST_CONTENT):
+    """Дополняет файлы пользователя с одинаковым содержимым до count
+
+    Записи создаются пачками без сигналов, поэтому счетчики пользователя
+    и ссылки на блоб обновляются одним UPDATE.
+    """
+    existing = File.objects.filter(user=user).count()
+    missing = count - existing
+    if missing <= 0:
+        return
+    tmp_path, sha256, size = write_temp([content])
+    store_blob(sha256, size, tmp_path)
+    with transaction.atomic():
+        blob = acquire_blob(sha256, size, source_path=tmp_path)
+        File.objects.bulk_create(
+            (
+                File(
+                    user=user,
+                    original_name=f"bench-{existing + i}.bin",
+                    file_path=blob.path,
+                    size=size,
+                    blob=blob,
+                )
+                for i in range(missing)
+            ),
+            batch_size=1000,
+        )
+        Blob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + missing - 1)
+        User.objects.filter(pk=user.pk).update(
+            files_count=F("files_count") + missing,
+            total_bytes=F("total_bytes") + missing * size,
+        )
+
+
+def seed_users(total):
+    """Дополняет число пользователей в БД до total"""
+    missing = total - User.objects.count()
+    if missing <= 0:
+        return
+    # Один хеш на всю пачку: хеширование пароля занимает десятки миллисекунд
+    password = make_password(None)
+    start = User.objects.filter(username__startswith=f"{BENCH_PREFIX}u").count()
+    User.objects.bulk_create(
+        (
+            User(
+                username=f"{BENCH_PREFIX}u{start + i}",
+                email=f"{BENCH_PREFIX}u{start + i}@example.com",
+                full_name="Benchmark",
+                password=password,
+            )
+            for i in range(missing)
+        ),
+        batch_size=1000,
+    )
+
+
+def cleanup():
+    """Удаляет пользователей bench_* вместе с их файлами"""
+    users = User.objects.filter(username__startswith=BENCH_PREFIX)
+    bulk_delete_files(File.objects.filter(user__in=users))
+    deleted, _ = users.delete()
+    return deleted
+
+
+class Benchmark:
+    def __init__(self, base_url, requests, concurrency):
+        self.base_url = base_url
+        self.requests = requests
+        self.concurrency = concurrency
+
+    def run(self, scenario, params, token, make_request, count_bytes=False):
+        latencies, errors, nbytes, elapsed = measure(
+            self.base_url, token, make_request, self.requests, self.concurrency
+        )
+        return summarize(
+            scenario,
+            params,
+            self.concurrency,
+            latencies,
+            errors,
+            elapsed,
+            nbytes if count_bytes else None,
+        )
+
+    def upload(self, size):
+        user, token = bench_user("upload")
+        content = os.urandom(size)
+
+        def make_request(client, number):
+            # Начало файла разное, чтобы каждая загрузка создавала новый блоб
+            return client.upload(
+                "/files/", f"upload-{number}.bin", os.urandom(16) + content[16:]
+            )
+
+        result = self.run("upload", {"size": size}, token, make_request)
+        # Объем - только по успешным загрузкам, как и у скачиваний
+        uploaded = size * (result["requests"] - result["errors"])
+        result["mb_per_s"] = uploaded * result["rps"] / result["requests"] / 1024**2
+        bulk_delete_files(File.objects.filter(user=user))
+        return [result]
+
+    def download(self, sizes):
+        user, token = bench_user("download")
+        results = []
+        for size in sizes:
+            file_obj = File.objects.filter(user=user, size=size).order_by("id").first()
+            if file_obj is None:
+                tmp_path, sha256, _ = write_temp([os.urandom(size)])
+                store_blob(sha256, size, tmp_path)
+                with transaction.atomic():
+                    blob = acquire_blob(sha256, size, source_path=tmp_path)
+                    file_obj = File.objects.create(
+                        user=user,
+                        original_name=f"download-{size}.bin",
+                        file_path=blob.path,
+                        size=size,
+                        blob=blob,
+                    )
+            path = f"/files/{file_obj.pk}/download/"
+            results.append(
+                self.run(
+                    "download",
+                    {"size": size},
+                    token,
+                    lambda client, number: client.get(path),
+                    count_bytes=True,
+                )
+            )
+        return results
+
+    def list_files(self, file_counts, page_size=None):
+        results = []
+        for count in file_counts:
+            user, token = bench_user(f"list{count}")
+            seed_files(user, count)
+            path = "/files/"
+            if page_size:
+                path = f"/files/?page_size={page_size}"
+            results.append(
+                self.run(
+                    "list",
+                    {"files": count, "page_size": page_size},
+                    token,
+                    lambda client, number: client.get(path),
+                )
+            )
+        return results
+
+    def admin_users(self, user_counts):
+        _, token = bench_user("admin", admin=True)
+        results = []
+        for count in sorted(user_counts):
+            seed_users(count)
+            results.append(
+                self.run(
+                    "admin_users",
+                    {"users": count},
+                    token,
+                    lambda client, number: client.get("/users/"),
+                )
+            )
+        return results
+
+    def share_link(self):
+        user, _ = bench_user("share")
+        seed_files(user, 1)
+        link = File.objects.filter(user=user).values_list("special_link", flat=True)[0]
+        path = f"/download/{link}/"
+        return [
+            self.run("share_link", {}, None, lambda client, number: client.get(path))
+        ]
+
+
+def environment():
+    """Описание окружения замера для сравнения результатов"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    database = settings.DATABASES["default"]
+    return {
+        "commit": commit,
+        "timestamp": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": {
+            "engine": database["ENGINE"].rsplit(".", 1)[-1],
+            "conn_max_age": database.get("CONN_MAX_AGE", 0),
+            "pool": bool(database.get("OPTIONS", {}).get("pool")),
+        },
+        "debug": settings.DEBUG,
+        "file_storage_backend": settings.FILE_STORAGE_BACKEND,
+        "file_delivery_backend": settings.FILE_DELIVERY_BACKEND,
+        "async_file_serving": settings.ASYNC_FILE_SERVING,
+    }
+
+
+def result_key(result):
+    return (
+        result["scenario"],
+        result["concurrency"],
+        tuple(sorted(result["params"].items())),
+    )
+
+
+def compare(baseline, current):
+    """Строки сравнения с прошлым замером: изменение p50 и rps в процентах"""
+    previous = {result_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        rows.append(
+            {
+                "scenario": result["scenario"],
+                "params": result["params"],
+                "p50_ms": (old["p50_ms"], result["p50_ms"]),
+                "p50_change": (result["p50_ms"] / old["p50_ms"] - 1) * 100,
+                "rps_change": (result["rps"] / old["rps"] - 1) * 100,
+            }
+        )
+    return rows
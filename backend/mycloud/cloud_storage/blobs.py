@@ -0,0 +1,209 @@
+"""
+Контентно-адресуемое хранилище файлов
+
+Содержимое файла хранится в хранилище один раз под именем
+blobs/<aa>/<bb>/<sha256>, запись Blob считает ссылки на него из File.
+Объект в хранилище удаляется, когда счетчик ссылок доходит до нуля.
+
+Загрузка нового файла - два шага. store_blob короткой транзакцией
+заводит запись Blob без ссылок (refcount=0) и уже после нее отправляет
+байты в хранилище (загрузка в S3 может идти минутами): пока запись есть,
+delete_blob_files не удалит файл. Затем acquire_blob в транзакции вместе
+с созданием File берет ссылку на блоб, не обращаясь к хранилищу. Записи
+без ссылок, оставшиеся от прерванных загрузок, удаляет purge_unused_blobs.
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from .jobs import enqueue
+from .models import Blob
+from .storage import get_storage
+
+logger = logging.getLogger("cloud_storage")
+
+BLOBS_DIR = "blobs"
+BLOCK_SIZE = 1024 * 1024
+
+
+def blob_path(sha256):
+    """Относительный путь блоба по его хешу"""
+    return os.path.join(BLOBS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def make_temp_path():
+    """Полный путь временного файла внутри хранилища блобов"""
+    tmp_dir = os.path.join(settings.MEDIA_ROOT, BLOBS_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    return os.path.join(tmp_dir, uuid.uuid4().hex)
+
+
+def write_temp(chunks):
+    """Пишет поток во временный файл, считая хеш на лету
+
+    Возвращает (полный путь, sha256, размер).
+    """
+    tmp_path = make_temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as destination:
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                destination.write(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+def hash_file(full_path):
+    """sha256 и размер существующего файла"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(full_path, "rb") as f:
+        while True:
+            data = f.read(BLOCK_SIZE)
+            if not data:
+                break
+            digest.update(data)
+            size += len(data)
+    return digest.hexdigest(), size
+
+
+def lock_blob_path(path):
+    """Блокирует путь блоба до конца текущей транзакции
+
+    Эту блокировку берут acquire_blob и delete_blob_files, поэтому файл
+    блоба не удаляется, пока параллельная загрузка того же содержимого
+    берет на него ссылку. В PostgreSQL это advisory lock по пути, в SQLite
+    (разработка и тесты) блокировки нет.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))", [path]
+            )
+
+
+def store_blob(sha256, size, source_path):
+    """Сохраняет содержимое в хранилище до транзакции с acquire_blob
+
+    Запись блоба заводится (или находится) до отправки байтов, поэтому
+    хранилище не вызывается внутри транзакции и с удерживаемой блокировкой.
+    Если блоб с этим содержимым уже хранится, байты не отправляются
+    повторно. source_path остается на месте для acquire_blob.
+    """
+    path = blob_path(sha256)
+    with transaction.atomic():
+        lock_blob_path(path)
+        blob, created = Blob.objects.get_or_create(
+            sha256=sha256, defaults={"size": size, "path": path}
+        )
+    if blob.size != size:
+        # acquire_blob вернет None
+        return
+    storage = get_storage()
+    if created or not storage.exists(blob.path):
+        storage.save(blob.path, source_path, keep_source=True)
+
+
+def acquire_blob(sha256, size, source_path=None):
+    """Увеличивает счетчик ссылок на блоб
+
+    Байты уже должны быть в хранилище (store_blob); хранилище здесь не
+    вызывается, а source_path удаляется после фиксации транзакции. Если
+    блоб записан с другим размером или его нет, а source_path не передан,
+    возвращается None.
+
+    Запись блоба могла быть удалена между store_blob и этим вызовом
+    (purge_unused_blobs или освобождение последней ссылки). Тогда она
+    создается заново, а файл из source_path сохраняется после фиксации,
+    если delete_blob_files успел его удалить.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                lock_blob_path(blob_path(sha256))
+                blob = Blob.objects.select_for_update().filter(sha256=sha256).first()
+                if blob is not None:
+                    if blob.size != size:
+                        return None
+                    blob.refcount += 1
+                    blob.save(update_fields=["refcount"])
+                    if source_path:
+                        transaction.on_commit(lambda: remove_source(source_path))
+                    return blob
+
+                if source_path is None:
+                    return None
+                relative_path = blob_path(sha256)
+                blob = Blob.objects.create(
+                    sha256=sha256, size=size, path=relative_path, refcount=1
+                )
+                transaction.on_commit(lambda: save_missing(relative_path, source_path))
+                logger.info("Создан новый блоб: %s (%s байт)", sha256, size)
+                return blob
+        except IntegrityError:
+            # Тот же блоб одновременно создан параллельной загрузкой
+            if attempt:
+                raise
+    return None
+
+
+def remove_source(source_path):
+    try:
+        os.remove(source_path)
+    except FileNotFoundError:
+        pass
+
+
+def save_missing(path, source_path):
+    """Переносит source_path в хранилище, если файла там нет, иначе удаляет
+
+    Вызывается после фиксации: запись блоба уже видна delete_blob_files,
+    и файл больше не удалят.
+    """
+    storage = get_storage()
+    if storage.exists(path):
+        remove_source(source_path)
+    else:
+        storage.save(path, source_path)
+
+
+def release_blob(blob_id):
+    """Уменьшает счетчик ссылок и удаляет блоб, если ссылок не осталось"""
+    release_blobs({blob_id: 1})
+
+
+def release_blobs(counts):
+    """Освобождает сразу несколько ссылок: {blob_id: число ссылок}
+
+    Блобы без ссылок удаляются из БД в той же транзакции, их файлы удаляет
+    фоновая задача delete_blob_files.
+    """
+    with transaction.atomic():
+        blobs = list(Blob.objects.select_for_update().filter(pk__in=counts))
+        alive, dead = [], []
+        for blob in blobs:
+            blob.refcount = max(blob.refcount - counts[blob.pk], 0)
+            (alive if blob.refcount else dead).append(blob)
+        if alive:
+            Blob.objects.bulk_update(alive, ["refcount"])
+        if dead:
+            Blob.objects.filter(pk__in=[blob.pk for blob in dead]).delete()
+            enqueue("delete_blob_files", {"paths": [blob.path for blob in dead]})
+
+
+def remove_stored_file(relative_path):
+    try:
+        get_storage().delete(relative_path)
+    except Exception as e:
+        logger.error("Ошибка при удалении файла из хранилища: %s", e)
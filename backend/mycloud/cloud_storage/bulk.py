@@ -0,0 +1,73 @@
+"""
+Массовые операции над файлами
+
+Удаление пачки файлов - одна транзакция: один DELETE, по одному UPDATE
+счетчиков на пользователя и одна пачка обновлений блобов. Файлы из
+хранилища удаляет фоновая задача, поставленная в той же транзакции.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .blobs import release_blobs
+from .caching import forget_files, forget_share_links, forget_users
+from .jobs import enqueue
+from .models import File, User
+from .signals import suspend_file_counters
+
+
+def bulk_delete_files(queryset):
+    """Удаляет файлы из queryset, возвращает множество удаленных ID"""
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update().values(
+                "id", "user_id", "size", "blob_id", "file_path", "special_link"
+            )
+        )
+        if not rows:
+            return set()
+        ids = [row["id"] for row in rows]
+
+        with suspend_file_counters():
+            File.objects.filter(id__in=ids).delete()
+
+        per_user = defaultdict(lambda: [0, 0])
+        for row in rows:
+            per_user[row["user_id"]][0] += 1
+            per_user[row["user_id"]][1] += row["size"]
+        for user_id, (count, size) in per_user.items():
+            User.objects.filter(pk=user_id).update(
+                files_count=Greatest(F("files_count") - count, 0),
+                total_bytes=Greatest(F("total_bytes") - size, 0),
+            )
+
+        forget_users(per_user)
+        forget_share_links(row["special_link"] for row in rows)
+        forget_files(ids)
+
+        blob_counts = Counter(row["blob_id"] for row in rows if row["blob_id"])
+        if blob_counts:
+            release_blobs(blob_counts)
+
+        # Файлы, загруженные до хранилища блобов, удаляются напрямую
+        legacy_paths = [row["file_path"] for row in rows if not row["blob_id"]]
+        if legacy_paths:
+            enqueue("delete_stored_files", {"paths": legacy_paths})
+    return set(ids)
+
+
+def bulk_update_files(files, changes):
+    """Применяет {id: {поле: значение}} к файлам одним bulk_update"""
+    fields = set()
+    for file_obj in files:
+        for field, value in changes[file_obj.id].items():
+            setattr(file_obj, field, value)
+            fields.add(field)
+    if fields:
+        File.objects.bulk_update(files, sorted(fields))
+        forget_share_links(file_obj.special_link for file_obj in files)
+        forget_files(file_obj.id for file_obj in files)
+    return files
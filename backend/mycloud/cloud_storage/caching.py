@@ -0,0 +1,133 @@
+"""
+Кеш горячих запросов
+
+Виды записей в кеше Django (локальная память процесса или Redis, см.
+CACHES в настройках):
+
+- токен -> (пользователь, токен) для CachedTokenAuthentication: запрос
+  с токеном не обращается к БД за Token и User
+- специальная ссылка -> файл для скачивания по ссылке
+- ID файла -> файл для скачивания по подписанной ссылке (share_tokens)
+- ID пользователя -> ответ current_user
+
+Записи сбрасываются при изменении исходных строк (сигналы и массовые
+операции) после фиксации транзакции. Время жизни записей ограничено
+*_CACHE_TIMEOUT, поэтому изменение в обход ORM устареет не позже него.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import File, User
+from .serializers import UserSerializer
+
+TOKEN_KEY = "auth:token:{}"
+SHARE_LINK_KEY = "share:{}"
+FILE_KEY = "file:{}"
+CURRENT_USER_KEY = "user:{}:current"
+
+# Ссылка, которой нет в БД, тоже кешируется, чтобы перебор ссылок не
+# превращался в запросы к БД
+MISSING = "missing"
+
+
+def token_cache_key(token_key):
+    # Сам токен в ключ не попадает: ключи кеша видны в Redis
+    return TOKEN_KEY.format(hashlib.sha256(token_key.encode()).hexdigest())
+
+
+def share_link_cache_key(special_link):
+    return SHARE_LINK_KEY.format(special_link)
+
+
+def file_cache_key(file_id):
+    return FILE_KEY.format(file_id)
+
+
+def current_user_cache_key(user_id):
+    return CURRENT_USER_KEY.format(user_id)
+
+
+def delete_after_commit(keys):
+    """Удаляет ключи сейчас и еще раз после фиксации транзакции
+
+    Повторное удаление убирает значение, которое параллельный запрос успел
+    прочитать из БД до фиксации и положить в кеш.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_shared_file(special_link):
+    """Файл по специальной ссылке или None"""
+    key = share_link_cache_key(special_link)
+    file_obj = cache.get(key)
+    if file_obj is None:
+        file_obj = File.objects.filter(special_link=special_link).first() or MISSING
+        cache.set(key, file_obj, settings.SHARE_LINK_CACHE_TIMEOUT)
+    return None if file_obj == MISSING else file_obj
+
+
+async def aget_shared_file(special_link):
+    """Асинхронный вариант get_shared_file"""
+    key = share_link_cache_key(special_link)
+    file_obj = await cache.aget(key)
+    if file_obj is None:
+        file_obj = (
+            await File.objects.filter(special_link=special_link).afirst() or MISSING
+        )
+        await cache.aset(key, file_obj, settings.SHARE_LINK_CACHE_TIMEOUT)
+    return None if file_obj == MISSING else file_obj
+
+
+def get_cached_file(file_id):
+    """Файл по ID или None"""
+    key = file_cache_key(file_id)
+    file_obj = cache.get(key)
+    if file_obj is None:
+        file_obj = File.objects.filter(pk=file_id).first() or MISSING
+        cache.set(key, file_obj, settings.SHARE_LINK_CACHE_TIMEOUT)
+    return None if file_obj == MISSING else file_obj
+
+
+async def aget_cached_file(file_id):
+    """Асинхронный вариант get_cached_file"""
+    key = file_cache_key(file_id)
+    file_obj = await cache.aget(key)
+    if file_obj is None:
+        file_obj = await File.objects.filter(pk=file_id).afirst() or MISSING
+        await cache.aset(key, file_obj, settings.SHARE_LINK_CACHE_TIMEOUT)
+    return None if file_obj == MISSING else file_obj
+
+
+def get_current_user_data(user_id):
+    """Ответ current_user; счетчики файлов берутся из БД при промахе кеша"""
+    key = current_user_cache_key(user_id)
+    data = cache.get(key)
+    if data is None:
+        data = dict(UserSerializer(User.objects.get(pk=user_id)).data)
+        cache.set(key, data, settings.CURRENT_USER_CACHE_TIMEOUT)
+    return data
+
+
+def forget_share_links(special_links):
+    delete_after_commit(share_link_cache_key(link) for link in special_links)
+
+
+def forget_files(file_ids):
+    delete_after_commit(file_cache_key(file_id) for file_id in file_ids)
+
+
+def forget_users(user_ids):
+    """Сбрасывает кешированные ответы current_user"""
+    delete_after_commit(current_user_cache_key(user_id) for user_id in user_ids)
+
+
+def forget_tokens(token_keys):
+    delete_after_commit(token_cache_key(key) for key in token_keys)
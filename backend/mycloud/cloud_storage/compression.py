@@ -0,0 +1,200 @@
+"""
+Сжатие отдаваемых файлов
+
+Текстовые форматы (текст, JSON, CSS, JS, HTML, SVG, XML) при отдаче через
+Django сжимаются потоково в кодировку, выбранную по заголовку
+Accept-Encoding: zstd, br или gzip. gzip доступен всегда, для br и zstd
+нужны пакеты brotli и zstandard.
+
+Если кодировка указана в PRECOMPRESS_ENCODINGS, сжатая копия блоба
+сохраняется в хранилище рядом с оригиналом (<путь>.gz, .br, .zst) фоновой
+задачей precompress_file после загрузки и отдается без повторного сжатия.
+"""
+
+import logging
+import mimetypes
+import os
+import zlib
+
+from django.conf import settings
+
+from .blobs import make_temp_path
+from .storage import get_storage
+
+logger = logging.getLogger("cloud_storage")
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+}
+
+# Кодировки в порядке предпочтения: расширение сжатой копии,
+# уровень сжатия на лету и уровень для сохраняемых копий
+ENCODINGS = {
+    "zstd": ("zst", 3, 19),
+    "br": ("br", 4, 11),
+    "gzip": ("gz", 6, 9),
+}
+
+
+def is_compressible(content_type):
+    base_type = content_type.split(";", 1)[0].strip().lower()
+    return base_type.startswith("text/") or base_type in COMPRESSIBLE_TYPES
+
+
+def encoding_available(encoding):
+    if encoding == "gzip":
+        return True
+    module = {"br": "brotli", "zstd": "zstandard"}[encoding]
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def parse_accept_encoding(header):
+    """{кодировка: q} из заголовка Accept-Encoding"""
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def negotiate_encoding(request, content_type, size):
+    """Кодировка для ответа или None, если файл отдается как есть
+
+    Запросы диапазонов обслуживаются без сжатия: Range относится к байтам
+    исходного файла.
+    """
+    if size < settings.COMPRESSION_MIN_SIZE or not is_compressible(content_type):
+        return None
+    if request.META.get("HTTP_RANGE"):
+        return None
+    accepted = parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    for encoding in ENCODINGS:
+        q = accepted.get(encoding, accepted.get("*", 0))
+        if q > 0 and encoding_available(encoding):
+            return encoding
+    return None
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        import brotli
+
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+def make_compressor(encoding, level):
+    """Объект с методами compress(data) и flush() для кодировки"""
+    if encoding == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == "br":
+        return BrotliCompressor(level)
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+def compress_stream(chunks, encoding, level=None):
+    """Генератор сжатых блоков по мере чтения исходных"""
+    if level is None:
+        level = ENCODINGS[encoding][1]
+    compressor = make_compressor(encoding, level)
+    for data in chunks:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def variant_name(name, encoding):
+    return f"{name}.{ENCODINGS[encoding][0]}"
+
+
+def encoded_content(file_obj, encoding):
+    """(итератор сжатых байтов, длина или None) для отдачи файла
+
+    Сохраненная сжатая копия отдается как есть, иначе файл сжимается на лету.
+    """
+    storage = get_storage()
+    if file_obj.blob_id and encoding in settings.PRECOMPRESS_ENCODINGS:
+        variant = variant_name(file_obj.file_path, encoding)
+        try:
+            length = storage.size(variant)
+        except FileNotFoundError:
+            pass
+        else:
+            return storage.read_range(variant, 0, length - 1), length
+    chunks = storage.read_range(file_obj.file_path, 0, file_obj.size - 1)
+    return compress_stream(chunks, encoding), None
+
+
+def variant_paths(blob_path):
+    """Имена сжатых копий блоба, которые удаляются вместе с ним"""
+    return [
+        variant_name(blob_path, encoding)
+        for encoding in settings.PRECOMPRESS_ENCODINGS
+        if encoding in ENCODINGS
+    ]
+
+
+def precompress_encodings(file_obj):
+    """Кодировки, в которых для файла сохраняются сжатые копии"""
+    content_type = mimetypes.guess_type(file_obj.original_name)[0] or ""
+    if (
+        not file_obj.blob_id
+        or file_obj.size < settings.COMPRESSION_MIN_SIZE
+        or not is_compressible(content_type)
+    ):
+        return []
+    return [
+        encoding
+        for encoding in settings.PRECOMPRESS_ENCODINGS
+        if encoding in ENCODINGS and encoding_available(encoding)
+    ]
+
+
+def precompress(blob_path, size, encoding):
+    """Сохраняет сжатую копию блоба
+
+    Ошибки не перехватываются: задача precompress_file повторяется
+    очередью задач.
+    """
+    storage = get_storage()
+    variant = variant_name(blob_path, encoding)
+    if storage.exists(variant):
+        return
+    tmp_path = make_temp_path()
+    try:
+        level = ENCODINGS[encoding][2]
+        with open(tmp_path, "wb") as destination:
+            for data in compress_stream(
+                storage.read_range(blob_path, 0, size - 1), encoding, level
+            ):
+                destination.write(data)
+        storage.save(variant, tmp_path)
+        logger.debug("Сохранена сжатая копия %s", variant)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,378 @@
+"""
+Отдача файлов клиенту
+
+Способ отдачи задается настройкой FILE_DELIVERY_BACKEND:
+- "django" - файл читается и отправляется воркером (для разработки)
+- "nginx"  - заголовок X-Accel-Redirect, байты отправляет nginx через sendfile
+- "apache" - заголовок X-Sendfile (mod_xsendfile)
+
+nginx и Apache работают только с локальным хранилищем. Файлы из S3
+отдаются перенаправлением на подписанную ссылку (S3_PRESIGNED_URLS) или
+читаются приложением через хранилище.
+"""
+
+import asyncio
+import mimetypes
+import os
+import time
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from .compression import encoded_content, is_compressible, negotiate_encoding
+from .storage import get_storage
+
+# Размер блока чтения при отдаче диапазонов
+BLOCK_SIZE = 64 * 1024
+# Максимальное число диапазонов в одном запросе
+MAX_RANGES = 16
+
+CONTENT_TYPE_MAP = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+    ".txt": "text/plain",
+    ".html": "text/html",
+    ".css": "text/css",
+    ".js": "text/javascript",
+    ".json": "application/json",
+    ".pdf": "application/pdf",
+}
+
+
+def guess_content_type(filename):
+    """Тип контента по расширению имени файла"""
+    file_extension = os.path.splitext(filename)[1].lower()
+    return CONTENT_TYPE_MAP.get(file_extension, "application/octet-stream")
+
+
+def content_disposition(file_obj, inline=False):
+    disposition = "inline" if inline else "attachment"
+    return f'{disposition}; filename="{file_obj.original_name}"'
+
+
+def file_etag(file_obj, encoding=None):
+    """Сильный ETag: содержимое файла не меняется после загрузки
+
+    У сжатого представления свой ETag - его байты отличаются от исходных.
+    """
+    etag = f"{file_obj.id}-{file_obj.size}-{int(file_obj.upload_date.timestamp())}"
+    if encoding:
+        etag = f"{etag}-{encoding}"
+    return f'"{etag}"'
+
+
+def parse_range_header(header, size):
+    """Разбор заголовка Range
+
+    Возвращает список диапазонов [(start, end)] включительно, пустой список,
+    если ни один диапазон не выполним, или None, если заголовок некорректен
+    и должен быть проигнорирован.
+    """
+    units, _, ranges_spec = header.partition("=")
+    if units.strip().lower() != "bytes" or not ranges_spec:
+        return None
+
+    ranges = []
+    for spec in ranges_spec.split(","):
+        start, sep, end = spec.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start:
+                start = int(start)
+                if end:
+                    end = int(end)
+                    if end < start:
+                        return None
+                else:
+                    end = size - 1
+            else:
+                suffix = int(end)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Склеиваем пересекающиеся и соседние диапазоны
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def read_range(name, start, end):
+    """Генератор байтов файла из хранилища в диапазоне [start, end]"""
+    return get_storage().read_range(name, start, end)
+
+
+def aread_range(name, start, end):
+    """Асинхронный генератор байтов файла в диапазоне [start, end]
+
+    Чтение идет в пуле потоков и не блокирует цикл событий. Следующий блок
+    читается только после того, как сервер отправил предыдущий клиенту, -
+    медленный клиент не накапливает файл в памяти.
+    """
+    return iterate_in_thread(read_range(name, start, end))
+
+
+async def iterate_in_thread(iterator):
+    """Асинхронная обертка над синхронным генератором тела ответа
+
+    Под ASGI Django вычитывает синхронный итератор целиком в память перед
+    отправкой; обертка отдает его поблочно, выполняя каждый шаг в потоке.
+    """
+    iterator = iter(iterator)
+    sentinel = object()
+    while True:
+        data = await asyncio.to_thread(next, iterator, sentinel)
+        if data is sentinel:
+            break
+        yield data
+
+
+def limit_rate(response, rate):
+    """Ограничивает скорость отдачи тела ответа rate байт в секунду
+
+    nginx ограничивает скорость сам по заголовку X-Accel-Limit-Rate; тело,
+    которое отдает Django, выдается блоками не быстрее rate. Ответы через
+    X-Sendfile и перенаправления на S3 не ограничиваются. Под WSGI
+    ограниченная отдача занимает поток на все время скачивания.
+    """
+    if response.has_header("X-Accel-Redirect"):
+        response["X-Accel-Limit-Rate"] = str(rate)
+    elif response.streaming:
+        throttle = athrottled if response.is_async else throttled
+        response.streaming_content = throttle(response.streaming_content, rate)
+    return response
+
+
+def rate_blocks(data, rate):
+    # Блок не больше десятой доли секундного объема: паузы короткие и частые
+    step = max(rate // 10, 1024)
+    for offset in range(0, len(data), step):
+        yield data[offset : offset + step]
+
+
+def throttled(content, rate):
+    """Генератор тела ответа, выдающий не больше rate байт в секунду"""
+    started = time.monotonic()
+    sent = 0
+    for data in content:
+        for block in rate_blocks(data, rate):
+            delay = sent / rate - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+            yield block
+            sent += len(block)
+
+
+async def athrottled(content, rate):
+    """Асинхронный вариант throttled"""
+    started = time.monotonic()
+    sent = 0
+    async for data in content:
+        for block in rate_blocks(data, rate):
+            delay = sent / rate - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield block
+            sent += len(block)
+
+
+def part_header(boundary, content_type, start, end, size):
+    return (
+        f"--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+    ).encode()
+
+
+def multipart_ranges(name, ranges, size, content_type, boundary):
+    """Генератор тела ответа multipart/byteranges"""
+    for start, end in ranges:
+        yield part_header(boundary, content_type, start, end, size)
+        yield from read_range(name, start, end)
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+async def amultipart_ranges(name, ranges, size, content_type, boundary):
+    """Асинхронный генератор тела ответа multipart/byteranges"""
+    for start, end in ranges:
+        yield part_header(boundary, content_type, start, end, size)
+        async for data in aread_range(name, start, end):
+            yield data
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+def multipart_length(ranges, size, content_type, boundary):
+    """Длина тела multipart/byteranges без его формирования"""
+    length = len(f"--{boundary}--\r\n")
+    for start, end in ranges:
+        length += len(part_header(boundary, content_type, start, end, size))
+        length += end - start + 1 + 2
+    return length
+
+
+def range_response(
+    request, name, size, content_type, etag, last_modified, asynchronous=False
+):
+    """Ответ 206/416 на запрос с Range или None, если отдается весь файл"""
+    range_header = request.META.get("HTTP_RANGE")
+    if not range_header:
+        return None
+
+    # If-Range: диапазон отдается, только если файл не изменился
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range:
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            if if_range != etag:
+                return None
+        else:
+            if_range_date = parse_http_date_safe(if_range)
+            if if_range_date is None or int(last_modified) > if_range_date:
+                return None
+
+    ranges = parse_range_header(range_header, size)
+    if ranges is None:
+        return None
+    if not ranges:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        reader = aread_range if asynchronous else read_range
+        response = StreamingHttpResponse(
+            reader(name, start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        boundary = uuid.uuid4().hex
+        reader = amultipart_ranges if asynchronous else multipart_ranges
+        response = StreamingHttpResponse(
+            reader(name, ranges, size, content_type, boundary),
+            status=206,
+            content_type=f"multipart/byteranges; boundary={boundary}",
+        )
+        response["Content-Length"] = str(
+            multipart_length(ranges, size, content_type, boundary)
+        )
+    return response
+
+
+def serve_file(request, file_obj, inline=False, asynchronous=False):
+    """Ответ с содержимым файла с учетом настроенного способа отдачи
+
+    Поддерживает условные запросы (If-None-Match, If-Modified-Since) для всех
+    способов отдачи и запросы диапазонов (Range, If-Range) для отдачи через
+    Django - nginx, Apache и S3 обрабатывают Range сами. Если хранилище выдает
+    прямые ссылки, клиент перенаправляется на подписанный URL. Текстовые файлы,
+    которые отдает Django, сжимаются по Accept-Encoding. С asynchronous=True
+    тело ответа - асинхронный генератор для работы под ASGI.
+    """
+    backend = settings.FILE_DELIVERY_BACKEND
+    storage = get_storage()
+    name = file_obj.file_path
+    file_full_path = storage.local_path(name)
+    if inline:
+        content_type = guess_content_type(file_obj.original_name)
+    else:
+        content_type = (
+            mimetypes.guess_type(file_obj.original_name)[0]
+            or "application/octet-stream"
+        )
+    disposition = content_disposition(file_obj, inline=inline)
+    url = None
+    if file_full_path is None:
+        url = storage.url(name, content_type, disposition)
+    served_by_django = url is None and (
+        file_full_path is None or backend not in ("nginx", "apache")
+    )
+    encoding = None
+    if served_by_django:
+        encoding = negotiate_encoding(request, content_type, file_obj.size)
+    etag = file_etag(file_obj, encoding)
+    last_modified = file_obj.upload_date.timestamp()
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified)
+    )
+    if response is None and url:
+        # Ссылка подписана на короткое время - ответ не кешируется
+        response = HttpResponseRedirect(url)
+        response["Cache-Control"] = "private, no-store"
+        return response
+    if response is None:
+        if not served_by_django and backend == "nginx":
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = quote(
+                settings.FILE_DELIVERY_INTERNAL_PREFIX + name
+            )
+        elif not served_by_django:
+            response = HttpResponse(content_type=content_type)
+            response["X-Sendfile"] = file_full_path
+        elif encoding:
+            content, length = encoded_content(file_obj, encoding)
+            if asynchronous:
+                content = iterate_in_thread(content)
+            response = StreamingHttpResponse(content, content_type=content_type)
+            response["Content-Encoding"] = encoding
+            if length is not None:
+                response["Content-Length"] = str(length)
+        else:
+            size = file_obj.size
+            response = range_response(
+                request,
+                name,
+                size,
+                content_type,
+                etag,
+                last_modified,
+                asynchronous=asynchronous,
+            )
+            if response is None and (asynchronous or file_full_path is None):
+                reader = aread_range if asynchronous else read_range
+                response = StreamingHttpResponse(
+                    reader(name, 0, size - 1), content_type=content_type
+                )
+                response["Content-Length"] = str(size)
+            elif response is None:
+                response = FileResponse(
+                    open(file_full_path, "rb"), content_type=content_type
+                )
+            response["Accept-Ranges"] = "bytes"
+        response["Content-Disposition"] = disposition
+
+    if served_by_django and is_compressible(content_type):
+        patch_vary_headers(response, ["Accept-Encoding"])
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
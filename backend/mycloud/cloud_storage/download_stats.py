@@ -0,0 +1,117 @@
+"""
+Буферизация статистики скачиваний
+
+Скачивание не пишет в базу: дата последнего скачивания и число скачиваний
+копятся в памяти процесса и раз в DOWNLOAD_STATS_FLUSH_INTERVAL секунд
+сбрасываются одним UPDATE на пачку из FLUSH_BATCH_SIZE файлов. Популярная
+ссылка больше не создает поток UPDATE одной и той же строки.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import File
+
+logger = logging.getLogger("cloud_storage")
+
+# Файлов в одном UPDATE: два CASE растут с числом файлов, а SQLite
+# ограничивает число параметров запроса
+FLUSH_BATCH_SIZE = 200
+
+_lock = threading.Lock()
+# file_id -> [дата последнего скачивания, число скачиваний]
+_pending = {}
+_flusher = None
+
+
+def record_download(file_obj):
+    """Учитывает скачивание файла"""
+    record_downloads([file_obj])
+
+
+def record_downloads(files):
+    """Учитывает по одному скачиванию каждого из файлов (например, архива)
+
+    Без буферизации - один UPDATE на все файлы.
+    """
+    now = timezone.now()
+    pks = [file_obj.pk for file_obj in files]
+    if settings.DOWNLOAD_STATS_FLUSH_INTERVAL <= 0:
+        File.objects.filter(pk__in=pks).update(
+            last_download_date=now, download_count=F("download_count") + 1
+        )
+        return
+
+    with _lock:
+        for pk in pks:
+            entry = _pending.get(pk)
+            if entry is None:
+                _pending[pk] = [now, 1]
+            else:
+                entry[0] = now
+                entry[1] += 1
+    _ensure_flusher()
+
+
+def flush_downloads():
+    """Записывает накопленную статистику пачками по FLUSH_BATCH_SIZE файлов"""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return
+
+    items = list(pending.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start : start + FLUSH_BATCH_SIZE]
+        try:
+            File.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                last_download_date=Case(
+                    *[When(pk=pk, then=Value(date)) for pk, (date, _) in batch]
+                ),
+                download_count=F("download_count")
+                + Case(*[When(pk=pk, then=Value(count)) for pk, (_, count) in batch]),
+            )
+        except Exception:
+            # Возвращаем несохраненную статистику в буфер до следующей попытки
+            with _lock:
+                for pk, (date, count) in items[start:]:
+                    entry = _pending.setdefault(pk, [date, 0])
+                    entry[1] += count
+            raise
+    logger.debug("Сброшена статистика скачиваний для %s файлов", len(pending))
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.DOWNLOAD_STATS_FLUSH_INTERVAL)
+        try:
+            flush_downloads()
+        except Exception as e:
+            logger.error("Ошибка при сбросе статистики скачиваний: %s", e)
+        finally:
+            connections.close_all()
+
+
+def _ensure_flusher():
+    """Запускает фоновый поток сброса в текущем процессе (после fork воркера)"""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(
+            target=_flush_loop, name="download-stats-flusher", daemon=True
+        )
+        _flusher.start()
+
+
+atexit.register(flush_downloads)
@@ -0,0 +1,98 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import exceptions
+from rest_framework.filters import BaseFilterBackend
+
+# Допустимые значения параметра ordering -> поле модели.
+# Для каждого поля есть составной индекс (user, поле, id).
+FILE_ORDERINGS = {
+    "upload_date": "upload_date",
+    "size": "size",
+    "name": "original_name",
+}
+DEFAULT_FILE_ORDERING = "-upload_date"
+
+
+def parse_int_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise exceptions.ValidationError({name: "Ожидается целое число"})
+
+
+def parse_date_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        parsed = parse_datetime(value) or parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise exceptions.ValidationError({name: "Ожидается дата в формате ISO 8601"})
+    if not isinstance(parsed, datetime):
+        parsed = datetime.combine(parsed, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class FileFilterBackend(BaseFilterBackend):
+    """Фильтрация и сортировка списка файлов
+
+    Параметры запроса:
+    - name - начало имени файла (с учетом регистра)
+    - size_min, size_max - размер в байтах
+    - uploaded_after, uploaded_before - дата загрузки (ISO 8601)
+    - downloaded - true/false, скачивался ли файл
+    - ordering - upload_date, size или name, с "-" для обратного порядка
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        name = params.get("name")
+        if name:
+            queryset = queryset.filter(original_name__startswith=name)
+
+        size_min = parse_int_param(params, "size_min")
+        if size_min is not None:
+            queryset = queryset.filter(size__gte=size_min)
+        size_max = parse_int_param(params, "size_max")
+        if size_max is not None:
+            queryset = queryset.filter(size__lte=size_max)
+
+        uploaded_after = parse_date_param(params, "uploaded_after")
+        if uploaded_after is not None:
+            queryset = queryset.filter(upload_date__gte=uploaded_after)
+        uploaded_before = parse_date_param(params, "uploaded_before")
+        if uploaded_before is not None:
+            queryset = queryset.filter(upload_date__lt=uploaded_before)
+
+        downloaded = params.get("downloaded")
+        if downloaded in ("true", "1"):
+            queryset = queryset.filter(last_download_date__isnull=False)
+        elif downloaded in ("false", "0"):
+            queryset = queryset.filter(last_download_date__isnull=True)
+
+        return queryset.order_by(*self.get_ordering(request))
+
+    def get_ordering(self, request):
+        """Сортировка по выбранному полю и id в том же направлении"""
+        ordering = request.query_params.get("ordering", DEFAULT_FILE_ORDERING)
+        descending = ordering.startswith("-")
+        field = FILE_ORDERINGS.get(ordering.lstrip("-"))
+        if field is None:
+            raise exceptions.ValidationError(
+                {
+                    "ordering": "Допустимые значения: "
+                    + ", ".join(sorted(FILE_ORDERINGS))
+                }
+            )
+        prefix = "-" if descending else ""
+        return [prefix + field, prefix + "id"]
@@ -0,0 +1,238 @@
+"""
+Очередь фоновых задач в базе данных
+
+Обработчики запросов не выполняют тяжелую побочную работу (удаление файлов
+из хранилища, превью, сжатие, очистку), а ставят задачу в таблицу Job той
+же транзакцией, что и основное изменение: задача появится, только если
+изменение зафиксировано. Задачи выполняют воркеры - процессы
+manage.py run_jobs, сколько бы их ни было запущено.
+
+- приоритет: задачи с большим priority берутся раньше
+- повторы: упавшая задача перезапускается с экспоненциальной задержкой,
+  пока не исчерпает max_attempts
+- идемпотентность: повторная постановка задачи с тем же idempotency_key
+  не создает новую
+- задача, взятая воркером, который завис или упал, через JOBS_LOCK_TIMEOUT
+  секунд считается упавшей попыткой: возвращается в очередь с задержкой
+  или, если попытки исчерпаны, помечается ошибкой
+
+Задачи должны быть идемпотентными: после сбоя воркера задача может
+выполниться повторно.
+"""
+
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger("cloud_storage")
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+# имя задачи -> (функция, приоритет, число попыток)
+TASKS = {}
+# имя задачи -> период запуска в секундах
+PERIODIC_TASKS = {}
+
+
+def task(name, priority=PRIORITY_NORMAL, max_attempts=5, every=None):
+    """Регистрирует функцию как фоновую задачу
+
+    Параметры задачи передаются функции именованными аргументами и должны
+    сериализоваться в JSON. С every=N задача ставится воркерами сама раз в
+    N секунд.
+    """
+
+    def decorator(func):
+        TASKS[name] = (func, priority, max_attempts)
+        if every:
+            PERIODIC_TASKS[name] = every
+        return func
+
+    return decorator
+
+
+def enqueue(name, payload=None, priority=None, delay=0, key=None):
+    """Ставит задачу в очередь и возвращает ее запись
+
+    Вызывается внутри транзакции основного изменения. С key задача с тем же
+    ключом ставится только один раз.
+    """
+    _, default_priority, max_attempts = TASKS.get(name, (None, PRIORITY_NORMAL, 5))
+    fields = {
+        "name": name,
+        "payload": payload or {},
+        "priority": default_priority if priority is None else priority,
+        "max_attempts": max_attempts,
+        "run_at": timezone.now() + timedelta(seconds=delay),
+    }
+    if key is None:
+        job = Job.objects.create(**fields)
+    else:
+        try:
+            with transaction.atomic():
+                job, created = Job.objects.get_or_create(
+                    idempotency_key=key, defaults=fields
+                )
+        except IntegrityError:
+            # Тот же ключ одновременно поставлен из другого запроса
+            return Job.objects.get(idempotency_key=key)
+        if not created:
+            return job
+
+    if settings.JOBS_EAGER:
+        # Без воркера (разработка): задача выполняется после фиксации
+        transaction.on_commit(lambda: execute(claim(job.pk, "eager")))
+    return job
+
+
+def claim(job_id, worker):
+    """Берет задачу в работу, если ее еще не взял другой воркер"""
+    taken = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+        status=Job.RUNNING,
+        attempts=F("attempts") + 1,
+        locked_by=worker,
+        locked_at=timezone.now(),
+    )
+    if not taken:
+        return None
+    return Job.objects.get(pk=job_id)
+
+
+def claim_next(worker):
+    """Следующая готовая к выполнению задача с наибольшим приоритетом"""
+    while True:
+        with transaction.atomic():
+            job_id = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status=Job.QUEUED, run_at__lte=timezone.now())
+                .order_by("-priority", "run_at", "id")
+                .values_list("id", flat=True)
+                .first()
+            )
+            if job_id is None:
+                return None
+            job = claim(job_id, worker)
+        if job is not None:
+            return job
+
+
+def execute(job):
+    """Выполняет задачу и записывает результат"""
+    if job is None:
+        return
+    entry = TASKS.get(job.name)
+    started = time.monotonic()
+    try:
+        if entry is None:
+            raise LookupError(f"Неизвестная задача: {job.name}")
+        entry[0](**job.payload)
+    except Exception as e:
+        record_failure(job, f"{type(e).__name__}: {e}")
+        return
+
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE, finished_at=timezone.now(), last_error=""
+    )
+    logger.debug("Задача %s выполнена за %.3f с", job, time.monotonic() - started)
+
+
+def record_failure(job, error):
+    """Упавшая попытка: повтор с экспоненциальной задержкой или статус FAILED"""
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        delay = min(
+            settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1),
+            settings.JOBS_RETRY_MAX_DELAY,
+        )
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.QUEUED,
+            run_at=now + timedelta(seconds=delay),
+            locked_by="",
+            locked_at=None,
+            last_error=error,
+        )
+        logger.warning(
+            "Задача %s завершилась ошибкой (попытка %s), повтор через %s с: %s",
+            job,
+            job.attempts,
+            delay,
+            error,
+        )
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED,
+            finished_at=now,
+            locked_by="",
+            locked_at=None,
+            last_error=error,
+        )
+        logger.error(
+            "Задача %s не выполнена за %s попыток: %s", job, job.attempts, error
+        )
+
+
+def requeue_stale():
+    """Завершает попытки задач, зависших у упавших воркеров
+
+    Попытка уже учтена при взятии задачи (claim), поэтому задача, которая
+    каждый раз роняет воркер, не повторяется бесконечно.
+    """
+    deadline = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    with transaction.atomic():
+        stale = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                status=Job.RUNNING, locked_at__lt=deadline
+            )
+        )
+        for job in stale:
+            record_failure(
+                job,
+                f"Воркер {job.locked_by} не завершил задачу за "
+                f"{settings.JOBS_LOCK_TIMEOUT} с",
+            )
+
+
+def schedule_periodic():
+    """Ставит периодические задачи; ключ по номеру периода не дает дублей"""
+    now = time.time()
+    for name, every in PERIODIC_TASKS.items():
+        enqueue(name, key=f"{name}:{int(now // every)}")
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(stop, burst=False, poll_interval=1.0):
+    """Цикл воркера: выполняет задачи, пока stop() не вернет True
+
+    С burst=True воркер завершается, когда очередь опустеет.
+    """
+    worker = worker_name()
+    logger.info("Воркер фоновых задач запущен: %s", worker)
+    next_maintenance = 0
+    while not stop():
+        close_old_connections()
+        if time.monotonic() >= next_maintenance:
+            requeue_stale()
+            schedule_periodic()
+            next_maintenance = time.monotonic() + 60
+        job = claim_next(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        execute(job)
+    logger.info("Воркер фоновых задач остановлен: %s", worker)
@@ -0,0 +1,175 @@
+"""
+Неблокирующее журналирование
+
+Логгеры пишут в BackgroundHandler: в потоке запроса запись только получает
+готовый текст сообщения и ID запроса и кладется в очередь. Форматирование
+и запись выполняет фоновый поток QueueListener обработчиками логгера
+OUTPUT_LOGGER (консоль и файл, см. LOGGING в настройках), поэтому
+диск не задерживает ответ. При переполнении очереди записи отбрасываются,
+а не блокируют запрос.
+
+SamplingFilter оставляет только долю частых событий (скачивания и
+просмотры, см. LOG_SAMPLE_RATES), JsonFormatter пишет записи в JSON по одной
+на строку.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+# ID текущего запроса, выставляется request_id_middleware
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Логгер, обработчикам которого фоновый поток передает записи
+OUTPUT_LOGGER = "cloud_storage.log.output"
+
+# Атрибуты LogRecord, которые не относятся к полям extra
+STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # При остановке очередь может быть заполнена - дожидаемся места
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        # Повторная остановка (например, еще раз при выходе) ничего не делает
+        if self._thread is not None:
+            super().stop()
+
+
+class BackgroundHandler(logging.Handler):
+    """Передает записи обработчикам логгера output в фоновом потоке
+
+    Обработчики задаются в LOGGING у логгера output (без propagate), сам
+    логгер для записи не используется.
+    """
+
+    def __init__(self, output=OUTPUT_LOGGER, queue_size=10000):
+        super().__init__()
+        self.queue = queue.Queue(queue_size)
+        self.output = output
+        self.queue_size = queue_size
+        self.listener = None
+        self.listener_pid = None
+        self.start_lock = threading.Lock()
+        self.dropped = 0
+
+    def start_listener(self):
+        with self.start_lock:
+            if self.listener_pid == os.getpid():
+                return
+            if self.listener_pid is not None:
+                # Процесс создан fork: поток слушателя родителя здесь не работает
+                self.queue = queue.Queue(self.queue_size)
+            handlers = logging.getLogger(self.output).handlers
+            self.listener = QueueListener(
+                self.queue, *handlers, respect_handler_level=True
+            )
+            self.listener.start()
+            self.listener_pid = os.getpid()
+            atexit.register(self.listener.stop)
+
+    def emit(self, record):
+        if self.listener_pid != os.getpid():
+            self.start_listener()
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record):
+        # Текст сообщения собирается сейчас: аргументы могут измениться
+        # к моменту записи. Остальное форматирование - в потоке слушателя.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            warning = logging.makeLogRecord(
+                {
+                    "name": "cloud_storage",
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": "Очередь журнала переполнена, пропущено записей: %s",
+                    "args": (dropped,),
+                    "request_id": None,
+                }
+            )
+            try:
+                self.queue.put_nowait(warning)
+            except queue.Full:
+                self.dropped += dropped
+
+
+class SamplingFilter(logging.Filter):
+    """Оставляет долю записей частых событий
+
+    rates - {событие: доля от 0 до 1}; событие задается в extra={"event": ...}.
+    Предупреждения и ошибки не отбрасываются. В оставленную запись
+    добавляется sample_rate, чтобы по журналу можно было оценить полное число.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись журнала одной строкой JSON"""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRS and key not in data:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
@@ -0,0 +1,144 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cloud_storage.benchmarks import (
+    SCENARIOS,
+    Benchmark,
+    Client,
+    cleanup,
+    compare,
+    environment,
+    parse_size,
+)
+
+
+def size_list(value):
+    return [parse_size(item) for item in value.split(",") if item.strip()]
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочные замеры API на запущенном сервере: загрузка, скачивание, "
+        "список файлов, список пользователей, скачивание по ссылке. Данные "
+        "для замеров создаются в той же БД, поэтому команду нужно запускать "
+        "с настройками сервера"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/api")
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=SCENARIOS,
+            help="Сценарий (можно указать несколько раз), по умолчанию все",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Запросов на замер"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=1, help="Параллельных клиентов"
+        )
+        parser.add_argument(
+            "--upload-size",
+            type=parse_size,
+            default="1M",
+            help="Размер загружаемого файла (например, 256K, 1M)",
+        )
+        parser.add_argument(
+            "--download-sizes",
+            type=size_list,
+            default="4K,1M,16M",
+            help="Размеры скачиваемых файлов через запятую",
+        )
+        parser.add_argument(
+            "--file-counts",
+            type=int_list,
+            default="100,1000,10000",
+            help="Число файлов пользователя для замеров списка, через запятую",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=None,
+            help="Запрашивать список файлов страницами такого размера",
+        )
+        parser.add_argument(
+            "--user-counts",
+            type=int_list,
+            default="100,1000",
+            help="Число пользователей для замеров списка пользователей",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Вывести результаты в JSON"
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="FILE",
+            help="Сравнить с результатами прошлого запуска (вывод --json)",
+        )
+        parser.add_argument(
+            "--cleanup",
+            action="store_true",
+            help="Удалить пользователей bench_* и их файлы и выйти",
+        )
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            self.stdout.write(f"Удалено записей: {cleanup()}")
+            return
+
+        base_url = options["base_url"]
+        status, _ = Client(base_url).get("/csrf/")
+        if status != 200:
+            raise CommandError(f"Сервер недоступен: {base_url}")
+
+        benchmark = Benchmark(base_url, options["requests"], options["concurrency"])
+        runners = {
+            "upload": lambda: benchmark.upload(options["upload_size"]),
+            "download": lambda: benchmark.download(options["download_sizes"]),
+            "list": lambda: benchmark.list_files(
+                options["file_counts"], options["page_size"]
+            ),
+            "admin_users": lambda: benchmark.admin_users(options["user_counts"]),
+            "share_link": benchmark.share_link,
+        }
+        results = []
+        for scenario in options["scenario"] or SCENARIOS:
+            for result in runners[scenario]():
+                results.append(result)
+                if not options["json"]:
+                    self.write_result(result)
+
+        report = {"environment": environment(), "results": results}
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as baseline:
+                rows = compare(json.load(baseline), report)
+            # Сравнение не смешивается с JSON в stdout
+            output = self.stderr if options["json"] else self.stdout
+            for row in rows:
+                old, new = row["p50_ms"]
+                output.write(
+                    f"{row['scenario']:<12} {self.format_params(row['params']):<24} "
+                    f"p50 {old:.2f} -> {new:.2f} мс ({row['p50_change']:+.1f}%), "
+                    f"rps {row['rps_change']:+.1f}%"
+                )
+
+    def format_params(self, params):
+        return " ".join(f"{key}={value}" for key, value in params.items())
+
+    def write_result(self, result):
+        line = (
+            f"{result['scenario']:<12} {self.format_params(result['params']):<24} "
+            f"{result['rps']:>8.1f} запр/с  p50 {result['p50_ms']:.2f} мс  "
+            f"p95 {result['p95_ms']:.2f} мс  ошибок {result['errors']}"
+        )
+        if "mb_per_s" in result:
+            line += f"  {result['mb_per_s']:.1f} МБ/с"
+        self.stdout.write(line)
@@ -0,0 +1,151 @@
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from cloud_storage.blobs import acquire_blob, hash_file, make_temp_path, store_blob
+from cloud_storage.caching import forget_files, forget_share_links, forget_users
+from cloud_storage.models import File, User
+
+
+def stage_copy(full_path):
+    """Временная копия файла для передачи в хранилище блобов
+
+    На той же файловой системе это жесткая ссылка - без копирования байтов.
+    Исходный файл остается на месте, пока перенос не зафиксирован в БД.
+    """
+    tmp_path = make_temp_path()
+    try:
+        os.link(full_path, tmp_path)
+    except OSError:
+        shutil.copyfile(full_path, tmp_path)
+    return tmp_path
+
+
+def remove_legacy_file(full_path):
+    try:
+        os.remove(full_path)
+    except FileNotFoundError:
+        pass
+    # Удаляем опустевший каталог user_<имя>
+    try:
+        os.rmdir(os.path.dirname(full_path))
+    except OSError:
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит файлы, загруженные до появления хранилища блобов, в хранилище "
+        "блобов (каталоги blobs/<aa>/<bb>/). Работает без остановки сервиса: "
+        "файл доступен по старому пути, пока его запись не обновлена в БД"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Число файлов в одной пачке"
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=0,
+            help="Перенести не больше указанного числа файлов (0 - все)",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Пауза между пачками в секундах, чтобы не нагружать диск и БД",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        limit = options["limit"]
+        moved = missing = conflicts = 0
+        last_id = 0
+        while not limit or moved < limit:
+            batch = list(
+                File.objects.filter(blob__isnull=True, id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            for file_id in batch:
+                last_id = file_id
+                result = self.ingest_file(file_id)
+                if result == "moved":
+                    moved += 1
+                elif result == "missing":
+                    missing += 1
+                elif result == "conflict":
+                    conflicts += 1
+                if limit and moved >= limit:
+                    break
+            self.stdout.write(f"Перенесено: {moved}, последний ID: {last_id}")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Перенесено файлов: {moved}, не найдено на диске: {missing}, "
+                f"пропущено из-за конфликта размера: {conflicts}"
+            )
+        )
+
+    def ingest_file(self, file_id):
+        file_obj = File.objects.filter(pk=file_id, blob__isnull=True).first()
+        if file_obj is None:
+            return "skipped"
+        full_path = os.path.join(settings.MEDIA_ROOT, file_obj.file_path)
+        if not os.path.exists(full_path):
+            self.stderr.write(f"Файл не найден на диске: {full_path} (ID: {file_id})")
+            return "missing"
+
+        # Хеш считается вне транзакции, строка блокируется только на время
+        # переключения пути
+        sha256, size = hash_file(full_path)
+        tmp_path = stage_copy(full_path)
+        try:
+            store_blob(sha256, size, tmp_path)
+            with transaction.atomic():
+                recorded_size = (
+                    File.objects.select_for_update()
+                    .filter(pk=file_id, blob__isnull=True, file_path=file_obj.file_path)
+                    .values_list("size", flat=True)
+                    .first()
+                )
+                if recorded_size is None:
+                    # Файл удален или уже перенесен параллельно
+                    return "skipped"
+                blob = acquire_blob(sha256, size, source_path=tmp_path)
+                if blob is None:
+                    self.stderr.write(
+                        f"Блоб {sha256} уже хранится с размером, отличным от "
+                        f"{size} байт: {full_path} (ID: {file_id})"
+                    )
+                    return "conflict"
+                # Запрос без сигналов: разницу размеров счетчик пользователя
+                # получает здесь же
+                File.objects.filter(pk=file_id).update(
+                    blob=blob, file_path=blob.path, size=size
+                )
+                if size != recorded_size:
+                    User.objects.filter(pk=file_obj.user_id).update(
+                        total_bytes=Greatest(
+                            F("total_bytes") + (size - recorded_size), 0
+                        )
+                    )
+                    forget_users([file_obj.user_id])
+                forget_share_links([file_obj.special_link])
+                forget_files([file_id])
+                transaction.on_commit(lambda: remove_legacy_file(full_path))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return "moved"
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from cloud_storage.caching import forget_users
+from cloud_storage.models import UploadSession, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счетчики files_count и total_bytes пользователей по таблице "
+        "файлов, а резерв квоты reserved_bytes - по открытым сессиям загрузки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать расхождения, не исправляя их",
+        )
+
+    def handle(self, *args, **options):
+        # Резерв обычной загрузки живет только во время запроса, поэтому
+        # остаются только резервы незавершенных загрузок по частям
+        sessions_bytes = (
+            UploadSession.objects.filter(user=OuterRef("pk"))
+            .values("user")
+            .annotate(total=Sum("size"))
+            .values("total")
+        )
+        users = (
+            User.objects.annotate(
+                actual_count=Count("files"),
+                actual_bytes=Coalesce(Sum("files__size"), 0),
+                actual_reserved=Coalesce(Subquery(sessions_bytes), 0),
+            )
+            .exclude(
+                files_count=F("actual_count"),
+                total_bytes=F("actual_bytes"),
+                reserved_bytes=F("actual_reserved"),
+            )
+            .only("id", "username", "files_count", "total_bytes", "reserved_bytes")
+        )
+
+        fixed = 0
+        for user in users.iterator():
+            self.stdout.write(
+                f"{user.username}: файлов {user.files_count} -> {user.actual_count}, "
+                f"байт {user.total_bytes} -> {user.actual_bytes}, "
+                f"резерв {user.reserved_bytes} -> {user.actual_reserved}"
+            )
+            if not options["dry_run"]:
+                User.objects.filter(pk=user.pk).update(
+                    files_count=user.actual_count,
+                    total_bytes=user.actual_bytes,
+                    reserved_bytes=user.actual_reserved,
+                )
+                forget_users([user.pk])
+            fixed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Пользователей с расхождениями: {fixed}"))
@@ -0,0 +1,41 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from cloud_storage.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Запускает воркер фоновых задач (превью, сжатие, удаление файлов, "
+        "очистка). Можно запускать несколько воркеров одновременно"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Завершиться, когда в очереди не останется готовых задач",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Пауза между проверками пустой очереди в секундах",
+        )
+
+    def handle(self, *args, **options):
+        stopping = False
+
+        def stop(signum, frame):
+            # Текущая задача дорабатывается, новые не берутся
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        run_worker(
+            lambda: stopping,
+            burst=options["burst"],
+            poll_interval=options["poll_interval"],
+        )
@@ -0,0 +1,301 @@
+"""
+Метрики Prometheus
+
+metrics_middleware собирает по каждому запросу (route - имя маршрута URL,
+method - метод HTTP):
+
+- время до ответа и число ответов по кодам статуса
+- число запросов к БД и их суммарное время
+- байты загрузок и скачиваний, число идущих передач и скорость передачи
+
+Загрузкой считается запрос с телом не в JSON и не в форме (multipart,
+части файла), скачиванием - потоковый ответ (FileResponse,
+StreamingHttpResponse). Файлы, которые отдают nginx (X-Accel-Redirect) или S3
+по подписанной ссылке, в байты скачиваний не попадают.
+
+GET /metrics отдает метрики в текстовом формате Prometheus - по токену
+METRICS_TOKEN или сотруднику (is_staff), вошедшему в админку. У каждого
+процесса Gunicorn свои значения; чтобы /metrics возвращал сумму по всем
+процессам, задается переменная окружения PROMETHEUS_MULTIPROC_DIR - каталог,
+в котором процессы хранят значения в mmap-файлах (multiprocess-режим
+prometheus_client). Без пакета prometheus_client метрики не собираются,
+а /metrics отвечает 404.
+"""
+
+import contextvars
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+# Число и время запросов к БД в текущем запросе HTTP: [число, секунды]
+db_stats_var = contextvars.ContextVar("db_stats", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+# От 64 КБ/с до 1 ГБ/с
+THROUGHPUT_BUCKETS = tuple(4**n * 64 * 1024 for n in range(8))
+
+# Тела запросов API; остальные тела считаются загрузкой файлов
+API_CONTENT_TYPES = {"application/json", "application/x-www-form-urlencoded"}
+
+if prometheus_client is not None:
+    REQUEST_DURATION = prometheus_client.Histogram(
+        "mycloud_http_request_duration_seconds",
+        "Время от получения запроса до ответа",
+        ["route", "method"],
+        buckets=LATENCY_BUCKETS,
+    )
+    RESPONSES = prometheus_client.Counter(
+        "mycloud_http_responses",
+        "Ответы по кодам статуса",
+        ["route", "method", "status"],
+    )
+    DB_QUERIES = prometheus_client.Histogram(
+        "mycloud_db_queries_per_request",
+        "Число запросов к БД за запрос HTTP",
+        ["route", "method"],
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+    DB_DURATION = prometheus_client.Histogram(
+        "mycloud_db_duration_seconds_per_request",
+        "Суммарное время запросов к БД за запрос HTTP",
+        ["route", "method"],
+        buckets=LATENCY_BUCKETS,
+    )
+    TRANSFER_BYTES = prometheus_client.Counter(
+        "mycloud_transfer_bytes",
+        "Байты загрузок (upload) и скачиваний (download)",
+        ["direction", "route"],
+    )
+    TRANSFERS_IN_PROGRESS = prometheus_client.Gauge(
+        "mycloud_transfers_in_progress",
+        "Идущие загрузки и скачивания",
+        ["direction"],
+        multiprocess_mode="livesum",
+    )
+    TRANSFER_THROUGHPUT = prometheus_client.Histogram(
+        "mycloud_transfer_throughput_bytes_per_second",
+        "Скорость загрузок и скачиваний не меньше METRICS_THROUGHPUT_MIN_BYTES",
+        ["direction", "route"],
+        buckets=THROUGHPUT_BUCKETS,
+    )
+
+
+def count_query(execute, sql, params, many, context):
+    stats = db_stats_var.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - start
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # Сигнал приходит при каждом переподключении одного и того же connection
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+if prometheus_client is not None:
+    connection_created.connect(
+        install_query_counter, dispatch_uid="cloud_storage.metrics"
+    )
+
+
+def route_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unmatched"
+
+
+def upload_size(request):
+    """Размер тела загрузки или None, если запрос не загружает файл"""
+    if request.method not in ("POST", "PUT", "PATCH"):
+        return None
+    content_type = request.META.get("CONTENT_TYPE", "").split(";", 1)[0]
+    if content_type.strip().lower() in API_CONTENT_TYPES:
+        return None
+    try:
+        size = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return None
+    return size or None
+
+
+def record_transfer(direction, route, size, duration):
+    TRANSFER_BYTES.labels(direction, route).inc(size)
+    if size >= settings.METRICS_THROUGHPUT_MIN_BYTES and duration > 0:
+        TRANSFER_THROUGHPUT.labels(direction, route).observe(size / duration)
+
+
+class DownloadTracker:
+    """Идущее скачивание: учитывается в метриках один раз при close()"""
+
+    def __init__(self, route, sent=0):
+        self.route = route
+        self.sent = sent
+        self.start = time.perf_counter()
+        self.closed = False
+        TRANSFERS_IN_PROGRESS.labels("download").inc()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        TRANSFERS_IN_PROGRESS.labels("download").dec()
+        record_transfer(
+            "download", self.route, self.sent, time.perf_counter() - self.start
+        )
+
+
+class CountedContent(DownloadTracker):
+    """Тело потокового ответа, считающее отданные байты
+
+    Django вызывает close() тела ответа, когда ответ закрывается: после
+    отправки или при обрыве соединения.
+    """
+
+    def __init__(self, content, route):
+        super().__init__(route)
+        self.content = content
+
+    def __iter__(self):
+        for chunk in self.content:
+            self.sent += len(chunk)
+            yield chunk
+
+
+class AsyncCountedContent(DownloadTracker):
+    """Асинхронный вариант CountedContent"""
+
+    def __init__(self, content, route):
+        super().__init__(route)
+        self.content = content
+
+    async def __aiter__(self):
+        async for chunk in self.content:
+            self.sent += len(chunk)
+            yield chunk
+
+
+def track_download(response, route):
+    """Учитывает скачивание, когда ответ отправлен (при закрытии ответа)"""
+    if getattr(response, "file_to_stream", None) is None:
+        counted = AsyncCountedContent if response.is_async else CountedContent
+        response.streaming_content = counted(response.streaming_content, route)
+        return
+
+    # Файл не оборачивается: WSGI-сервер отдает его через sendfile и затем
+    # вызывает response.close(). Размер берется из Content-Length, даже если
+    # клиент оборвал скачивание.
+    tracker = DownloadTracker(route, int(response.get("Content-Length") or 0))
+    close = response.close
+
+    def close_response():
+        try:
+            close()
+        finally:
+            tracker.close()
+
+    response.close = close_response
+
+
+class RequestMetrics:
+    def __init__(self, request):
+        self.request = request
+        self.db_stats = [0, 0.0]
+        self.token = db_stats_var.set(self.db_stats)
+        self.upload_size = upload_size(request)
+        if self.upload_size is not None:
+            TRANSFERS_IN_PROGRESS.labels("upload").inc()
+        self.start = time.perf_counter()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.start
+        db_stats_var.reset(self.token)
+        if self.upload_size is not None:
+            TRANSFERS_IN_PROGRESS.labels("upload").dec()
+
+    def observe(self, response):
+        route = route_name(self.request)
+        method = self.request.method
+        REQUEST_DURATION.labels(route, method).observe(self.duration)
+        RESPONSES.labels(route, method, response.status_code).inc()
+        DB_QUERIES.labels(route, method).observe(self.db_stats[0])
+        DB_DURATION.labels(route, method).observe(self.db_stats[1])
+        if self.upload_size is not None:
+            # Время загрузки - время всего запроса, вместе с сохранением файла
+            record_transfer("upload", route, self.upload_size, self.duration)
+        if response.streaming:
+            track_download(response, route)
+        return response
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Собирает метрики запросов для /metrics"""
+    if prometheus_client is None:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            metrics = RequestMetrics(request)
+            try:
+                response = await get_response(request)
+            finally:
+                metrics.stop()
+            return metrics.observe(response)
+
+    else:
+
+        def middleware(request):
+            metrics = RequestMetrics(request)
+            try:
+                response = get_response(request)
+            finally:
+                metrics.stop()
+            return metrics.observe(response)
+
+    return middleware
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus
+
+    Доступны по заголовку Authorization: Bearer <METRICS_TOKEN> или
+    сотруднику, вошедшему в админку. Без токена и входа - 401.
+    """
+    if prometheus_client is None:
+        raise Http404("Метрики недоступны: не установлен prometheus_client")
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    )
+    if not authorized and not request.user.is_staff:
+        return JsonResponse({"error": "Нет доступа к метрикам"}, status=401)
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return HttpResponse(
+        prometheus_client.generate_latest(registry),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
@@ -0,0 +1,57 @@
+import re
+import uuid
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from .log import request_id_var
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# ID от прокси принимается, только если похож на идентификатор
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def start_request(request):
+    request_id = request.headers.get(REQUEST_ID_HEADER, "")
+    if not REQUEST_ID_RE.match(request_id):
+        request_id = uuid.uuid4().hex
+    request.request_id = request_id
+    return request_id_var.set(request_id)
+
+
+def finish_request(request, response, token):
+    request_id_var.reset(token)
+    response[REQUEST_ID_HEADER] = request.request_id
+    return response
+
+
+@sync_and_async_middleware
+def request_id_middleware(get_response):
+    """Присваивает запросу ID для журнала и возвращает его в X-Request-ID
+
+    ID из заголовка X-Request-ID (например, от nginx) сохраняется, чтобы
+    записи журнала приложения и прокси можно было сопоставить.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = start_request(request)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                request_id_var.reset(token)
+                raise
+            return finish_request(request, response, token)
+
+    else:
+
+        def middleware(request):
+            token = start_request(request)
+            try:
+                response = get_response(request)
+            except BaseException:
+                request_id_var.reset(token)
+                raise
+            return finish_request(request, response, token)
+
+    return middleware
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:26
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_storage_counters(apps, schema_editor):
+    User = apps.get_model('cloud_storage', 'User')
+    users = User.objects.annotate(
+        actual_count=Count('files'), actual_bytes=Sum('files__size')
+    ).filter(actual_count__gt=0)
+    for user in users.iterator():
+        User.objects.filter(pk=user.pk).update(
+            files_count=user.actual_count, total_bytes=user.actual_bytes or 0
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud_storage', '0004_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='files_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число файлов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='total_bytes',
+            field=models.BigIntegerField(default=0, verbose_name='Объем файлов (байты)'),
+        ),
+        migrations.RunPython(fill_storage_counters, migrations.RunPython.noop),
+    ]
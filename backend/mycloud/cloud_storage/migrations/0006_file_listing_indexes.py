@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:27
+
+from django.db import migrations, models
+
+INDEXES = [
+    models.Index(fields=['user', 'upload_date', 'id'], name='file_user_upload_idx'),
+    models.Index(fields=['user', 'size', 'id'], name='file_user_size_idx'),
+    models.Index(fields=['user', 'original_name', 'id'], name='file_user_name_idx'),
+    models.Index(fields=['user', 'original_name'], name='file_user_name_prefix_idx', opclasses=['', 'varchar_pattern_ops']),
+    models.Index(fields=['user', 'last_download_date'], name='file_user_download_idx'),
+]
+
+
+def add_indexes(apps, schema_editor):
+    File = apps.get_model('cloud_storage', 'File')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            # Не блокирует запись в большую таблицу на время построения
+            schema_editor.add_index(File, index, concurrently=True)
+        else:
+            schema_editor.add_index(File, index)
+
+
+def remove_indexes(apps, schema_editor):
+    File = apps.get_model('cloud_storage', 'File')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.remove_index(File, index, concurrently=True)
+        else:
+            schema_editor.remove_index(File, index)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cloud_storage', '0005_user_storage_counters'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='file', index=index) for index in INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_indexes, remove_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud_storage', '0006_file_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='reserved_bytes',
+            field=models.BigIntegerField(default=0, verbose_name='Зарезервировано загрузками (байты)'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='storage_quota',
+            field=models.BigIntegerField(blank=True, help_text='Пусто - квота по умолчанию, 0 - без ограничений', null=True, verbose_name='Квота хранилища (байты)'),
+        ),
+    ]
@@ -0,0 +1,113 @@
+"""
+Индексы поиска файлов (cloud_storage.search)
+
+PostgreSQL: расширение pg_trgm и GIN-индексы - полнотекстовый по имени
+и комментарию и триграммные по UPPER(имени) и UPPER(комментарию). Индексы
+строятся CONCURRENTLY, чтобы не блокировать запись в большую таблицу,
+поэтому миграция не атомарная.
+
+SQLite: таблица FTS5 с токенизатором trigram и триггеры, которые обновляют
+ее при изменении таблицы файлов.
+"""
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+def postgresql_indexes():
+    return [
+        # То же выражение, что cloud_storage.search.search_vector()
+        GinIndex(
+            SearchVector('original_name', weight='A', config='simple')
+            + SearchVector('comment', weight='B', config='simple'),
+            name='file_search_vector_idx',
+        ),
+        GinIndex(
+            OpClass(Upper('original_name'), name='gin_trgm_ops'),
+            name='file_name_trgm_idx',
+        ),
+        GinIndex(
+            OpClass(Upper('comment'), name='gin_trgm_ops'),
+            name='file_comment_trgm_idx',
+        ),
+    ]
+
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE cloud_storage_file_search USING fts5(
+        original_name, comment,
+        content='cloud_storage_file', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    "INSERT INTO cloud_storage_file_search(cloud_storage_file_search) VALUES ('rebuild')",
+    """
+    CREATE TRIGGER cloud_storage_file_search_insert AFTER INSERT ON cloud_storage_file
+    BEGIN
+        INSERT INTO cloud_storage_file_search(rowid, original_name, comment)
+        VALUES (new.id, new.original_name, new.comment);
+    END
+    """,
+    """
+    CREATE TRIGGER cloud_storage_file_search_delete AFTER DELETE ON cloud_storage_file
+    BEGIN
+        INSERT INTO cloud_storage_file_search(cloud_storage_file_search, rowid, original_name, comment)
+        VALUES ('delete', old.id, old.original_name, old.comment);
+    END
+    """,
+    """
+    CREATE TRIGGER cloud_storage_file_search_update
+    AFTER UPDATE OF original_name, comment ON cloud_storage_file
+    BEGIN
+        INSERT INTO cloud_storage_file_search(cloud_storage_file_search, rowid, original_name, comment)
+        VALUES ('delete', old.id, old.original_name, old.comment);
+        INSERT INTO cloud_storage_file_search(rowid, original_name, comment)
+        VALUES (new.id, new.original_name, new.comment);
+    END
+    """,
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS cloud_storage_file_search_insert',
+    'DROP TRIGGER IF EXISTS cloud_storage_file_search_delete',
+    'DROP TRIGGER IF EXISTS cloud_storage_file_search_update',
+    'DROP TABLE IF EXISTS cloud_storage_file_search',
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    File = apps.get_model('cloud_storage', 'File')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for index in postgresql_indexes():
+            schema_editor.add_index(File, index, concurrently=True)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    File = apps.get_model('cloud_storage', 'File')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for index in postgresql_indexes():
+            schema_editor.remove_index(File, index, concurrently=True)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cloud_storage', '0009_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
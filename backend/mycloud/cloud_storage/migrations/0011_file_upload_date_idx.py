@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+INDEX = models.Index(fields=['upload_date', 'id'], name='file_upload_date_idx')
+
+
+def add_index(apps, schema_editor):
+    File = apps.get_model('cloud_storage', 'File')
+    if schema_editor.connection.vendor == 'postgresql':
+        # Не блокирует запись в большую таблицу на время построения
+        schema_editor.add_index(File, INDEX, concurrently=True)
+    else:
+        schema_editor.add_index(File, INDEX)
+
+
+def remove_index(apps, schema_editor):
+    File = apps.get_model('cloud_storage', 'File')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(File, INDEX, concurrently=True)
+    else:
+        schema_editor.remove_index(File, INDEX)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cloud_storage', '0010_file_search'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='file', index=INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(add_index, remove_index),
+            ],
+        ),
+    ]
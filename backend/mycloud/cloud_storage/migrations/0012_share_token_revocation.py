@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud_storage', '0011_file_upload_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShareTokenRevocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_id', models.CharField(max_length=32, unique=True, verbose_name='ID ссылки')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+                ('revoked_at', models.DateTimeField(auto_now_add=True, verbose_name='Отозвана')),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revoked_share_tokens', to='cloud_storage.file', verbose_name='Файл')),
+            ],
+            options={
+                'verbose_name': 'Отозванная ссылка',
+                'verbose_name_plural': 'Отозванные ссылки',
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 import uuid
 
 
@@ -10,6 +12,21 @@ class User(AbstractUser):
     storage_path = models.CharField(
         max_length=255, blank=True, verbose_name="Путь к хранилищу"
     )
+    files_count = models.PositiveIntegerField(default=0, verbose_name="Число файлов")
+    total_bytes = models.BigIntegerField(default=0, verbose_name="Объем файлов (байты)")
+    storage_quota = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Квота хранилища (байты)",
+        help_text="Пусто - квота по умолчанию, 0 - без ограничений",
+    )
+    reserved_bytes = models.BigIntegerField(
+        default=0, verbose_name="Зарезервировано загрузками (байты)"
+    )
+
+    # Счетчики меняются только атомарными UPDATE (F-выражения), обычный save()
+    # не должен перезаписывать их устаревшими значениями из памяти
+    COUNTER_FIELDS = ("files_count", "total_bytes", "reserved_bytes")
 
     class Meta:
         verbose_name = "Пользователь"
@@ -21,7 +38,38 @@ class User(AbstractUser):
     def save(self, *args, **kwargs):
         if not self.storage_path:
             self.storage_path = f"user_{self.username}"
-            super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def effective_quota(self):
+        """Действующая квота в байтах или None, если ограничения нет"""
+        quota = self.storage_quota
+        if quota is None:
+            quota = settings.DEFAULT_STORAGE_QUOTA
+        return quota or None
+
+
+class Blob(models.Model):
+    """Уникальное содержимое файла, общее для всех File с тем же хешем"""
+
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name="SHA-256")
+    size = models.BigIntegerField(verbose_name="Размер (байты)")
+    path = models.CharField(max_length=500, verbose_name="Путь к файлу")
+    refcount = models.PositiveIntegerField(default=0, verbose_name="Число ссылок")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Блоб"
+        verbose_name_plural = "Блобы"
+
+    def __str__(self):
+        return self.sha256
 
 
 class File(models.Model):
@@ -41,17 +89,192 @@ class File(models.Model):
     last_download_date = models.DateTimeField(
         null=True, blank=True, verbose_name="Последнее скачивание"
     )
+    download_count = models.PositiveBigIntegerField(
+        default=0, verbose_name="Число скачиваний"
+    )
     special_link = models.UUIDField(
         default=uuid.uuid4,
         unique=True,
         editable=False,
         verbose_name="Специальная ссылка",
     )
+    blob = models.ForeignKey(
+        Blob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="files",
+        verbose_name="Содержимое",
+    )
 
     class Meta:
         verbose_name = "Файл"
         verbose_name_plural = "Файлы"
         ordering = ["-upload_date"]
+        indexes = [
+            # Постраничная выдача и сортировка списка файлов пользователя
+            models.Index(
+                fields=["user", "upload_date", "id"], name="file_user_upload_idx"
+            ),
+            models.Index(fields=["user", "size", "id"], name="file_user_size_idx"),
+            models.Index(
+                fields=["user", "original_name", "id"], name="file_user_name_idx"
+            ),
+            # Фильтр по началу имени (LIKE 'abc%') в PostgreSQL
+            models.Index(
+                fields=["user", "original_name"],
+                name="file_user_name_prefix_idx",
+                opclasses=["", "varchar_pattern_ops"],
+            ),
+            models.Index(
+                fields=["user", "last_download_date"], name="file_user_download_idx"
+            ),
+            # Список файлов в админке и date_hierarchy по всем пользователям
+            models.Index(fields=["upload_date", "id"], name="file_upload_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.original_name} ({self.user.username})"
+
+
+class ShareTokenRevocation(models.Model):
+    """Отозванная подписанная ссылка на файл (cloud_storage.share_tokens)
+
+    Строка нужна только до истечения срока ссылки, потом ее удаляет
+    периодическая задача.
+    """
+
+    token_id = models.CharField(max_length=32, unique=True, verbose_name="ID ссылки")
+    file = models.ForeignKey(
+        File,
+        on_delete=models.CASCADE,
+        related_name="revoked_share_tokens",
+        verbose_name="Файл",
+    )
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Действует до")
+    revoked_at = models.DateTimeField(auto_now_add=True, verbose_name="Отозвана")
+
+    class Meta:
+        verbose_name = "Отозванная ссылка"
+        verbose_name_plural = "Отозванные ссылки"
+
+    def __str__(self):
+        return f"{self.token_id} ({self.file_id})"
+
+
+class UploadSession(models.Model):
+    """Сессия возобновляемой загрузки файла по частям"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+        verbose_name="Пользователь",
+    )
+    original_name = models.CharField(
+        max_length=255, verbose_name="Оригинальное имя файла"
+    )
+    file_path = models.CharField(max_length=500, verbose_name="Путь к файлу")
+    size = models.BigIntegerField(verbose_name="Размер файла (байты)")
+    comment = models.TextField(blank=True, verbose_name="Комментарий")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Сессия загрузки"
+        verbose_name_plural = "Сессии загрузки"
 
     def __str__(self):
         return f"{self.original_name} ({self.user.username})"
+
+    def received_ranges(self):
+        """Объединенные диапазоны полученных байтов [start, end)"""
+        ranges = []
+        for offset, length in self.chunks.order_by("offset").values_list(
+            "offset", "length"
+        ):
+            end = offset + length
+            if ranges and offset <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([offset, end])
+        return ranges
+
+    def is_complete(self):
+        return self.received_ranges() == [[0, self.size]] or self.size == 0
+
+
+class UploadChunk(models.Model):
+    """Полученная часть файла в рамках сессии загрузки"""
+
+    session = models.ForeignKey(
+        UploadSession,
+        on_delete=models.CASCADE,
+        related_name="chunks",
+        verbose_name="Сессия загрузки",
+    )
+    offset = models.BigIntegerField(verbose_name="Смещение (байты)")
+    length = models.BigIntegerField(verbose_name="Длина (байты)")
+
+    class Meta:
+        verbose_name = "Часть загрузки"
+        verbose_name_plural = "Части загрузки"
+
+
+class Job(models.Model):
+    """Фоновая задача, которую выполняет воркер (manage.py run_jobs)"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Выполнена"),
+        (FAILED, "Ошибка"),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name="Задача")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    priority = models.SmallIntegerField(
+        default=0, verbose_name="Приоритет", help_text="Больше - раньше"
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name="Статус"
+    )
+    idempotency_key = models.CharField(
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="Ключ идемпотентности",
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5, verbose_name="Максимум попыток"
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Выполнить не раньше"
+    )
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Воркер")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взята")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            # Выборка следующей задачи воркером
+            models.Index(
+                fields=["-priority", "run_at", "id"],
+                name="job_queue_idx",
+                condition=models.Q(status="queued"),
+            ),
+            models.Index(fields=["status", "finished_at"], name="job_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
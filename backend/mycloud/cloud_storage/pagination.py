@@ -0,0 +1,139 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework import exceptions
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def parse_positive_int(request, param):
+    """Целое число из параметра запроса; None, если его нет или оно не больше 0"""
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise exceptions.ValidationError({param: "Ожидается целое число"})
+    return number if number > 0 else None
+
+
+class PageSizePagination(BasePagination):
+    """Размер страницы из параметра page_size и ответ {"next", "results"}"""
+
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    default_page_size = 100
+
+    def get_page_size(self, request):
+        page_size = parse_positive_int(request, self.page_size_query_param)
+        if page_size is None:
+            return None
+        return min(page_size, self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class KeysetPagination(PageSizePagination):
+    """Постраничная выдача по ключу (поле сортировки, id)
+
+    Курсор хранит значения ключа последней записи страницы, следующая страница
+    выбирается условием "после этого ключа" по составному индексу - время
+    ответа не зависит от того, насколько далеко листает клиент. Сортировку
+    задает фильтр (order_by(поле, id) в одном направлении).
+
+    Выдача всегда разбита на страницы: без page_size страница содержит
+    default_page_size записей, больше max_page_size не отдается.
+    """
+
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.page_size = self.get_page_size(request) or self.default_page_size
+
+        ordering = queryset.query.order_by
+        if len(ordering) != 2 or ordering[1].lstrip("-") != "id":
+            raise ValueError("KeysetPagination требует сортировки order_by(поле, id)")
+        self.field = ordering[0].lstrip("-")
+        self.descending = ordering[0].startswith("-")
+
+        if cursor is not None:
+            value, pk = self.decode_cursor(cursor, queryset.model)
+            lookup = "lt" if self.descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{lookup}": value})
+                | Q(**{self.field: value, f"id__{lookup}": pk})
+            )
+
+        page = list(queryset[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[: self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def encode_cursor(self, obj):
+        value = obj.serializable_value(self.field)
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        payload = json.dumps([value, obj.pk]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = model._meta.get_field(self.field).to_python(value)
+            return value, int(pk)
+        except Exception:
+            raise exceptions.NotFound("Неверный курсор")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last)
+        )
+
+
+class RankedPagination(PageSizePagination):
+    """Постраничная выдача по номеру страницы для результатов поиска
+
+    Порядок задает релевантность, которая вычисляется в запросе, поэтому
+    ключа для курсора в индексе нет. Выдача всегда разбита на страницы.
+    """
+
+    page_query_param = "page"
+    max_page_size = 100
+    default_page_size = 20
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request) or self.default_page_size
+        self.page = parse_positive_int(request, self.page_query_param) or 1
+        offset = (self.page - 1) * self.page_size
+        page = list(queryset[offset : offset + self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        return page[: self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.page_query_param, self.page + 1)
@@ -0,0 +1,307 @@
+"""
+Превью изображений и PDF
+
+Уменьшенные копии (WebP) строятся фоновой задачей generate_previews сразу
+после загрузки файла и складываются в дисковый кеш
+PREVIEW_CACHE_DIR. Кеш ограничен размером PREVIEW_CACHE_MAX_BYTES: при переполнении удаляются
+давно не запрашивавшиеся превью (время последнего обращения хранится в mtime
+файла). Превью одинакового содержимого общее - ключ кеша строится по хешу
+блоба, поэтому ответы можно кешировать на клиенте без ограничения по времени.
+
+Запрос не строит превью сам: если превью нет в кеше (еще не построено или
+вытеснено), ставится задача generate_previews, а клиент получает 202 с
+Retry-After.
+
+Для изображений нужен пакет Pillow, для PDF - утилита pdftoppm (poppler-utils).
+Без них превью для соответствующих типов недоступны.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+
+from .blobs import make_temp_path
+from .jobs import enqueue
+from .storage import get_storage
+
+logger = logging.getLogger("cloud_storage")
+
+# Имя размера -> наибольшая сторона превью в пикселях
+PREVIEW_SIZES = {
+    "small": 256,
+    "large": 1024,
+}
+DEFAULT_PREVIEW_SIZE = "small"
+PREVIEW_CONTENT_TYPE = "image/webp"
+CLIENT_CACHE_SECONDS = 365 * 24 * 60 * 60
+# Задача построения превью ставится не чаще раза в этот срок на файл
+REQUEUE_KEY = "preview:requested:{}"
+REQUEUE_INTERVAL = 60
+
+IMAGE_EXTENSIONS = {".bmp", ".gif", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp"}
+PDF_EXTENSIONS = {".pdf"}
+
+_cache_bytes = None
+_evict_lock = threading.Lock()
+
+
+def preview_kind(file_obj):
+    """Тип превью для файла: image, pdf или None, если превью не строится"""
+    extension = os.path.splitext(file_obj.original_name)[1].lower()
+    if extension in IMAGE_EXTENSIONS and _pillow_available():
+        return "image"
+    if extension in PDF_EXTENSIONS and shutil.which("pdftoppm"):
+        return "pdf"
+    return None
+
+
+def _pillow_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def preview_key(file_obj, size_name):
+    """Ключ кеша: по содержимому для блобов, по записи для старых файлов"""
+    if file_obj.blob_id:
+        content_key = file_obj.file_path.rsplit("/", 1)[-1]
+    else:
+        content_key = f"file{file_obj.id}-{int(file_obj.upload_date.timestamp())}"
+    return f"{content_key}-{size_name}"
+
+
+def cache_path(key):
+    shard = hashlib.md5(key.encode()).hexdigest()[:2]
+    return os.path.join(settings.PREVIEW_CACHE_DIR, shard, f"{key}.webp")
+
+
+def preview_response(request, file_obj, size_name):
+    """Ответ с превью или None, если превью для файла недоступно
+
+    Содержимое по ключу не меняется, поэтому клиент кеширует превью на год.
+    Если превью еще нет в кеше, ставит задачу построения и отвечает 202.
+    """
+    if not wants_preview(file_obj):
+        return None
+    etag = f'"{preview_key(file_obj, size_name)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        preview = open_cached_preview(file_obj, size_name)
+        if preview is None:
+            request_previews(file_obj)
+            response = JsonResponse(
+                {"message": "Превью строится, повторите запрос позже"}, status=202
+            )
+            response["Retry-After"] = str(settings.PREVIEW_RETRY_AFTER)
+            return response
+        response = FileResponse(preview, content_type=PREVIEW_CONTENT_TYPE)
+    response["ETag"] = etag
+    response["Cache-Control"] = f"private, max-age={CLIENT_CACHE_SECONDS}, immutable"
+    return response
+
+
+def get_preview(file_obj, size_name=DEFAULT_PREVIEW_SIZE):
+    """Путь к превью в кеше (строит его при необходимости) или None"""
+    if not wants_preview(file_obj):
+        return None
+    key = preview_key(file_obj, size_name)
+    path = cache_path(key)
+    if os.path.exists(path):
+        _touch(path)
+        return path
+    return _generate(file_obj, size_name, key)
+
+
+def open_cached_preview(file_obj, size_name=DEFAULT_PREVIEW_SIZE):
+    """Открытый файл превью из кеша или None, если его там нет
+
+    Открытый файл дочитывается, даже если его тут же вытеснят из кеша.
+    """
+    path = cache_path(preview_key(file_obj, size_name))
+    try:
+        preview = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    _touch(path)
+    return preview
+
+
+def request_previews(file_obj):
+    """Ставит задачу построения превью, если она не ставилась недавно"""
+    if cache.add(REQUEUE_KEY.format(file_obj.pk), True, REQUEUE_INTERVAL):
+        enqueue("generate_previews", {"file_id": file_obj.pk})
+
+
+def wants_preview(file_obj):
+    """Строится ли для файла превью"""
+    return (
+        preview_kind(file_obj) is not None
+        and file_obj.size <= settings.PREVIEW_MAX_SOURCE_SIZE
+    )
+
+
+def _generate(file_obj, size_name, key):
+    path = cache_path(key)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    max_side = PREVIEW_SIZES[size_name]
+    try:
+        with local_source(file_obj) as source_path:
+            if preview_kind(file_obj) == "pdf":
+                image = _render_pdf_page(source_path, max_side)
+            else:
+                image = _open_image(source_path, max_side)
+            with image:
+                image.save(tmp_path, "WEBP", quality=80, method=4)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.error("Ошибка построения превью файла %s: %s", file_obj.id, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    _account(path)
+    logger.debug("Построено превью %s файла %s", size_name, file_obj.id)
+    return path
+
+
+@contextmanager
+def local_source(file_obj):
+    """Путь к содержимому файла на локальном диске
+
+    Для удаленного хранилища файл на время построения превью скачивается во
+    временный файл.
+    """
+    storage = get_storage()
+    local_path = storage.local_path(file_obj.file_path)
+    if local_path is not None:
+        yield local_path
+        return
+
+    tmp_path = make_temp_path()
+    try:
+        with open(tmp_path, "wb") as destination:
+            for data in storage.read_range(file_obj.file_path, 0, file_obj.size - 1):
+                destination.write(data)
+        yield tmp_path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _open_image(source_path, max_side):
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as source:
+        # JPEG декодируется сразу в уменьшенном масштабе - в разы быстрее
+        source.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(source)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return image
+
+
+def _render_pdf_page(source_path, max_side):
+    from PIL import Image
+
+    output_prefix = make_temp_path()
+    subprocess.run(
+        [
+            "pdftoppm",
+            "-f",
+            "1",
+            "-l",
+            "1",
+            "-singlefile",
+            "-scale-to",
+            str(max_side),
+            "-png",
+            source_path,
+            output_prefix,
+        ],
+        check=True,
+        capture_output=True,
+        timeout=settings.PREVIEW_PDF_TIMEOUT,
+    )
+    png_path = f"{output_prefix}.png"
+    try:
+        with Image.open(png_path) as page:
+            page.load()
+            return page.copy()
+    finally:
+        os.remove(png_path)
+
+
+def _touch(path):
+    """Отмечает обращение к превью для вытеснения давно не использованных"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _account(added_path):
+    global _cache_bytes
+    with _evict_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _scan_cache()[1]
+        else:
+            _cache_bytes += os.path.getsize(added_path)
+        if _cache_bytes > settings.PREVIEW_CACHE_MAX_BYTES:
+            _cache_bytes = evict(keep=added_path)
+
+
+def _scan_cache():
+    entries = []
+    total = 0
+    for root, _, names in os.walk(settings.PREVIEW_CACHE_DIR):
+        for name in names:
+            if not name.endswith(".webp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    return entries, total
+
+
+def evict(keep=None):
+    """Удаляет давно не запрашивавшиеся превью до 90% лимита кеша
+
+    Только что построенное превью keep не удаляется. Возвращает размер кеша
+    после очистки.
+    """
+    entries, total = _scan_cache()
+    target = settings.PREVIEW_CACHE_MAX_BYTES * 0.9
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        logger.info("Из кеша превью удалено файлов: %s", removed)
+    return total
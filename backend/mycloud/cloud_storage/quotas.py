@@ -0,0 +1,45 @@
+"""
+Квоты хранилища пользователей
+
+Перед записью байтов загрузка резервирует место одним условным UPDATE:
+резерв проходит, только если total_bytes + reserved_bytes + размер не
+превышает квоту. Параллельные загрузки не могут вместе превысить квоту.
+
+Резерв снимается после загрузки. Если процесс прервался до этого (воркер
+убит по таймауту), резерв остается - его пересчитывает команда
+reconcile_storage_stats по открытым сессиям загрузки.
+"""
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import User
+
+
+class QuotaExceeded(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Превышена квота хранилища"
+    default_code = "quota_exceeded"
+
+
+def reserve_storage(user, nbytes):
+    """Резервирует nbytes под загрузку или выбрасывает QuotaExceeded"""
+    queryset = User.objects.filter(pk=user.pk)
+    quota = user.effective_quota
+    if quota is not None:
+        queryset = queryset.filter(
+            total_bytes__lte=quota - nbytes - F("reserved_bytes")
+        )
+    if not queryset.update(reserved_bytes=F("reserved_bytes") + nbytes):
+        raise QuotaExceeded()
+
+
+def release_storage(user, nbytes):
+    """Снимает резерв после завершения или отмены загрузки"""
+    if nbytes:
+        User.objects.filter(pk=user.pk).update(
+            # Резерв мог быть пересчитан во время загрузки и уже не включать ее
+            reserved_bytes=Greatest(F("reserved_bytes") - nbytes, 0)
+        )
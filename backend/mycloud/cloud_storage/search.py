@@ -0,0 +1,118 @@
+"""
+Поиск файлов по имени и комментарию
+
+PostgreSQL: полнотекстовый поиск по словам (to_tsvector с конфигурацией
+simple, слова запроса ищутся как префиксы), поиск подстроки и нечеткий
+поиск имени по триграммам (pg_trgm). Условия обслуживаются GIN-индексами
+из миграции 0010; база обновляет их сама при создании файла, переименовании
+и изменении комментария. Порядок - по релевантности: ts_rank (совпадение
+в имени весит больше, чем в комментарии) плюс сходство имени с запросом.
+Подстрока ищется по индексу, если слово запроса не короче 3 символов.
+
+SQLite (тесты): виртуальная таблица FTS5 с токенизатором trigram, которую
+обновляют триггеры; порядок по bm25, нечеткого поиска нет. Таблицу и
+триггеры создает миграция 0010. Миграции, пересоздающие таблицу файлов
+в SQLite, удаляют триггеры - их нужно создать заново.
+
+Другие СУБД: поиск подстроки без индекса и без ранжирования.
+"""
+
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Upper
+
+from .models import File
+
+SEARCH_CONFIG = "simple"
+SQLITE_SEARCH_TABLE = "cloud_storage_file_search"
+# Короче - триграммный индекс не используется
+MIN_TRIGRAM_LENGTH = 3
+MAX_QUERY_LENGTH = 200
+MAX_TERMS = 10
+
+
+def search_vector():
+    """Выражение индекса file_search_vector_idx (должно совпадать с миграцией)"""
+    return SearchVector(
+        "original_name", weight="A", config=SEARCH_CONFIG
+    ) + SearchVector("comment", weight="B", config=SEARCH_CONFIG)
+
+
+def search_files(queryset, query):
+    """Файлы queryset, подходящие под запрос, с релевантностью rank
+
+    Файл подходит, если каждое слово запроса встречается в имени или
+    комментарии (в PostgreSQL также при совпадении слов по началу или
+    похожем имени). Результат упорядочен по убыванию rank.
+    """
+    terms = query.split()[:MAX_TERMS]
+    if connection.vendor == "postgresql":
+        queryset = _search_postgresql(queryset, query, terms)
+    elif connection.vendor == "sqlite":
+        queryset = _search_sqlite(queryset, terms)
+    else:
+        queryset = queryset.filter(_substring_match(terms)).annotate(
+            rank=Value(0.0, output_field=FloatField())
+        )
+    return queryset.order_by("-rank", "-id")
+
+
+def _substring_match(terms):
+    match = Q()
+    for term in terms:
+        match &= Q(original_name__icontains=term) | Q(comment__icontains=term)
+    return match
+
+
+def _search_postgresql(queryset, query, terms):
+    # Поиск по GIN-индексам на UPPER(...) с gin_trgm_ops: icontains в
+    # PostgreSQL сравнивает UPPER(поле), нечеткий поиск - по тому же выражению
+    queryset = queryset.alias(name_upper=Upper("original_name"))
+    condition = _substring_match(terms) | Q(name_upper__trigram_word_similar=query)
+    rank = TrigramWordSimilarity(query, "original_name")
+
+    words = re.findall(r"\w+", query)[:MAX_TERMS]
+    if words:
+        ts_query = SearchQuery(
+            " & ".join(f"{word}:*" for word in words),
+            search_type="raw",
+            config=SEARCH_CONFIG,
+        )
+        queryset = queryset.alias(search=search_vector())
+        condition |= Q(search=ts_query)
+        rank = rank + SearchRank(search_vector(), ts_query)
+
+    return queryset.filter(condition).annotate(rank=rank)
+
+
+def _search_sqlite(queryset, terms):
+    # Токенизатор trigram находит подстроки от 3 символов, короткие слова
+    # проверяются через LIKE
+    long_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TRIGRAM_LENGTH]
+    queryset = queryset.filter(_substring_match(short_terms))
+    if not long_terms:
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+    match = " ".join('"{}"'.format(term.replace('"', '""')) for term in long_terms)
+    table = SQLITE_SEARCH_TABLE
+    queryset = queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", (match,))
+    )
+    # bm25 тем меньше, чем лучше совпадение; имя весит больше комментария
+    rank = RawSQL(
+        f"SELECT -bm25({table}, 10.0, 1.0) FROM {table} "
+        f"WHERE {table} MATCH %s AND rowid = {File._meta.db_table}.id",
+        (match,),
+        output_field=FloatField(),
+    )
+    return queryset.annotate(rank=rank)
@@ -1,5 +1,6 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import User, File
+from .models import User, File, UploadSession
 import re
 
 
@@ -64,8 +65,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
 
 class UserSerializer(serializers.ModelSerializer):
-    files_count = serializers.SerializerMethodField()
-    total_size = serializers.SerializerMethodField()
+    files_count = serializers.IntegerField(read_only=True)
+    total_size = serializers.IntegerField(source="total_bytes", read_only=True)
 
     class Meta:
         model = User
@@ -77,16 +78,13 @@ class UserSerializer(serializers.ModelSerializer):
             "is_admin",
             "files_count",
             "total_size",
+            "storage_quota",
         ]
 
-    def get_files_count(self, obj):
-        return obj.files.count()
-
-    def get_total_size(self, obj):
-        return sum(f.size for f in obj.files.all())
-
 
 class FileSerializer(serializers.ModelSerializer):
+    sha256 = serializers.CharField(source="blob.sha256", read_only=True, default=None)
+
     class Meta:
         model = File
         fields = [
@@ -96,6 +94,104 @@ class FileSerializer(serializers.ModelSerializer):
             "comment",
             "upload_date",
             "last_download_date",
+            "download_count",
             "special_link",
+            "sha256",
         ]
-        read_only_fields = ["upload_date", "last_download_date", "special_link"]
+        read_only_fields = [
+            "upload_date",
+            "last_download_date",
+            "download_count",
+            "special_link",
+        ]
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    received = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "original_name", "size", "comment", "created_at", "received"]
+        read_only_fields = ["id", "created_at"]
+
+    def validate_size(self, value):
+        if value < 0:
+            raise serializers.ValidationError(
+                "Размер файла не может быть отрицательным"
+            )
+        return value
+
+    def get_received(self, obj):
+        return obj.received_ranges()
+
+
+class UploadByHashSerializer(serializers.Serializer):
+    original_name = serializers.CharField(max_length=255)
+    sha256 = serializers.RegexField(r"^[0-9a-f]{64}$")
+    size = serializers.IntegerField(min_value=0)
+    comment = serializers.CharField(required=False, allow_blank=True)
+
+
+class ArchiveRequestSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    user_id = serializers.IntegerField(required=False)
+    format = serializers.ChoiceField(choices=["zip", "tar"], default="zip")
+
+    def validate(self, attrs):
+        if "ids" not in attrs and "user_id" not in attrs:
+            raise serializers.ValidationError("Укажите ids или user_id")
+        return attrs
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS,
+    )
+
+
+class BulkUpdateItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    original_name = serializers.CharField(max_length=255, required=False)
+    comment = serializers.CharField(allow_blank=True, required=False)
+
+    def validate(self, attrs):
+        if len(attrs) == 1:
+            raise serializers.ValidationError("Укажите original_name или comment")
+        return attrs
+
+
+class BulkUpdateSerializer(serializers.Serializer):
+    items = serializers.ListField(
+        child=BulkUpdateItemSerializer(),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS,
+    )
+
+    def validate_items(self, items):
+        ids = [item["id"] for item in items]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("ID файлов не должны повторяться")
+        return items
+
+
+class ShareTokenSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=serializers.ChoiceField(choices=["download", "view"]),
+        allow_empty=False,
+        default=["download"],
+    )
+    expires_in = serializers.IntegerField(
+        min_value=60,
+        max_value=settings.SHARE_TOKEN_MAX_TTL,
+        default=settings.SHARE_TOKEN_DEFAULT_TTL,
+    )
+    # Ограничение скорости отдачи, байт в секунду
+    rate_limit = serializers.IntegerField(min_value=1024, required=False)
+
+
+class RevokeShareTokenSerializer(serializers.Serializer):
+    token = serializers.CharField()
@@ -0,0 +1,185 @@
+"""
+Подписанные ссылки на файл со сроком действия
+
+Токен ссылки - подписанные HMAC (django.core.signing, ключ SECRET_KEY с
+учетом SECRET_KEY_FALLBACKS) поля: ID файла, срок действия, разрешенные
+операции (download, view), необязательное ограничение скорости отдачи и
+случайный ID токена. Подпись сравнивается за постоянное время, срок
+проверяется по самому токену, поэтому проверка не обращается к БД. Файл
+берется из кеша по ID (caching.get_cached_file).
+
+Отозванные токены хранятся в ShareTokenRevocation до истечения их срока.
+Результат проверки отзыва кешируется: неотозванный токен - на
+SHARE_TOKEN_REVOCATION_CACHE_TIMEOUT, отозванный - до конца срока.
+
+Ответ по ссылке можно кешировать во внешнем кеше (nginx, CDN): он помечается
+Cache-Control: public на SHARE_TOKEN_CACHE_MAX_AGE, но не дольше срока
+ссылки. Отозванная ссылка продолжает работать из внешнего кеша, пока не
+истечет max-age.
+
+Постоянные ссылки по File.special_link работают как раньше.
+"""
+
+import datetime
+import secrets
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+
+from .delivery import limit_rate
+from .models import ShareTokenRevocation
+
+SALT = "cloud_storage.share_token"
+REVOKED_KEY = "share:revoked:{}"
+# Операция -> код в токене
+OPERATIONS = {"download": "d", "view": "v"}
+# Токены длиннее не проверяются: HMAC от произвольно длинной строки не считается
+MAX_TOKEN_LENGTH = 512
+TOKEN_ID_BYTES = 12
+
+
+class InvalidShareToken(Exception):
+    """Ссылка не прошла проверку; status - код ответа"""
+
+    def __init__(self, message, status=404):
+        super().__init__(message)
+        self.status = status
+
+
+class ShareToken:
+    """Проверенные поля токена"""
+
+    def __init__(self, payload):
+        self.file_id = int(payload["f"])
+        self.expires = int(payload["e"])
+        codes = payload["o"]
+        self.operations = [op for op, code in OPERATIONS.items() if code in codes]
+        self.rate_limit = payload.get("r")
+        self.token_id = str(payload["i"])
+
+    @property
+    def expires_at(self):
+        return datetime.datetime.fromtimestamp(self.expires, tz=datetime.timezone.utc)
+
+    def remaining(self):
+        """Секунд до истечения срока (0, если истек)"""
+        return max(self.expires - int(time.time()), 0)
+
+    def allows(self, operation):
+        return operation in self.operations
+
+
+def issue_token(file_obj, operations, expires_in, rate_limit=None):
+    """Новый токен ссылки на файл; возвращает (токен, ShareToken)"""
+    payload = {
+        "f": file_obj.pk,
+        "e": int(time.time()) + expires_in,
+        "o": "".join(OPERATIONS[op] for op in operations),
+        "i": secrets.token_urlsafe(TOKEN_ID_BYTES),
+    }
+    if rate_limit:
+        payload["r"] = rate_limit
+    return signing.dumps(payload, salt=SALT), ShareToken(payload)
+
+
+def load_token(token, check_expiry=True):
+    """ShareToken по строке токена без обращения к БД и кешу
+
+    InvalidShareToken, если подпись не сходится или срок истек.
+    """
+    if len(token) > MAX_TOKEN_LENGTH:
+        raise InvalidShareToken("Ссылка недействительна")
+    try:
+        share_token = ShareToken(signing.loads(token, salt=SALT))
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise InvalidShareToken("Ссылка недействительна")
+    if check_expiry and not share_token.remaining():
+        raise InvalidShareToken("Срок действия ссылки истек", status=410)
+    return share_token
+
+
+def revocation_cache_key(token_id):
+    return REVOKED_KEY.format(token_id)
+
+
+def revocation_timeout(share_token, revoked):
+    remaining = max(share_token.remaining(), 1)
+    if revoked:
+        return remaining
+    return min(settings.SHARE_TOKEN_REVOCATION_CACHE_TIMEOUT, remaining)
+
+
+def is_revoked(share_token):
+    key = revocation_cache_key(share_token.token_id)
+    revoked = cache.get(key)
+    if revoked is None:
+        revoked = ShareTokenRevocation.objects.filter(
+            token_id=share_token.token_id
+        ).exists()
+        cache.set(key, revoked, revocation_timeout(share_token, revoked))
+    return revoked
+
+
+async def ais_revoked(share_token):
+    """Асинхронный вариант is_revoked"""
+    key = revocation_cache_key(share_token.token_id)
+    revoked = await cache.aget(key)
+    if revoked is None:
+        revoked = await ShareTokenRevocation.objects.filter(
+            token_id=share_token.token_id
+        ).aexists()
+        await cache.aset(key, revoked, revocation_timeout(share_token, revoked))
+    return revoked
+
+
+def check_token(token, operation):
+    """ShareToken, если ссылка действует и разрешает операцию"""
+    share_token = load_token(token)
+    if not share_token.allows(operation):
+        raise InvalidShareToken("Операция не разрешена ссылкой", status=403)
+    if is_revoked(share_token):
+        raise InvalidShareToken("Ссылка отозвана", status=410)
+    return share_token
+
+
+async def acheck_token(token, operation):
+    """Асинхронный вариант check_token"""
+    share_token = load_token(token)
+    if not share_token.allows(operation):
+        raise InvalidShareToken("Операция не разрешена ссылкой", status=403)
+    if await ais_revoked(share_token):
+        raise InvalidShareToken("Ссылка отозвана", status=410)
+    return share_token
+
+
+def revoke_token(share_token):
+    """Отзывает ссылку; после фиксации транзакции отзыв виден через кеш"""
+    ShareTokenRevocation.objects.get_or_create(
+        token_id=share_token.token_id,
+        defaults={
+            "file_id": share_token.file_id,
+            "expires_at": share_token.expires_at,
+        },
+    )
+    key = revocation_cache_key(share_token.token_id)
+    cache.delete(key)
+    transaction.on_commit(
+        lambda: cache.set(key, True, revocation_timeout(share_token, True))
+    )
+
+
+def share_response(response, share_token):
+    """Заголовки кеширования и ограничение скорости для ответа по ссылке"""
+    # Перенаправление на подписанный URL S3 не кешируется (private, no-store)
+    if response.status_code in (200, 206, 304) and not response.has_header(
+        "Cache-Control"
+    ):
+        max_age = min(settings.SHARE_TOKEN_CACHE_MAX_AGE, share_token.remaining())
+        patch_cache_control(response, public=True, max_age=max_age)
+    if share_token.rate_limit:
+        limit_rate(response, share_token.rate_limit)
+    return response
@@ -0,0 +1,133 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .blobs import release_blob
+from .caching import forget_files, forget_share_links, forget_tokens, forget_users
+from .compression import precompress_encodings
+from .jobs import enqueue
+from .models import File, User
+from .previews import wants_preview
+
+_state = threading.local()
+
+
+@contextmanager
+def suspend_file_counters():
+    """Отключает пообъектные обработчики удаления файлов
+
+    Для массовых операций, которые сами обновляют счетчики пользователей
+    и блобов одним запросом на всю пачку.
+    """
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = False
+
+
+def counters_suspended():
+    return getattr(_state, "suspended", False)
+
+
+@receiver(post_save, sender=File)
+def count_created_file(sender, instance, created, **kwargs):
+    """Учитывает новый файл в счетчиках пользователя"""
+    if created:
+        User.objects.filter(pk=instance.user_id).update(
+            files_count=F("files_count") + 1,
+            total_bytes=F("total_bytes") + instance.size,
+        )
+        forget_users([instance.user_id])
+
+
+@receiver(post_save, sender=File)
+def generate_file_previews(sender, instance, created, **kwargs):
+    """Ставит задачу построения превью для нового файла"""
+    if created and wants_preview(instance):
+        enqueue(
+            "generate_previews",
+            {"file_id": instance.pk},
+            key=f"previews:{instance.pk}",
+        )
+
+
+@receiver(post_save, sender=File)
+def precompress_file(sender, instance, created, **kwargs):
+    """Сохраняет сжатые копии текстовых файлов (PRECOMPRESS_ENCODINGS)"""
+    if not created:
+        return
+    encodings = precompress_encodings(instance)
+    if encodings:
+        # Одна задача на блоб, сколько бы файлов на него ни ссылалось
+        enqueue(
+            "precompress_file",
+            {
+                "file_path": instance.file_path,
+                "size": instance.size,
+                "encodings": encodings,
+            },
+            key=f"precompress:{instance.blob_id}",
+        )
+
+
+@receiver(post_delete, sender=File)
+def release_file_blob(sender, instance, **kwargs):
+    """Освобождает блоб при удалении файла (в том числе каскадном)"""
+    if instance.blob_id and not counters_suspended():
+        release_blob(instance.blob_id)
+
+
+@receiver(post_delete, sender=File)
+def count_deleted_file(sender, instance, **kwargs):
+    """Вычитает удаленный файл из счетчиков пользователя"""
+    if counters_suspended():
+        return
+    # Счетчики могли разойтись с таблицей файлов (их чинит
+    # reconcile_storage_stats); уход ниже нуля нарушил бы CHECK и сорвал
+    # само удаление
+    User.objects.filter(pk=instance.user_id).update(
+        files_count=Greatest(F("files_count") - 1, 0),
+        total_bytes=Greatest(F("total_bytes") - instance.size, 0),
+    )
+    forget_users([instance.user_id])
+
+
+@receiver(post_save, sender=File)
+def forget_changed_share_link(sender, instance, created, **kwargs):
+    """Сбрасывает кеш ссылок при переименовании или переносе файла"""
+    if not created:
+        forget_share_links([instance.special_link])
+        forget_files([instance.pk])
+
+
+@receiver(post_delete, sender=File)
+def forget_deleted_share_link(sender, instance, **kwargs):
+    # Массовое удаление сбрасывает кеш ссылок одной командой на всю пачку
+    if not counters_suspended():
+        forget_share_links([instance.special_link])
+        forget_files([instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    """Сбрасывает кеш токенов и current_user при изменении пользователя
+
+    Отключенный пользователь или измененные права действуют сразу, а не
+    после истечения AUTH_CACHE_TIMEOUT.
+    """
+    forget_users([instance.pk])
+    forget_tokens(
+        Token.objects.filter(user_id=instance.pk).values_list("key", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_tokens([instance.key])
@@ -0,0 +1,19 @@
+// Фильтр списка в админке с автодополнением: выбор значения открывает
+// список, отфильтрованный по нему (параметр из data-filter-parameter)
+'use strict';
+{
+    const $ = django.jQuery;
+
+    $(document).on('change', 'select[data-filter-parameter]', function() {
+        const url = new URL(window.location.href);
+        const parameter = this.dataset.filterParameter;
+        if (this.value) {
+            url.searchParams.set(parameter, this.value);
+        } else {
+            url.searchParams.delete(parameter);
+        }
+        // Номер страницы прежнего списка к новому не относится
+        url.searchParams.delete('p');
+        window.location.href = url.toString();
+    });
+}
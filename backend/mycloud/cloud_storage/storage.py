@@ -0,0 +1,227 @@
+"""
+Хранилище содержимого файлов
+
+Код приложения работает с файлами по относительному имени (File.file_path,
+Blob.path) только через объект хранилища, полученный из get_storage().
+Реализация выбирается настройкой FILE_STORAGE_BACKEND:
+- "local" - каталог MEDIA_ROOT на диске сервера приложения
+- "s3"    - бакет S3-совместимого хранилища (AWS S3, MinIO, Ceph RGW)
+
+Загрузки по-прежнему принимаются во временные файлы на локальном диске
+(MEDIA_ROOT/blobs/tmp): там считается хеш и собираются части файла, после
+чего готовый файл передается в хранилище методом save().
+"""
+
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger("cloud_storage")
+
+BLOCK_SIZE = 64 * 1024
+
+
+class Storage:
+    """Интерфейс хранилища"""
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def size(self, name):
+        raise NotImplementedError
+
+    def save(self, name, source_path, keep_source=False):
+        """Перемещает локальный файл source_path в хранилище под именем name
+
+        С keep_source=True source_path остается на месте.
+        """
+        raise NotImplementedError
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    def read_range(self, name, start, end):
+        """Генератор байтов в диапазоне [start, end] включительно"""
+        raise NotImplementedError
+
+    def local_path(self, name):
+        """Путь на диске сервера или None, если файл хранится не локально"""
+        return None
+
+    def url(self, name, content_type, disposition):
+        """Временная прямая ссылка на файл или None, если отдает приложение"""
+        return None
+
+
+class LocalStorage(Storage):
+    def __init__(self, location=None):
+        self.location = location or settings.MEDIA_ROOT
+
+    def local_path(self, name):
+        return os.path.join(self.location, name)
+
+    def exists(self, name):
+        return os.path.exists(self.local_path(name))
+
+    def size(self, name):
+        return os.path.getsize(self.local_path(name))
+
+    def save(self, name, source_path, keep_source=False):
+        full_path = self.local_path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if not keep_source:
+            os.replace(source_path, full_path)
+            return
+        # Жесткая ссылка не копирует байты; файл появляется под именем
+        # целиком - через временное имя и переименование
+        tmp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(source_path, tmp_path)
+        except OSError:
+            shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, full_path)
+
+    def delete(self, name):
+        full_path = self.local_path(name)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+            logger.info("Файл удален с диска: %s", full_path)
+
+    def read_range(self, name, start, end):
+        with open(self.local_path(name), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(BLOCK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+
+class S3Storage(Storage):
+    """Бакет S3-совместимого хранилища
+
+    Большие файлы отправляются multipart-загрузкой частями по
+    S3_MULTIPART_CHUNKSIZE в несколько потоков. Скачивание по умолчанию
+    идет по подписанной ссылке прямо из хранилища (S3_PRESIGNED_URLS),
+    иначе приложение само читает объект диапазонами.
+    """
+
+    def __init__(self):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError:
+            raise ImproperlyConfigured(
+                "Для FILE_STORAGE_BACKEND=s3 требуется пакет boto3"
+            )
+        if not settings.S3_BUCKET:
+            raise ImproperlyConfigured("Не задан S3_BUCKET")
+
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+            config=Config(
+                signature_version="s3v4",
+                s3={"addressing_style": settings.S3_ADDRESSING_STYLE},
+                max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            ),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=settings.S3_MULTIPART_CONCURRENCY,
+        )
+
+    def is_not_found(self, error):
+        code = error.response.get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def head(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as e:
+            if self.is_not_found(e):
+                return None
+            raise
+
+    def exists(self, name):
+        return self.head(name) is not None
+
+    def size(self, name):
+        head = self.head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head["ContentLength"]
+
+    def save(self, name, source_path, keep_source=False):
+        self.client.upload_file(
+            source_path, self.bucket, name, Config=self.transfer_config
+        )
+        if not keep_source:
+            os.remove(source_path)
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+        logger.info("Объект удален из хранилища: %s", name)
+
+    def read_range(self, name, start, end):
+        if end < start:
+            return
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=name, Range=f"bytes={start}-{end}"
+        )
+        body = response["Body"]
+        try:
+            yield from body.iter_chunks(BLOCK_SIZE)
+        finally:
+            body.close()
+
+    def url(self, name, content_type, disposition):
+        if not settings.S3_PRESIGNED_URLS:
+            return None
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": name,
+                "ResponseContentType": content_type,
+                "ResponseContentDisposition": disposition,
+            },
+            ExpiresIn=settings.S3_PRESIGNED_EXPIRY,
+        )
+
+
+STORAGE_BACKENDS = {
+    "local": LocalStorage,
+    "s3": S3Storage,
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Хранилище, заданное настройкой FILE_STORAGE_BACKEND (одно на процесс)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = settings.FILE_STORAGE_BACKEND
+                storage_class = STORAGE_BACKENDS.get(backend) or import_string(backend)
+                _storage = storage_class()
+    return _storage
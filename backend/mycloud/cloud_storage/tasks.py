@@ -0,0 +1,167 @@
+"""
+Фоновые задачи приложения (выполняются воркером manage.py run_jobs)
+"""
+
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .blobs import BLOBS_DIR, lock_blob_path, remove_stored_file
+from .compression import precompress, variant_paths
+from .jobs import PRIORITY_HIGH, PRIORITY_LOW, enqueue, task
+from .models import Blob, File, Job, ShareTokenRevocation, UploadSession
+from .previews import PREVIEW_SIZES, get_preview
+from .quotas import release_storage
+
+logger = logging.getLogger("cloud_storage")
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+@task("delete_blob_files")
+def delete_blob_files(paths):
+    """Удаляет из хранилища блобы без ссылок вместе с их сжатыми копиями
+
+    Блоб с тем же хешем мог быть загружен заново, пока задача ждала. Путь
+    проверяется и удаляется под той же блокировкой, что берет acquire_blob:
+    новая ссылка на блоб либо уже зафиксирована и файл остается, либо
+    acquire_blob увидит, что файла нет, и сохранит его заново.
+    """
+    for path in paths:
+        with transaction.atomic():
+            lock_blob_path(path)
+            if Blob.objects.filter(path=path).exists():
+                continue
+            for name in [path, *variant_paths(path)]:
+                remove_stored_file(name)
+
+
+@task("delete_stored_files")
+def delete_stored_files(paths):
+    """Удаляет из хранилища файлы, загруженные до хранилища блобов"""
+    for path in paths:
+        remove_stored_file(path)
+
+
+@task("generate_previews", priority=PRIORITY_HIGH, max_attempts=3)
+def generate_previews(file_id):
+    """Строит превью всех размеров для нового файла"""
+    file_obj = File.objects.filter(pk=file_id).first()
+    if file_obj is None:
+        return
+    for size_name in PREVIEW_SIZES:
+        get_preview(file_obj, size_name)
+
+
+@task("precompress_file", priority=PRIORITY_LOW, max_attempts=3)
+def precompress_file(file_path, size, encodings):
+    """Сохраняет сжатые копии блоба"""
+    if not Blob.objects.filter(path=file_path).exists():
+        return
+    for encoding in encodings:
+        precompress(file_path, size, encoding)
+
+
+def discard_upload_session(session):
+    """Удаляет сессию загрузки, ее временный файл и резерв квоты"""
+    file_full_path = os.path.join(settings.MEDIA_ROOT, session.file_path)
+    if os.path.exists(file_full_path):
+        try:
+            os.remove(file_full_path)
+        except Exception as e:
+            logger.error("Ошибка при удалении файла с диска: %s", e)
+    deleted, _ = UploadSession.objects.filter(pk=session.pk).delete()
+    # Резерв освобождается один раз, даже если сессию отменили параллельно
+    if deleted:
+        release_storage(session.user, session.size)
+
+
+@task("expire_upload_sessions", priority=PRIORITY_LOW, every=HOUR)
+def expire_upload_sessions():
+    """Отменяет загрузки по частям, не завершенные за UPLOAD_SESSION_TTL"""
+    deadline = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    expired = 0
+    for session in UploadSession.objects.filter(created_at__lt=deadline).select_related(
+        "user"
+    ):
+        discard_upload_session(session)
+        expired += 1
+    if expired:
+        logger.info("Отменено просроченных загрузок по частям: %s", expired)
+
+
+@task("cleanup_temp_files", priority=PRIORITY_LOW, every=DAY)
+def cleanup_temp_files():
+    """Удаляет временные файлы загрузок, брошенные после сбоев"""
+    tmp_dir = os.path.join(settings.MEDIA_ROOT, BLOBS_DIR, "tmp")
+    if not os.path.isdir(tmp_dir):
+        return
+    in_use = {
+        os.path.basename(path)
+        for path in UploadSession.objects.values_list("file_path", flat=True)
+    }
+    deadline = time.time() - DAY
+    removed = 0
+    with os.scandir(tmp_dir) as entries:
+        for entry in entries:
+            if entry.name in in_use or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    if removed:
+        logger.info("Удалено брошенных временных файлов: %s", removed)
+
+
+@task("purge_unused_blobs", priority=PRIORITY_LOW, every=HOUR)
+def purge_unused_blobs():
+    """Удаляет блобы без ссылок, оставшиеся от прерванных загрузок
+
+    store_blob заводит запись до отправки байтов; если загрузка в хранилище
+    не удалась или File так и не создан, запись остается с refcount=0.
+    Записи моложе суток не трогаются: их загрузка может еще идти.
+    """
+    deadline = timezone.now() - timedelta(seconds=DAY)
+    with transaction.atomic():
+        blobs = list(
+            Blob.objects.select_for_update(skip_locked=True)
+            .filter(refcount=0, created_at__lt=deadline)
+            .exclude(Exists(File.objects.filter(blob=OuterRef("pk"))))
+            .values_list("pk", "path")[:1000]
+        )
+        if not blobs:
+            return
+        Blob.objects.filter(pk__in=[pk for pk, _ in blobs]).delete()
+        enqueue("delete_blob_files", {"paths": [path for _, path in blobs]})
+    logger.info("Удалено блобов без ссылок: %s", len(blobs))
+
+
+@task("purge_finished_jobs", priority=PRIORITY_LOW, every=DAY)
+def purge_finished_jobs():
+    """Удаляет записи давно завершенных задач"""
+    deadline = timezone.now() - timedelta(days=settings.JOBS_RETENTION_DAYS)
+    deleted, _ = Job.objects.filter(
+        status__in=[Job.DONE, Job.FAILED], finished_at__lt=deadline
+    ).delete()
+    if deleted:
+        logger.info("Удалено завершенных задач: %s", deleted)
+
+
+@task("purge_share_token_revocations", priority=PRIORITY_LOW, every=DAY)
+def purge_share_token_revocations():
+    """Удаляет отзывы подписанных ссылок с истекшим сроком"""
+    deleted, _ = ShareTokenRevocation.objects.filter(
+        expires_at__lt=timezone.now()
+    ).delete()
+    if deleted:
+        logger.info("Удалено отзывов подписанных ссылок: %s", deleted)
@@ -0,0 +1,69 @@
+"""Общая основа тестов cloud_storage"""
+
+import os
+import shutil
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from cloud_storage.jobs import claim_next, execute
+from cloud_storage.models import User
+
+
+class CloudStorageTestCase(APITestCase):
+    """Тест API с пользователем alice, вошедшим по токену (self.client)
+
+    Кеш и файлы хранилища очищаются после каждого теста: БД откатывается,
+    а они - нет.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("alice")
+        self.client = self.client_for(self.user)
+
+    def tearDown(self):
+        cache.clear()
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDown()
+
+    def create_user(self, username, **fields):
+        return User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password="Password1!",
+            full_name=username.title(),
+            **fields,
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def upload(self, name, data, client=None, **fields):
+        """Загружает файл обычным запросом; возвращает ответ"""
+        return (client or self.client).post(
+            "/api/files/",
+            {"file": SimpleUploadedFile(name, data), **fields},
+            format="multipart",
+        )
+
+    def run_jobs(self):
+        """Выполняет готовые фоновые задачи, как run_jobs --burst"""
+        while True:
+            job = claim_next("test")
+            if job is None:
+                return
+            execute(job)
+
+    def stored_path(self, file_obj):
+        return os.path.join(settings.MEDIA_ROOT, file_obj.file_path)
+
+    def refresh(self, user):
+        user.refresh_from_db()
+        return user
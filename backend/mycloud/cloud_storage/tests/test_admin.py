@@ -0,0 +1,154 @@
+from datetime import datetime
+from unittest import mock
+
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from cloud_storage.admin import (
+    DateHierarchyQuerySet,
+    EstimatedCountPaginator,
+    estimated_count,
+)
+from cloud_storage.models import File
+
+from .base import CloudStorageTestCase
+
+
+@override_settings(ADMIN_ESTIMATED_COUNT_MIN=1000)
+class EstimatedCountPaginatorTests(CloudStorageTestCase):
+    """Оценка числа строк вместо COUNT(*) начиная с ADMIN_ESTIMATED_COUNT_MIN"""
+
+    def setUp(self):
+        super().setUp()
+        File.objects.bulk_create(
+            File(user=self.user, original_name=f"{i}.txt", file_path=f"x/{i}", size=1)
+            for i in range(5)
+        )
+
+    def count(self, estimate):
+        paginator = EstimatedCountPaginator(File.objects.order_by("id"), 2)
+        with mock.patch("cloud_storage.admin.estimated_count", return_value=estimate):
+            return paginator.count
+
+    def test_large_estimate_is_used(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(1000), 1000)
+        self.assertEqual(self.count(250000), 250000)
+
+    def test_small_estimate_is_counted_exactly(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(999), 5)
+        self.assertEqual(self.count(0), 5)
+
+    def test_without_estimate_is_counted_exactly(self):
+        self.assertEqual(self.count(None), 5)
+
+    def test_estimate_is_postgresql_only(self):
+        self.assertIsNone(estimated_count(File.objects.all()))
+
+
+class FileAdminTests(CloudStorageTestCase):
+    """Список файлов в админке: фильтр по пользователю и даты по индексу"""
+
+    def setUp(self):
+        super().setUp()
+        self.bob = self.create_user("bob")
+        self.admin = Client()
+        self.admin.force_login(
+            self.create_user("root", is_staff=True, is_superuser=True)
+        )
+        for user, count in [(self.user, 3), (self.bob, 2)]:
+            for i in range(count):
+                File.objects.create(
+                    user=user, original_name=f"{i}.txt", file_path=f"{user}/{i}", size=1
+                )
+
+    def changelist(self, query=""):
+        return self.admin.get(f"/admin/cloud_storage/file/{query}")
+
+    def test_user_filter(self):
+        response = self.changelist(f"?user={self.bob.pk}")
+
+        self.assertEqual(response.status_code, 200)
+        users = {file_obj.user_id for file_obj in response.context["cl"].result_list}
+        self.assertEqual(users, {self.bob.pk})
+        self.assertEqual(len(response.context["cl"].result_list), 2)
+
+    def test_invalid_user_filter(self):
+        response = self.changelist("?user=abc")
+
+        # Неверные параметры админка сбрасывает с ?e=1
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("e=1", response["Location"])
+
+    def test_filter_renders_autocomplete_widget(self):
+        response = self.changelist(f"?user={self.bob.pk}")
+
+        self.assertContains(response, 'data-filter-parameter="user"')
+        self.assertContains(response, "autocomplete_filter.js")
+        # В фильтре нет списка всех пользователей
+        self.assertNotContains(response, f"?user={self.user.pk}")
+
+    def test_autocomplete_finds_users(self):
+        response = self.admin.get(
+            "/admin/autocomplete/",
+            {
+                "app_label": "cloud_storage",
+                "model_name": "file",
+                "field_name": "user",
+                "term": "bo",
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        ids = [item["id"] for item in response.json()["results"]]
+        self.assertEqual(ids, [str(self.bob.pk)])
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_MIN=100)
+    def test_changelist_uses_estimate(self):
+        with mock.patch("cloud_storage.admin.estimated_count", return_value=12345):
+            response = self.changelist()
+        self.assertEqual(response.context["cl"].paginator.count, 12345)
+
+        with mock.patch("cloud_storage.admin.estimated_count", return_value=99):
+            response = self.changelist()
+        self.assertEqual(response.context["cl"].paginator.count, 5)
+
+    def test_date_hierarchy_periods(self):
+        dates = [
+            datetime(2025, 12, 31, 23, 0),
+            datetime(2026, 1, 5, 10, 0),
+            datetime(2026, 1, 20, 10, 0),
+            datetime(2026, 3, 1, 0, 30),
+        ]
+        File.objects.all().delete()
+        for i, date in enumerate(dates):
+            file_obj = File.objects.create(
+                user=self.user, original_name=f"{i}.txt", file_path=f"d/{i}", size=1
+            )
+            File.objects.filter(pk=file_obj.pk).update(
+                upload_date=timezone.make_aware(date)
+            )
+        queryset = DateHierarchyQuerySet(File)
+
+        def periods(kind, order="ASC"):
+            return [
+                period.replace(tzinfo=None)
+                for period in queryset.datetimes("upload_date", kind, order)
+            ]
+
+        self.assertEqual(periods("year"), [datetime(2025, 1, 1), datetime(2026, 1, 1)])
+        self.assertEqual(
+            periods("month", "DESC"),
+            [datetime(2026, 3, 1), datetime(2026, 1, 1), datetime(2025, 12, 1)],
+        )
+        self.assertEqual(
+            periods("day"),
+            [
+                datetime(2025, 12, 31),
+                datetime(2026, 1, 5),
+                datetime(2026, 1, 20),
+                datetime(2026, 3, 1),
+            ],
+        )
+        self.assertEqual(self.changelist("?upload_date__year=2026").status_code, 200)
@@ -0,0 +1,147 @@
+import io
+import tarfile
+import zipfile
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cloud_storage.archives import ArchiveSizeMismatch, tar_stream
+from cloud_storage.models import File
+
+from .base import CloudStorageTestCase
+
+
+class ArchiveTests(CloudStorageTestCase):
+    """Потоковое скачивание нескольких файлов ZIP- и TAR-архивом"""
+
+    def setUp(self):
+        super().setUp()
+        self.contents = {
+            "a.txt": b"text " * 1000,
+            "photo.jpg": b"\xff\xd8jpeg" * 100,
+            "b.bin": bytes(range(256)) * 3,
+        }
+        self.ids = [
+            self.upload(name, data).data["id"] for name, data in self.contents.items()
+        ]
+
+    def archive(self, ids, archive_format="zip", client=None):
+        return (client or self.client).post(
+            "/api/files/archive/", {"ids": ids, "format": archive_format}, format="json"
+        )
+
+    def body(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_zip_contents(self):
+        response = self.archive(self.ids)
+
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertIn('filename="files.zip"', response["Content-Disposition"])
+        with zipfile.ZipFile(io.BytesIO(self.body(response))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(
+                {name: archive.read(name) for name in archive.namelist()},
+                self.contents,
+            )
+            # Уже сжатые форматы не сжимаются повторно
+            self.assertEqual(
+                archive.getinfo("photo.jpg").compress_type, zipfile.ZIP_STORED
+            )
+            self.assertEqual(
+                archive.getinfo("a.txt").compress_type, zipfile.ZIP_DEFLATED
+            )
+
+    def test_tar_contents(self):
+        response = self.archive(self.ids, "tar")
+
+        self.assertEqual(response["Content-Type"], "application/x-tar")
+        with tarfile.open(fileobj=io.BytesIO(self.body(response))) as archive:
+            members = archive.getmembers()
+            self.assertEqual(
+                {m.name: archive.extractfile(m).read() for m in members},
+                self.contents,
+            )
+            self.assertTrue(all(m.mode == 0o644 for m in members))
+
+    def test_name_collisions_and_separators(self):
+        extra = [
+            self.upload("a.txt", b"second").data["id"],
+            self.upload("a.txt", b"third").data["id"],
+            self.upload("dir/../.hidden", b"x").data["id"],
+        ]
+        File.objects.filter(pk=extra[2]).update(original_name="../x\\y.txt")
+
+        response = self.archive(self.ids[:1] + extra)
+
+        with zipfile.ZipFile(io.BytesIO(self.body(response))) as archive:
+            self.assertEqual(
+                archive.namelist(), ["a.txt", "a (1).txt", "a (2).txt", "_x_y.txt"]
+            )
+            self.assertEqual(archive.read("a (2).txt"), b"third")
+
+    def test_only_own_files(self):
+        bob = self.client_for(self.create_user("bob"))
+
+        self.assertEqual(self.archive(self.ids, client=bob).status_code, 404)
+
+        bob_file = self.upload("bob.txt", b"bob", client=bob).data["id"]
+        response = self.archive([self.ids[0], bob_file])
+        with zipfile.ZipFile(io.BytesIO(self.body(response))) as archive:
+            self.assertEqual(archive.namelist(), ["a.txt"])
+
+    def test_member_limit(self):
+        with override_settings(ARCHIVE_MAX_FILES=2):
+            response = self.archive(self.ids)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.data)
+
+            self.assertEqual(self.archive(self.ids[:2]).status_code, 200)
+
+    def test_whole_storage_for_admin_only(self):
+        admin = self.client_for(self.create_user("admin", is_admin=True))
+        request = {"user_id": self.user.pk, "format": "tar"}
+
+        response = self.client.post("/api/files/archive/", request, format="json")
+        self.assertEqual(response.status_code, 403)
+
+        response = admin.post("/api/files/archive/", request, format="json")
+        with tarfile.open(fileobj=io.BytesIO(self.body(response))) as archive:
+            self.assertEqual(len(archive.getnames()), 3)
+
+    def test_download_counts_in_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.body(self.archive(self.ids))
+
+        updates = [
+            q
+            for q in queries.captured_queries
+            if q["sql"].startswith('UPDATE "cloud_storage_file"')
+        ]
+        self.assertEqual(len(updates), 1)
+        counts = File.objects.filter(pk__in=self.ids).values_list(
+            "download_count", flat=True
+        )
+        self.assertEqual(list(counts), [1, 1, 1])
+
+    def test_file_with_wrong_size_is_skipped(self):
+        file_obj = File.objects.get(pk=self.ids[0])
+        with open(self.stored_path(file_obj), "wb") as f:
+            f.write(b"short")
+
+        response = self.archive(self.ids, "tar")
+
+        with tarfile.open(fileobj=io.BytesIO(self.body(response))) as archive:
+            self.assertEqual(sorted(archive.getnames()), ["b.bin", "photo.jpg"])
+
+    def test_short_read_aborts_tar_stream(self):
+        files = list(File.objects.filter(pk__in=self.ids).order_by("id"))
+
+        with mock.patch(
+            "cloud_storage.archives.read_blocks", return_value=iter([b"short"])
+        ):
+            with self.assertRaises(ArchiveSizeMismatch):
+                b"".join(tar_stream(files))
@@ -0,0 +1,139 @@
+import asyncio
+import gzip
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+
+from cloud_storage import async_views
+from cloud_storage.compression import precompress
+from cloud_storage.models import File
+from cloud_storage.storage import LocalStorage
+
+from .base import CloudStorageTestCase
+
+# Асинхронные представления на тех же URL, что включает ASYNC_FILE_SERVING
+urlpatterns = [
+    path("api/files/<int:pk>/download/", async_views.download),
+    path("api/files/<int:pk>/view/", async_views.view),
+    path("api/download/<uuid:special_link>/", async_views.download_by_link),
+    path("api/", include("cloud_storage.urls")),
+]
+
+
+def in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTests(CloudStorageTestCase):
+    """Отдача файлов асинхронными представлениями под ASGI"""
+
+    data = b"async body " * 2000
+
+    def setUp(self):
+        super().setUp()
+        self.file_id = self.upload("a.txt", self.data).data["id"]
+        self.special_link = File.objects.get(pk=self.file_id).special_link
+        self.token = Token.objects.get(user=self.user).key
+        bob = self.create_user("bob")
+        self.bob_token = Token.objects.create(user=bob).key
+
+    async def get(self, url, headers=None, token=None):
+        """GET через ASGI-обработчик; token="" - анонимный запрос"""
+        headers = dict(headers or {})
+        if token is None:
+            token = self.token
+        if token:
+            headers["Authorization"] = f"Token {token}"
+        return await AsyncClient().get(url, headers=headers)
+
+    async def body(self, response):
+        self.assertTrue(response.is_async)
+        return b"".join([data async for data in response.streaming_content])
+
+    async def test_download(self):
+        response = await self.get(f"/api/files/{self.file_id}/download/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Length"], str(len(self.data)))
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertEqual(await self.body(response), self.data)
+
+    async def test_range_and_view(self):
+        response = await self.get(
+            f"/api/files/{self.file_id}/view/", headers={"Range": "bytes=6-10"}
+        )
+
+        self.assertEqual(response.status_code, 206)
+        self.assertIn("inline", response["Content-Disposition"])
+        self.assertEqual(await self.body(response), self.data[6:11])
+
+    async def test_download_by_link(self):
+        response = await self.get(f"/api/download/{self.special_link}/", token="")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await self.body(response), self.data)
+
+    async def test_access(self):
+        url = f"/api/files/{self.file_id}/download/"
+        self.assertEqual((await self.get(url, token="")).status_code, 401)
+
+        response = await self.get(url, token=self.bob_token)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_compressed_response(self):
+        response = await self.get(
+            f"/api/files/{self.file_id}/download/",
+            headers={"Accept-Encoding": "gzip"},
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(await self.body(response)), self.data)
+
+    async def test_precompressed_variant_is_found_outside_event_loop(self):
+        file_obj = await File.objects.aget(pk=self.file_id)
+        size = LocalStorage.size
+        calls = []
+
+        def checked_size(storage, name):
+            calls.append(in_event_loop())
+            return size(storage, name)
+
+        with override_settings(PRECOMPRESS_ENCODINGS=["gzip"]):
+            await sync_to_async(precompress)(file_obj.file_path, file_obj.size, "gzip")
+            with mock.patch.object(LocalStorage, "size", checked_size):
+                response = await self.get(
+                    f"/api/files/{self.file_id}/download/",
+                    headers={"Accept-Encoding": "gzip"},
+                )
+                body = await self.body(response)
+
+        self.assertEqual(response["Content-Length"], str(len(body)))
+        self.assertEqual(gzip.decompress(body), self.data)
+        self.assertEqual(calls, [False])
+
+    async def test_presigned_redirect_is_signed_outside_event_loop(self):
+        calls = []
+
+        def signed_url(storage, name, content_type, disposition):
+            calls.append(in_event_loop())
+            return f"https://s3.example.com/{name}?X-Amz-Signature=x"
+
+        # Хранилище без локальных путей, как S3
+        with (
+            mock.patch.object(LocalStorage, "local_path", return_value=None),
+            mock.patch.object(LocalStorage, "exists", return_value=True),
+            mock.patch.object(LocalStorage, "url", signed_url),
+        ):
+            response = await self.get(f"/api/files/{self.file_id}/download/")
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith("https://s3.example.com/"))
+        self.assertEqual(calls, [False])
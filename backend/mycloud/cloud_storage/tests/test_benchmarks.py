@@ -0,0 +1,34 @@
+from unittest import mock
+
+from cloud_storage.benchmarks import Benchmark, measure
+
+from .base import CloudStorageTestCase
+
+
+class BenchmarkThroughputTests(CloudStorageTestCase):
+    """МБ/с в результатах замеров считаются только по успешным запросам"""
+
+    def test_failed_responses_are_not_counted(self):
+        statuses = [200, 500, 204, 404]
+
+        with mock.patch("cloud_storage.benchmarks.Client"):
+            latencies, errors, nbytes, _ = measure(
+                "http://testserver",
+                None,
+                lambda client, number: (statuses[number], b"x" * 10),
+                requests=4,
+                concurrency=1,
+            )
+
+        self.assertEqual((len(latencies), errors, nbytes), (4, 2, 20))
+
+    def test_upload_throughput_excludes_failed_uploads(self):
+        # 4 загрузки по 1 МБ за 2 секунды, одна из них с ошибкой
+        with mock.patch(
+            "cloud_storage.benchmarks.measure", return_value=([0.1] * 4, 1, 0, 2.0)
+        ):
+            [result] = Benchmark("http://testserver", 4, 2).upload(1024**2)
+
+        self.assertEqual(result["errors"], 1)
+        self.assertAlmostEqual(result["rps"], 2.0)
+        self.assertAlmostEqual(result["mb_per_s"], 1.5)
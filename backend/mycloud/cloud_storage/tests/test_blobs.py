@@ -0,0 +1,199 @@
+import hashlib
+import os
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from cloud_storage.blobs import acquire_blob, make_temp_path, store_blob
+from cloud_storage.models import Blob, File, Job
+from cloud_storage.storage import LocalStorage
+from cloud_storage.tasks import purge_unused_blobs
+
+from .base import CloudStorageTestCase
+
+
+class BlobStoreTests(CloudStorageTestCase):
+    """Хранилище блобов: дедупликация и счетчики ссылок"""
+
+    data = b"content" * 1000
+
+    def setUp(self):
+        super().setUp()
+        self.bob = self.create_user("bob")
+        self.bob_client = self.client_for(self.bob)
+
+    def by_hash(self, client, sha256, size, name="copy.bin"):
+        return client.post(
+            "/api/files/by-hash/",
+            {"sha256": sha256, "size": size, "original_name": name},
+            format="json",
+        )
+
+    def test_same_content_is_stored_once(self):
+        first = self.upload("a.bin", self.data)
+        second = self.upload("b.bin", self.data, client=self.bob_client)
+
+        sha256 = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(first.data["sha256"], sha256)
+        self.assertEqual(second.data["sha256"], sha256)
+        blob = Blob.objects.get(sha256=sha256)
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(blob.size, len(self.data))
+        paths = set(File.objects.values_list("file_path", flat=True))
+        self.assertEqual(paths, {blob.path})
+
+    def test_blob_is_removed_with_last_reference(self):
+        first = self.upload("a.bin", self.data).data["id"]
+        second = self.upload("b.bin", self.data, client=self.bob_client).data["id"]
+        blob = Blob.objects.get()
+        stored = self.stored_path(File.objects.get(pk=first))
+
+        self.assertEqual(self.client.delete(f"/api/files/{first}/").status_code, 204)
+        self.run_jobs()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+        self.assertTrue(os.path.exists(stored))
+        response = self.bob_client.get(f"/api/files/{second}/download/")
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+
+        self.assertEqual(
+            self.bob_client.delete(f"/api/files/{second}/").status_code, 204
+        )
+        self.assertFalse(Blob.objects.exists())
+        # Файл удаляет фоновая задача delete_blob_files
+        self.assertTrue(os.path.exists(stored))
+        self.run_jobs()
+        self.assertFalse(os.path.exists(stored))
+
+    def test_reupload_after_delete_restores_content(self):
+        file_id = self.upload("a.bin", self.data).data["id"]
+        self.client.delete(f"/api/files/{file_id}/")
+        # Задача удаления файла выполняется уже после новой загрузки
+        file_id = self.upload("a.bin", self.data).data["id"]
+        self.run_jobs()
+
+        file_obj = File.objects.get(pk=file_id)
+        self.assertEqual(file_obj.blob.refcount, 1)
+        with open(self.stored_path(file_obj), "rb") as stored:
+            self.assertEqual(stored.read(), self.data)
+
+    def test_by_hash_copies_own_content(self):
+        sha256 = self.upload("a.bin", self.data).data["sha256"]
+
+        response = self.by_hash(self.client, sha256, len(self.data))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["sha256"], sha256)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+        user = self.refresh(self.user)
+        self.assertEqual(user.files_count, 2)
+        self.assertEqual(user.total_bytes, 2 * len(self.data))
+
+    def test_by_hash_does_not_reveal_other_users_content(self):
+        sha256 = self.upload("a.bin", self.data).data["sha256"]
+
+        response = self.by_hash(self.bob_client, sha256, len(self.data))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertFalse(File.objects.filter(user=self.bob).exists())
+        self.assertEqual(self.refresh(self.bob).reserved_bytes, 0)
+
+    def test_by_hash_unknown_content(self):
+        response = self.by_hash(self.client, "0" * 64, 10)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_hash_collision_with_different_size(self):
+        sha256 = hashlib.sha256(self.data).hexdigest()
+        Blob.objects.create(sha256=sha256, size=1, path="blobs/x", refcount=1)
+
+        response = self.upload("a.bin", self.data)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("error", response.data)
+        self.assertFalse(File.objects.exists())
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertEqual(self.refresh(self.user).reserved_bytes, 0)
+
+
+class BlobStorageCallTests(CloudStorageTestCase):
+    """Обращения к хранилищу идут вне транзакций с блокировкой блоба"""
+
+    data = b"content" * 1000
+
+    def setUp(self):
+        super().setUp()
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+
+    def track_storage_calls(self):
+        """Глубина транзакции при каждом вызове exists/save хранилища"""
+        depth = len(connection.atomic_blocks)
+        calls = []
+        for name in ("exists", "save"):
+            method = getattr(LocalStorage, name)
+
+            def tracked(storage, *args, method=method, name=name, **kwargs):
+                calls.append((name, len(connection.atomic_blocks) - depth))
+                return method(storage, *args, **kwargs)
+
+            patcher = mock.patch.object(LocalStorage, name, tracked)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return calls
+
+    def test_upload_stores_content_outside_transactions(self):
+        calls = self.track_storage_calls()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload("a.bin", self.data)
+            self.upload("b.bin", self.data)
+
+        self.assertEqual(calls, [("save", 0), ("exists", 0)])
+        self.assertEqual(Blob.objects.get().refcount, 2)
+
+    def test_failed_store_leaves_blob_for_sweep(self):
+        with mock.patch.object(LocalStorage, "save", side_effect=OSError("S3")):
+            response = self.upload("a.bin", self.data)
+        self.assertEqual(response.status_code, 500)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.refcount, 0)
+
+        # Запись моложе суток: загрузка могла еще не закончиться
+        purge_unused_blobs()
+        self.assertTrue(Blob.objects.exists())
+
+        Blob.objects.update(created_at=timezone.now() - timedelta(days=2))
+        purge_unused_blobs()
+        self.assertFalse(Blob.objects.exists())
+        job = Job.objects.get(name="delete_blob_files")
+        self.assertEqual(job.payload, {"paths": [blob.path]})
+
+    def test_sweep_keeps_referenced_blobs(self):
+        self.upload("a.bin", self.data)
+        Blob.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        purge_unused_blobs()
+
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+    def test_blob_swept_before_acquire_is_restored(self):
+        source = make_temp_path()
+        with open(source, "wb") as f:
+            f.write(self.data)
+        store_blob(self.sha256, len(self.data), source)
+        # Запись удалили, а файл - задача delete_blob_files
+        path = Blob.objects.get().path
+        Blob.objects.all().delete()
+        LocalStorage().delete(path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                blob = acquire_blob(self.sha256, len(self.data), source_path=source)
+
+        self.assertEqual(blob.refcount, 1)
+        with open(LocalStorage().local_path(path), "rb") as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertFalse(os.path.exists(source))
@@ -0,0 +1,139 @@
+import os
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from cloud_storage.models import Blob, File, Job, User
+
+from .base import CloudStorageTestCase
+
+
+class BulkOperationTests(CloudStorageTestCase):
+    """Массовое удаление и обновление файлов"""
+
+    def setUp(self):
+        super().setUp()
+        # Три файла с общим содержимым и два с разным
+        contents = [b"same", b"same", b"same", b"diff3", b"diff4"]
+        self.ids = [
+            self.upload(f"f{i}.txt", data).data["id"] for i, data in enumerate(contents)
+        ]
+        self.bob = self.create_user("bob")
+        self.bob_file = self.upload(
+            "bob.txt", b"bob", client=self.client_for(self.bob)
+        ).data["id"]
+
+    def bulk_delete(self, ids, client=None):
+        return (client or self.client).post(
+            "/api/files/bulk-delete/", {"ids": ids}, format="json"
+        )
+
+    def bulk_update(self, items):
+        return self.client.patch(
+            "/api/files/bulk-update/", {"items": items}, format="json"
+        )
+
+    def test_bulk_delete_updates_counters_and_blobs(self):
+        removed_path = self.stored_path(File.objects.get(pk=self.ids[3]))
+
+        response = self.bulk_delete([self.ids[0], self.ids[1], self.ids[3], 99999])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"id": self.ids[0], "status": "deleted"},
+                {"id": self.ids[1], "status": "deleted"},
+                {"id": self.ids[3], "status": "deleted"},
+                {"id": 99999, "status": "not_found"},
+            ],
+        )
+        user = self.refresh(self.user)
+        self.assertEqual(user.files_count, 2)
+        self.assertEqual(user.total_bytes, len(b"same") + len(b"diff4"))
+        kept = File.objects.select_related("blob").get(pk=self.ids[2])
+        self.assertEqual(kept.blob.refcount, 1)
+        self.assertEqual(Blob.objects.count(), 3)
+
+        self.run_jobs()
+        self.assertFalse(os.path.exists(removed_path))
+        self.assertTrue(os.path.exists(self.stored_path(kept)))
+
+    def test_bulk_delete_skips_other_users_files(self):
+        response = self.bulk_delete([self.bob_file])
+
+        self.assertEqual(
+            response.data["results"], [{"id": self.bob_file, "status": "not_found"}]
+        )
+        self.assertTrue(File.objects.filter(pk=self.bob_file).exists())
+        self.assertEqual(self.refresh(self.bob).files_count, 1)
+
+    def test_bulk_delete_is_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.bulk_delete(self.ids)
+
+        deletes = [
+            q
+            for q in queries.captured_queries
+            if q["sql"].startswith('DELETE FROM "cloud_storage_file"')
+        ]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(Job.objects.filter(name="delete_blob_files").count(), 1)
+        user = self.refresh(self.user)
+        self.assertEqual((user.files_count, user.total_bytes), (0, 0))
+
+    def test_bulk_delete_after_counter_drift(self):
+        User.objects.filter(pk=self.user.pk).update(files_count=1, total_bytes=3)
+
+        response = self.bulk_delete(self.ids)
+
+        self.assertEqual(response.status_code, 200)
+        user = self.refresh(self.user)
+        self.assertEqual((user.files_count, user.total_bytes), (0, 0))
+
+    def test_bulk_update(self):
+        response = self.bulk_update(
+            [
+                {"id": self.ids[2], "original_name": "x.txt"},
+                {"id": self.ids[4], "comment": "hi"},
+                {"id": self.bob_file, "comment": "z"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        statuses = [(item["id"], item["status"]) for item in response.data["results"]]
+        self.assertEqual(
+            statuses,
+            [
+                (self.ids[2], "updated"),
+                (self.ids[4], "updated"),
+                (self.bob_file, "not_found"),
+            ],
+        )
+        self.assertEqual(response.data["results"][0]["file"]["original_name"], "x.txt")
+        self.assertEqual(File.objects.get(pk=self.ids[2]).original_name, "x.txt")
+        self.assertEqual(File.objects.get(pk=self.ids[4]).comment, "hi")
+        self.assertEqual(File.objects.get(pk=self.bob_file).comment, "")
+
+    def test_bulk_update_requires_a_change(self):
+        response = self.bulk_update([{"id": self.ids[2]}])
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_bulk_delete_for_user(self):
+        admin_client = self.client_for(self.create_user("admin", is_admin=True))
+
+        response = self.client_for(self.bob).post(
+            f"/api/files/bulk-delete/?user_id={self.user.pk}",
+            {"ids": self.ids[:1]},
+            format="json",
+        )
+        self.assertEqual(response.data["results"][0]["status"], "not_found")
+
+        response = admin_client.post(
+            f"/api/files/bulk-delete/?user_id={self.user.pk}",
+            {"ids": self.ids[:1]},
+            format="json",
+        )
+        self.assertEqual(response.data["results"][0]["status"], "deleted")
+        self.assertEqual(self.refresh(self.user).files_count, 4)
@@ -0,0 +1,125 @@
+from rest_framework.authtoken.models import Token
+
+from cloud_storage.models import File
+
+from .base import CloudStorageTestCase
+
+
+class CacheInvalidationTests(CloudStorageTestCase):
+    """Кеш токенов, файлов по ссылке и current_user сбрасывается сразу"""
+
+    def current_user(self, client=None):
+        response = (client or self.client).get("/api/current-user/")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def shared(self, file_obj):
+        return self.client_class().get(f"/api/download/{file_obj.special_link}/")
+
+    def upload_file(self, name="a.txt", data=b"12345"):
+        return File.objects.get(pk=self.upload(name, data).data["id"])
+
+    def test_cached_token_skips_database(self):
+        self.current_user()
+
+        with self.assertNumQueries(0):
+            self.current_user()
+
+    def test_deactivated_user_loses_access(self):
+        self.current_user()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.client.get("/api/current-user/").status_code, 401)
+
+    def test_deleted_user_loses_access(self):
+        admin = self.client_for(self.create_user("admin", is_admin=True))
+        self.current_user()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = admin.delete(f"/api/users/{self.user.pk}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get("/api/current-user/").status_code, 401)
+
+    def test_deleted_token_loses_access(self):
+        self.current_user()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(user=self.user).delete()
+
+        self.assertEqual(self.client.get("/api/current-user/").status_code, 401)
+
+    def test_rights_change_is_visible_at_once(self):
+        admin = self.client_for(self.create_user("admin", is_admin=True))
+        self.assertFalse(self.current_user()["is_admin"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.patch(f"/api/users/{self.user.pk}/", {"is_admin": True})
+
+        self.assertTrue(self.current_user()["is_admin"])
+        # Права из кеша токена тоже обновлены
+        self.assertEqual(len(self.client.get("/api/users/").data), 2)
+
+    def test_current_user_counters_follow_uploads_and_deletes(self):
+        file_obj = self.upload_file()
+        self.assertEqual(self.current_user()["files_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload("b.txt", b"123")
+        data = self.current_user()
+        self.assertEqual((data["files_count"], data["total_size"]), (2, 8))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/files/{file_obj.pk}/")
+        data = self.current_user()
+        self.assertEqual((data["files_count"], data["total_size"]), (1, 3))
+
+    def test_current_user_counters_follow_bulk_delete(self):
+        ids = [self.upload_file(name).pk for name in ["a.txt", "b.txt"]]
+        self.assertEqual(self.current_user()["files_count"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/files/bulk-delete/", {"ids": ids}, format="json")
+
+        self.assertEqual(self.current_user()["files_count"], 0)
+
+    def test_share_link_follows_rename(self):
+        file_obj = self.upload_file()
+        self.assertIn("a.txt", self.shared(file_obj)["Content-Disposition"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f"/api/files/{file_obj.pk}/", {"original_name": "renamed.txt"}
+            )
+
+        self.assertIn("renamed.txt", self.shared(file_obj)["Content-Disposition"])
+
+    def test_share_link_follows_bulk_rename(self):
+        file_obj = self.upload_file()
+        self.shared(file_obj)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                "/api/files/bulk-update/",
+                {"items": [{"id": file_obj.pk, "original_name": "bulk.txt"}]},
+                format="json",
+            )
+
+        self.assertIn("bulk.txt", self.shared(file_obj)["Content-Disposition"])
+
+    def test_share_link_stops_after_delete(self):
+        first, second = self.upload_file("a.txt"), self.upload_file("b.txt")
+        self.assertEqual(self.shared(first).status_code, 200)
+        self.assertEqual(self.shared(second).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/files/{first.pk}/")
+            self.client.post(
+                "/api/files/bulk-delete/", {"ids": [second.pk]}, format="json"
+            )
+
+        self.assertEqual(self.shared(first).status_code, 404)
+        self.assertEqual(self.shared(second).status_code, 404)
@@ -0,0 +1,220 @@
+import gzip
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils import timezone
+
+from cloud_storage.compression import (
+    compress_stream,
+    encoding_available,
+    negotiate_encoding,
+    variant_name,
+)
+from cloud_storage.models import File, Job
+
+from .base import CloudStorageTestCase
+
+
+def decompress(data, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "br":
+        import brotli
+
+        return brotli.decompress(data)
+    import zstandard
+
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class NegotiateEncodingTests(SimpleTestCase):
+    """Выбор кодировки по Accept-Encoding, типу и размеру файла"""
+
+    def negotiate(self, accept=None, content_type="text/plain", size=1000, **headers):
+        if accept is not None:
+            headers["HTTP_ACCEPT_ENCODING"] = accept
+        request = RequestFactory().get("/", **headers)
+        with mock.patch(
+            "cloud_storage.compression.encoding_available", return_value=True
+        ):
+            return negotiate_encoding(request, content_type, size)
+
+    def test_preferred_encoding(self):
+        self.assertEqual(self.negotiate("gzip, deflate, br, zstd"), "zstd")
+        self.assertEqual(self.negotiate("gzip, br"), "br")
+        self.assertEqual(self.negotiate("GZIP"), "gzip")
+
+    def test_q_values(self):
+        self.assertEqual(self.negotiate("zstd;q=0, br;q=0.5, gzip"), "br")
+        self.assertEqual(self.negotiate("br;q=0, gzip;q=0.1"), "gzip")
+        self.assertIsNone(self.negotiate("gzip;q=0"))
+        self.assertIsNone(self.negotiate("gzip;q=abc"))
+
+    def test_wildcard(self):
+        self.assertEqual(self.negotiate("*"), "zstd")
+        self.assertEqual(self.negotiate("zstd;q=0, *"), "br")
+        self.assertIsNone(self.negotiate("*;q=0"))
+        self.assertEqual(self.negotiate("gzip, *;q=0"), "gzip")
+
+    def test_identity_only(self):
+        self.assertIsNone(self.negotiate())
+        self.assertIsNone(self.negotiate(""))
+        self.assertIsNone(self.negotiate("identity"))
+        self.assertIsNone(self.negotiate("deflate, identity;q=0.5"))
+
+    def test_content_type_and_size(self):
+        self.assertEqual(self.negotiate("gzip", "application/json"), "gzip")
+        self.assertEqual(self.negotiate("gzip", "text/html; charset=utf-8"), "gzip")
+        self.assertIsNone(self.negotiate("gzip", "image/png"))
+        self.assertIsNone(self.negotiate("gzip", size=99))
+
+    def test_range_is_not_compressed(self):
+        self.assertIsNone(self.negotiate("gzip", HTTP_RANGE="bytes=0-9"))
+
+    def test_unavailable_encoding_is_skipped(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="zstd, br, gzip")
+        with mock.patch(
+            "cloud_storage.compression.encoding_available",
+            side_effect=lambda encoding: encoding == "gzip",
+        ):
+            self.assertEqual(negotiate_encoding(request, "text/plain", 1000), "gzip")
+
+
+class CompressStreamTests(SimpleTestCase):
+    data = b"".join(b"line %d of the file\n" % i for i in range(5000))
+
+    def chunks(self):
+        for start in range(0, len(self.data), 8192):
+            yield self.data[start : start + 8192]
+
+    def test_round_trip(self):
+        for encoding in ["gzip", "br", "zstd"]:
+            with self.subTest(encoding=encoding):
+                if not encoding_available(encoding):
+                    self.skipTest(f"нет модуля для {encoding}")
+                for level in [None, 1]:
+                    compressed = b"".join(
+                        compress_stream(self.chunks(), encoding, level)
+                    )
+                    self.assertLess(len(compressed), len(self.data))
+                    self.assertEqual(decompress(compressed, encoding), self.data)
+
+    def test_empty_input(self):
+        compressed = b"".join(compress_stream(iter([]), "gzip"))
+
+        self.assertEqual(gzip.decompress(compressed), b"")
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressedDeliveryTests(CloudStorageTestCase):
+    """Сжатие при отдаче файла и сохраненные сжатые копии"""
+
+    data = b"compressible text\n" * 500
+
+    def upload_text(self):
+        return File.objects.get(pk=self.upload("a.txt", self.data).data["id"])
+
+    def download(self, file_obj, **headers):
+        return self.client.get(f"/api/files/{file_obj.pk}/download/", headers=headers)
+
+    def test_compressed_on_the_fly(self):
+        file_obj = self.upload_text()
+
+        response = self.download(file_obj, **{"Accept-Encoding": "gzip"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertFalse(response.has_header("Accept-Ranges"))
+        body = b"".join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), self.data)
+
+    def test_uncompressed_response_varies_by_encoding(self):
+        file_obj = self.upload_text()
+
+        response = self.download(file_obj)
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+
+    def test_range_request_is_not_compressed(self):
+        file_obj = self.upload_text()
+
+        response = self.download(
+            file_obj, **{"Accept-Encoding": "gzip", "Range": "bytes=0-16"}
+        )
+
+        self.assertEqual(response.status_code, 206)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), self.data[:17])
+
+    def test_binary_file_is_not_compressed(self):
+        file_obj = File.objects.get(pk=self.upload("a.png", self.data).data["id"])
+
+        response = self.download(file_obj, **{"Accept-Encoding": "gzip"})
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertNotIn("Accept-Encoding", response.get("Vary", ""))
+
+    @override_settings(PRECOMPRESS_ENCODINGS=["gzip"])
+    def test_precompressed_variant_is_served(self):
+        file_obj = self.upload_text()
+        self.run_jobs()
+        variant = os.path.join(
+            settings.MEDIA_ROOT, variant_name(file_obj.file_path, "gzip")
+        )
+        with open(variant, "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), self.data)
+
+        # Отдается именно сохраненная копия, а не сжатие на лету
+        stored = gzip.compress(b"stored variant")
+        with open(variant, "wb") as f:
+            f.write(stored)
+        response = self.download(file_obj, **{"Accept-Encoding": "gzip"})
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Length"], str(len(stored)))
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(b"".join(response.streaming_content), stored)
+
+    @override_settings(PRECOMPRESS_ENCODINGS=["gzip"])
+    def test_variant_is_not_used_for_other_encodings(self):
+        if not encoding_available("br"):
+            self.skipTest("нет модуля brotli")
+        file_obj = self.upload_text()
+        self.run_jobs()
+
+        response = self.download(file_obj, **{"Accept-Encoding": "br, gzip"})
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        body = b"".join(response.streaming_content)
+        self.assertEqual(decompress(body, "br"), self.data)
+
+    @override_settings(PRECOMPRESS_ENCODINGS=["gzip"])
+    def test_precompress_failure_is_retried(self):
+        file_obj = self.upload_text()
+        tmp_dir = os.path.join(settings.MEDIA_ROOT, "blobs", "tmp")
+
+        with mock.patch(
+            "cloud_storage.storage.LocalStorage.save", side_effect=OSError("диск")
+        ):
+            self.run_jobs()
+
+        job = Job.objects.get(name="precompress_file")
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("OSError: диск", job.last_error)
+        self.assertEqual(os.listdir(tmp_dir), [])
+        variant = variant_name(file_obj.file_path, "gzip")
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, variant)))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.run_jobs()
+
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.DONE)
+        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, variant)))
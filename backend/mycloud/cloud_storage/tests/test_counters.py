@@ -0,0 +1,70 @@
+import io
+
+from django.core.management import call_command
+
+from cloud_storage.models import File, User
+
+from .base import CloudStorageTestCase
+
+
+class UserCounterTests(CloudStorageTestCase):
+    """Счетчики files_count и total_bytes на строке пользователя"""
+
+    def counters(self, user=None):
+        user = self.refresh(user or self.user)
+        return user.files_count, user.total_bytes
+
+    def test_upload_and_delete(self):
+        first = self.upload("a.txt", b"12345").data["id"]
+        self.upload("b.txt", b"123").data["id"]
+        self.assertEqual(self.counters(), (2, 8))
+
+        self.client.delete(f"/api/files/{first}/")
+
+        self.assertEqual(self.counters(), (1, 3))
+
+    def test_current_user_reports_counters(self):
+        self.upload("a.txt", b"12345")
+
+        response = self.client.get("/api/current-user/")
+
+        self.assertEqual(response.data["files_count"], 1)
+        self.assertEqual(response.data["total_size"], 5)
+
+    def test_admin_user_list_reports_counters(self):
+        admin = self.client_for(self.create_user("admin", is_admin=True))
+        self.upload("a.txt", b"12345")
+
+        response = admin.get("/api/users/")
+
+        alice = next(item for item in response.data if item["username"] == "alice")
+        self.assertEqual((alice["files_count"], alice["total_size"]), (1, 5))
+
+    def test_delete_after_drift_does_not_go_negative(self):
+        file_id = self.upload("a.txt", b"12345").data["id"]
+        User.objects.filter(pk=self.user.pk).update(files_count=0, total_bytes=2)
+
+        response = self.client.delete(f"/api/files/{file_id}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(File.objects.filter(pk=file_id).exists())
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_reconcile(self):
+        self.upload("a.txt", b"12345")
+        self.upload("b.txt", b"123")
+        bob = self.create_user("bob")
+        User.objects.filter(pk=self.user.pk).update(files_count=7, total_bytes=1)
+
+        output = io.StringIO()
+        call_command("reconcile_storage_stats", "--dry-run", stdout=output)
+        self.assertIn("alice", output.getvalue())
+        self.assertNotIn("bob", output.getvalue())
+        self.assertEqual(self.counters(), (7, 1))
+
+        call_command("reconcile_storage_stats", stdout=io.StringIO())
+        self.assertEqual(self.counters(), (2, 8))
+        self.assertEqual(self.counters(bob), (0, 0))
+
+        # Сброшен и кеш ответа current-user
+        self.assertEqual(self.client.get("/api/current-user/").data["files_count"], 2)
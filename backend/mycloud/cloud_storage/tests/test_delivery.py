@@ -0,0 +1,104 @@
+from django.test import override_settings
+
+from cloud_storage.models import File
+
+from .base import CloudStorageTestCase
+
+
+class ServerDeliveryTests(CloudStorageTestCase):
+    """Отдача файлов веб-сервером: X-Accel-Redirect (nginx) и X-Sendfile"""
+
+    data = b"body of the file\n" * 200
+
+    def setUp(self):
+        super().setUp()
+        self.file_obj = File.objects.get(
+            pk=self.upload("report.txt", self.data).data["id"]
+        )
+
+    def get(self, action="download", **headers):
+        return self.client.get(
+            f"/api/files/{self.file_obj.pk}/{action}/", headers=headers
+        )
+
+    def assert_empty_body(self, response):
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b"")
+
+    @override_settings(FILE_DELIVERY_BACKEND="nginx")
+    def test_nginx_download(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], f"/protected/{self.file_obj.file_path}"
+        )
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="report.txt"'
+        )
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+        self.assert_empty_body(response)
+
+    @override_settings(
+        FILE_DELIVERY_BACKEND="nginx",
+        FILE_DELIVERY_INTERNAL_PREFIX="/internal media/",
+    )
+    def test_nginx_internal_prefix_is_quoted(self):
+        response = self.get("view")
+
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"/internal%20media/{self.file_obj.file_path}",
+        )
+        self.assertEqual(
+            response["Content-Disposition"], 'inline; filename="report.txt"'
+        )
+        self.assert_empty_body(response)
+
+    @override_settings(FILE_DELIVERY_BACKEND="apache")
+    def test_apache_download(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Sendfile"], self.stored_path(self.file_obj))
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assert_empty_body(response)
+
+    @override_settings(FILE_DELIVERY_BACKEND="nginx")
+    def test_range_and_compression_are_left_to_server(self):
+        response = self.get(**{"Range": "bytes=0-9", "Accept-Encoding": "gzip"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("X-Accel-Redirect", response)
+        self.assertNotIn("Content-Range", response)
+        self.assertNotIn("Content-Encoding", response)
+        self.assertNotIn("Accept-Encoding", response.get("Vary", ""))
+        self.assert_empty_body(response)
+
+    @override_settings(FILE_DELIVERY_BACKEND="nginx")
+    def test_not_modified(self):
+        etag = self.get()["ETag"]
+
+        response = self.get(**{"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("X-Accel-Redirect", response)
+
+    @override_settings(FILE_DELIVERY_BACKEND="apache")
+    def test_download_by_link(self):
+        response = self.client_class().get(
+            f"/api/download/{self.file_obj.special_link}/"
+        )
+
+        self.assertEqual(response["X-Sendfile"], self.stored_path(self.file_obj))
+        self.assert_empty_body(response)
+
+    @override_settings(FILE_DELIVERY_BACKEND="django")
+    def test_django_sends_bytes(self):
+        response = self.get()
+
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertNotIn("X-Sendfile", response)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
@@ -0,0 +1,153 @@
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cloud_storage import download_stats
+from cloud_storage.download_stats import flush_downloads
+from cloud_storage.models import File
+
+from .base import CloudStorageTestCase
+
+
+class StopLoop(Exception):
+    pass
+
+
+@override_settings(DOWNLOAD_STATS_FLUSH_INTERVAL=30)
+class DownloadStatsTests(CloudStorageTestCase):
+    """Статистика скачиваний копится в памяти и сбрасывается пачками"""
+
+    def setUp(self):
+        super().setUp()
+        for target, value in [("_pending", {}), ("_ensure_flusher", mock.Mock())]:
+            patcher = mock.patch.object(download_stats, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.files = [
+            File.objects.get(pk=self.upload(f"{i}.txt", b"data").data["id"])
+            for i in range(3)
+        ]
+
+    def download(self, file_obj):
+        response = self.client.get(f"/api/files/{file_obj.pk}/download/")
+        self.assertEqual(response.status_code, 200)
+
+    def counts(self):
+        return [
+            File.objects.get(pk=file_obj.pk).download_count for file_obj in self.files
+        ]
+
+    def file_updates(self, queries):
+        return [
+            q
+            for q in queries.captured_queries
+            if q["sql"].startswith('UPDATE "cloud_storage_file"')
+        ]
+
+    def test_downloads_are_summed_until_flush(self):
+        first, second, _ = self.files
+        for _ in range(3):
+            self.download(first)
+        self.download(second)
+
+        self.assertEqual(self.counts(), [0, 0, 0])
+        self.assertIsNone(File.objects.get(pk=first.pk).last_download_date)
+        download_stats._ensure_flusher.assert_called()
+
+        with CaptureQueriesContext(connection) as queries:
+            flush_downloads()
+
+        self.assertEqual(len(self.file_updates(queries)), 1)
+        self.assertEqual(self.counts(), [3, 1, 0])
+        dates = [File.objects.get(pk=f.pk).last_download_date for f in self.files]
+        self.assertIsNotNone(dates[0])
+        self.assertIsNotNone(dates[1])
+        self.assertIsNone(dates[2])
+
+        # Буфер пуст: повторный сброс ничего не пишет
+        with self.assertNumQueries(0):
+            flush_downloads()
+        self.assertEqual(self.counts(), [3, 1, 0])
+
+    def test_flush_is_batched(self):
+        for file_obj in self.files:
+            self.download(file_obj)
+
+        with (
+            mock.patch.object(download_stats, "FLUSH_BATCH_SIZE", 2),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            flush_downloads()
+
+        self.assertEqual(len(self.file_updates(queries)), 2)
+        self.assertEqual(self.counts(), [1, 1, 1])
+
+    def test_flush_loop_runs_every_interval(self):
+        self.download(self.files[0])
+
+        with (
+            mock.patch.object(
+                download_stats.time, "sleep", side_effect=[None, StopLoop]
+            ) as sleep,
+            mock.patch.object(download_stats, "connections"),
+        ):
+            with self.assertRaises(StopLoop):
+                download_stats._flush_loop()
+
+        sleep.assert_called_with(30)
+        self.assertEqual(self.counts(), [1, 0, 0])
+
+    def test_flush_loop_survives_errors(self):
+        self.download(self.files[0])
+
+        with (
+            mock.patch.object(
+                download_stats.time, "sleep", side_effect=[None, None, StopLoop]
+            ),
+            mock.patch.object(download_stats, "connections"),
+            mock.patch.object(
+                QuerySet, "update", side_effect=[DatabaseError("сбой"), 1]
+            ) as update,
+        ):
+            with self.assertRaises(StopLoop):
+                download_stats._flush_loop()
+
+        self.assertEqual(update.call_count, 2)
+        self.assertEqual(download_stats._pending, {})
+
+    def test_failed_flush_keeps_counts(self):
+        first = self.files[0]
+        self.download(first)
+        self.download(first)
+
+        with mock.patch.object(QuerySet, "update", side_effect=DatabaseError("сбой")):
+            with self.assertRaises(DatabaseError):
+                flush_downloads()
+
+        self.download(first)
+        flush_downloads()
+
+        self.assertEqual(self.counts(), [3, 0, 0])
+
+    def test_file_deleted_before_flush(self):
+        first, second, _ = self.files
+        self.download(first)
+        self.download(second)
+        self.client.delete(f"/api/files/{first.pk}/")
+
+        flush_downloads()
+
+        self.assertFalse(File.objects.filter(pk=first.pk).exists())
+        self.assertEqual(File.objects.get(pk=second.pk).download_count, 1)
+        self.assertEqual(download_stats._pending, {})
+
+    @override_settings(DOWNLOAD_STATS_FLUSH_INTERVAL=0)
+    def test_written_at_once_without_interval(self):
+        self.download(self.files[0])
+
+        self.assertEqual(self.counts(), [1, 0, 0])
+        self.assertEqual(download_stats._pending, {})
+        download_stats._ensure_flusher.assert_not_called()
@@ -0,0 +1,99 @@
+import hashlib
+import os
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+
+from cloud_storage.models import Blob, File
+
+from .base import CloudStorageTestCase
+
+
+class IngestBlobsTests(CloudStorageTestCase):
+    """Перенос файлов из старой раскладки user_<имя>/ в хранилище блобов"""
+
+    def legacy_file(self, name, data, size=None):
+        """Файл, загруженный до появления блобов"""
+        file_path = os.path.join(f"user_{self.user.username}", name)
+        full_path = os.path.join(settings.MEDIA_ROOT, file_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(data)
+        return File.objects.create(
+            user=self.user,
+            original_name=name,
+            file_path=file_path,
+            size=len(data) if size is None else size,
+        )
+
+    def ingest(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("ingest_blobs", *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_files_move_to_shared_blobs(self):
+        first = self.legacy_file("a.txt", b"same")
+        second = self.legacy_file("b.txt", b"same")
+        other = self.legacy_file("c.txt", b"other")
+        legacy_path = self.stored_path(first)
+
+        output, _ = self.ingest()
+
+        self.assertIn("Перенесено файлов: 3", output)
+        for file_obj in (first, second, other):
+            file_obj.refresh_from_db()
+            self.assertIsNotNone(file_obj.blob_id)
+            self.assertEqual(file_obj.file_path, file_obj.blob.path)
+            self.assertTrue(os.path.exists(self.stored_path(file_obj)))
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(first.blob.refcount, 2)
+        self.assertEqual(first.blob.sha256, hashlib.sha256(b"same").hexdigest())
+        self.assertFalse(os.path.exists(legacy_path))
+
+        response = self.client.get(f"/api/files/{first.pk}/download/")
+        self.assertEqual(b"".join(response.streaming_content), b"same")
+
+    def test_missing_files_and_limit(self):
+        missing = self.legacy_file("gone.txt", b"x")
+        os.remove(self.stored_path(missing))
+        self.legacy_file("a.txt", b"a")
+        self.legacy_file("b.txt", b"b")
+
+        output, errors = self.ingest("--limit", "1")
+
+        self.assertIn("Перенесено файлов: 1, не найдено на диске: 1", output)
+        self.assertIn("gone.txt", errors)
+        self.assertEqual(File.objects.filter(blob__isnull=True).count(), 2)
+
+        self.ingest()
+        self.assertEqual(list(File.objects.filter(blob__isnull=True)), [missing])
+
+    def test_size_conflict_is_skipped(self):
+        data = b"content"
+        Blob.objects.create(
+            sha256=hashlib.sha256(data).hexdigest(),
+            size=len(data) + 1,
+            path="blobs/xx/yy/conflict",
+            refcount=1,
+        )
+        file_obj = self.legacy_file("a.txt", data)
+
+        output, errors = self.ingest()
+
+        self.assertIn("пропущено из-за конфликта размера: 1", output)
+        self.assertIn("a.txt", errors)
+        file_obj.refresh_from_db()
+        self.assertIsNone(file_obj.blob_id)
+        self.assertTrue(os.path.exists(self.stored_path(file_obj)))
+
+    def test_size_drift_updates_user_counters(self):
+        self.legacy_file("a.txt", b"12345", size=100)
+        self.legacy_file("b.txt", b"1", size=0)
+        self.assertEqual(self.refresh(self.user).total_bytes, 100)
+
+        self.ingest()
+
+        self.assertEqual(self.refresh(self.user).total_bytes, 6)
+        self.assertEqual(sorted(File.objects.values_list("size", flat=True)), [1, 5])
@@ -0,0 +1,149 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from cloud_storage import jobs
+from cloud_storage.models import Job
+
+
+@override_settings(JOBS_RETRY_DELAY=10, JOBS_RETRY_MAX_DELAY=15, JOBS_LOCK_TIMEOUT=60)
+class JobQueueTests(TestCase):
+    """Очередь фоновых задач: приоритеты, повторы и зависшие задачи"""
+
+    def setUp(self):
+        self.calls = []
+        tasks = {
+            "ok": (lambda **payload: self.calls.append(payload), 0, 5),
+            "flaky": (self.fail_task, 0, 3),
+        }
+        patcher = mock.patch.dict(jobs.TASKS, tasks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fail_task(self):
+        self.calls.append("flaky")
+        raise RuntimeError("сбой")
+
+    def run_next(self):
+        job = jobs.claim_next("test")
+        jobs.execute(job)
+        return job
+
+    def make_due(self, job):
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+    def test_task_runs_with_payload(self):
+        job = jobs.enqueue("ok", {"file_id": 7})
+
+        self.run_next()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.calls, [{"file_id": 7}])
+
+    def test_retry_with_exponential_backoff(self):
+        job = jobs.enqueue("flaky")
+        self.assertEqual(job.max_attempts, 3)
+
+        before = timezone.now()
+        self.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("RuntimeError: сбой", job.last_error)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=10))
+        self.assertEqual(job.locked_by, "")
+        # До срока повтора задача не берется
+        self.assertIsNone(jobs.claim_next("test"))
+
+        self.make_due(job)
+        before = timezone.now()
+        self.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 2))
+        # 10 * 2 = 20 с, но не больше JOBS_RETRY_MAX_DELAY
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=15))
+        self.assertLess(job.run_at, before + timedelta(seconds=20))
+
+        self.make_due(job)
+        self.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.calls, ["flaky"] * 3)
+
+    def test_unknown_task_fails(self):
+        job = jobs.enqueue("missing")
+
+        self.run_next()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn("LookupError", job.last_error)
+
+    def test_priority_order(self):
+        low = jobs.enqueue("ok", priority=-5)
+        high = jobs.enqueue("ok", priority=50)
+        normal = jobs.enqueue("ok")
+
+        order = [self.run_next().pk for _ in range(3)]
+
+        self.assertEqual(order, [high.pk, normal.pk, low.pk])
+        self.assertIsNone(jobs.claim_next("test"))
+
+    def test_idempotency_key(self):
+        first = jobs.enqueue("ok", key="k1")
+        second = jobs.enqueue("ok", key="k1")
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_stale_job_counts_as_failed_attempt(self):
+        job = jobs.enqueue("flaky")
+        jobs.claim_next("dead-worker")
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=61)
+        )
+
+        jobs.requeue_stale()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("dead-worker", job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+
+    def test_stale_job_on_last_attempt_fails(self):
+        job = jobs.enqueue("flaky")
+        Job.objects.filter(pk=job.pk).update(attempts=2)
+        jobs.claim_next("dead-worker")
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=61)
+        )
+
+        jobs.requeue_stale()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertEqual(self.calls, [])
+
+    def test_running_job_is_not_requeued_early(self):
+        job = jobs.enqueue("ok")
+        jobs.claim_next("busy-worker")
+
+        jobs.requeue_stale()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = jobs.enqueue("ok", {"n": 1})
+            self.assertEqual(self.calls, [])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(self.calls, [{"n": 1}])
@@ -0,0 +1,171 @@
+import json
+import logging
+import sys
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from cloud_storage.log import BackgroundHandler, JsonFormatter, SamplingFilter
+
+from .base import CloudStorageTestCase
+
+
+def make_record(msg="сообщение %s", args=("1",), level=logging.INFO, **extra):
+    return logging.makeLogRecord(
+        {
+            "name": "cloud_storage",
+            "levelno": level,
+            "levelname": logging.getLevelName(level),
+            "msg": msg,
+            "args": args,
+            "module": "views",
+            **extra,
+        }
+    )
+
+
+class CapturingHandler(BackgroundHandler):
+    """Готовит записи как BackgroundHandler, но оставляет их в списке"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(self.prepare(record))
+
+
+class JsonFormatterTests(SimpleTestCase):
+    def test_fields_and_extra(self):
+        record = make_record(request_id="r1", event="download", file_id=7)
+
+        data = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(data["level"], "INFO")
+        self.assertEqual(data["logger"], "cloud_storage")
+        self.assertEqual(data["module"], "views")
+        self.assertEqual(data["message"], "сообщение 1")
+        self.assertEqual(data["request_id"], "r1")
+        self.assertEqual((data["event"], data["file_id"]), ("download", 7))
+        self.assertTrue(data["time"].endswith("+00:00"))
+        self.assertNotIn("args", data)
+
+    def test_exception_and_non_json_values(self):
+        try:
+            raise ValueError("сбой")
+        except ValueError:
+            record = make_record(exc_info=sys.exc_info(), path=object())
+
+        line = JsonFormatter().format(record)
+
+        self.assertNotIn("\n", line)
+        data = json.loads(line)
+        self.assertIn("ValueError: сбой", data["exc_info"])
+        self.assertIsNone(data["request_id"])
+        self.assertIsInstance(data["path"], str)
+
+
+class SamplingFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.filter = SamplingFilter({"download": 0.1})
+
+    def test_sampled_event(self):
+        with mock.patch("cloud_storage.log.random.random", return_value=0.05):
+            record = make_record(event="download")
+            self.assertTrue(self.filter.filter(record))
+            self.assertEqual(record.sample_rate, 0.1)
+
+        with mock.patch("cloud_storage.log.random.random", return_value=0.5):
+            self.assertFalse(self.filter.filter(make_record(event="download")))
+
+    def test_other_records_are_kept(self):
+        with mock.patch("cloud_storage.log.random.random", return_value=0.99):
+            self.assertTrue(self.filter.filter(make_record(event="view")))
+            self.assertTrue(self.filter.filter(make_record()))
+            warning = make_record(event="download", level=logging.WARNING)
+            self.assertTrue(self.filter.filter(warning))
+            self.assertFalse(hasattr(warning, "sample_rate"))
+
+
+class BackgroundHandlerTests(SimpleTestCase):
+    def test_prepare_freezes_message(self):
+        args = ["до"]
+        record = make_record("значение %s", (args,))
+
+        prepared = CapturingHandler().prepare(record)
+        args.append("после")
+
+        self.assertEqual(prepared.getMessage(), "значение ['до']")
+        self.assertIsNone(prepared.args)
+
+    def test_overflow_is_counted_and_reported(self):
+        handler = BackgroundHandler(queue_size=2)
+        for i in range(5):
+            handler.enqueue(make_record(args=(i,)))
+
+        self.assertEqual(handler.dropped, 3)
+        self.assertEqual(handler.queue.qsize(), 2)
+
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        handler.enqueue(make_record(args=("после",)))
+
+        self.assertEqual(handler.dropped, 0)
+        kept = handler.queue.get_nowait()
+        warning = handler.queue.get_nowait()
+        self.assertEqual(kept.getMessage(), "сообщение после")
+        self.assertEqual(warning.levelno, logging.WARNING)
+        self.assertEqual(
+            warning.getMessage(), "Очередь журнала переполнена, пропущено записей: 3"
+        )
+
+    def test_overflow_count_survives_full_queue(self):
+        handler = BackgroundHandler(queue_size=1)
+        handler.enqueue(make_record())
+        handler.enqueue(make_record())
+        handler.queue.get_nowait()
+
+        # Место есть только для записи, предупреждение не помещается
+        handler.enqueue(make_record())
+
+        self.assertEqual(handler.dropped, 1)
+
+
+class RequestIdTests(CloudStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.handler = CapturingHandler()
+        logger = logging.getLogger("cloud_storage")
+        logger.addHandler(self.handler)
+        self.addCleanup(logger.removeHandler, self.handler)
+
+    def upload_with_id(self, request_id):
+        return self.client.post(
+            "/api/files/",
+            {"file": SimpleUploadedFile("a.txt", b"data")},
+            headers={"X-Request-ID": request_id},
+        )
+
+    def request_ids(self):
+        return {record.request_id for record in self.handler.records}
+
+    def test_incoming_id_is_kept(self):
+        response = self.upload_with_id("nginx-123.a_b")
+
+        self.assertEqual(response["X-Request-ID"], "nginx-123.a_b")
+        self.assertTrue(self.handler.records)
+        self.assertEqual(self.request_ids(), {"nginx-123.a_b"})
+
+    def test_invalid_id_is_replaced(self):
+        response = self.upload_with_id("bad id")
+
+        request_id = response["X-Request-ID"]
+        self.assertRegex(request_id, r"^[0-9a-f]{32}$")
+        self.assertEqual(self.request_ids(), {request_id})
+
+    def test_ids_differ_between_requests(self):
+        first = self.client.get("/api/files/")["X-Request-ID"]
+        second = self.client.get("/api/files/")["X-Request-ID"]
+
+        self.assertNotEqual(first, second)
@@ -0,0 +1,157 @@
+from django.test import Client, override_settings
+
+from cloud_storage import metrics
+
+from .base import CloudStorageTestCase
+
+try:
+    from prometheus_client import REGISTRY
+except ImportError:
+    REGISTRY = None
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTestCase(CloudStorageTestCase):
+    def setUp(self):
+        if metrics.prometheus_client is None:
+            self.skipTest("нет пакета prometheus_client")
+        super().setUp()
+
+
+@override_settings(METRICS_TOKEN="secret")
+class MetricsViewTests(MetricsTestCase):
+    """Доступ к /metrics: токен METRICS_TOKEN или сотрудник"""
+
+    def test_token(self):
+        response = Client().get("/metrics", headers={"Authorization": "Bearer secret"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"mycloud_http_responses_total", response.content)
+
+    def test_staff_session(self):
+        client = Client()
+        client.force_login(self.create_user("staff", is_staff=True))
+
+        self.assertEqual(client.get("/metrics").status_code, 200)
+
+    def test_unauthorized(self):
+        staff_token = self.client_for(self.create_user("staff", is_staff=True))
+        regular = Client()
+        regular.force_login(self.user)
+
+        for client, headers in [
+            (Client(), {}),
+            (Client(), {"Authorization": "Bearer wrong"}),
+            (Client(), {"Authorization": "secret"}),
+            (regular, {}),
+            # Токен API не открывает метрики даже сотруднику
+            (staff_token, {}),
+        ]:
+            with self.subTest(headers=headers):
+                response = client.get("/metrics", headers=headers)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.json(), {"error": "Нет доступа к метрикам"})
+
+    @override_settings(METRICS_TOKEN="")
+    def test_empty_token_is_not_accepted(self):
+        response = Client().get("/metrics", headers={"Authorization": "Bearer "})
+
+        self.assertEqual(response.status_code, 401)
+
+
+class RequestMetricsTests(MetricsTestCase):
+    """Метки маршрутов и счетчики байтов загрузок и скачиваний"""
+
+    def responses(self, route, method="GET", status="200"):
+        return sample(
+            "mycloud_http_responses_total", route=route, method=method, status=status
+        )
+
+    def transferred(self, direction, route):
+        return sample("mycloud_transfer_bytes_total", direction=direction, route=route)
+
+    def test_route_labels(self):
+        before = {
+            "current": self.responses("current-user"),
+            "list": self.responses("file-list"),
+            "unmatched": self.responses("unmatched", status="404"),
+            "by_pk": sample(
+                "mycloud_http_request_duration_seconds_count",
+                route="file-detail",
+                method="DELETE",
+            ),
+        }
+
+        self.client.get("/api/current-user/")
+        self.client.get("/api/files/")
+        self.client.get("/api/files/")
+        self.client.get("/api/no-such-page/")
+        file_id = self.upload("a.txt", b"data").data["id"]
+        self.client.delete(f"/api/files/{file_id}/")
+
+        self.assertEqual(self.responses("current-user"), before["current"] + 1)
+        self.assertEqual(self.responses("file-list"), before["list"] + 2)
+        self.assertEqual(
+            self.responses("unmatched", status="404"), before["unmatched"] + 1
+        )
+        # Маршрут, а не путь: ID файла в метку не попадает
+        self.assertEqual(
+            sample(
+                "mycloud_http_request_duration_seconds_count",
+                route="file-detail",
+                method="DELETE",
+            ),
+            before["by_pk"] + 1,
+        )
+
+    def test_upload_bytes(self):
+        data = b"x" * 5000
+        before = self.transferred("upload", "file-list")
+
+        response = self.upload("a.bin", data)
+
+        uploaded = self.transferred("upload", "file-list") - before
+        self.assertEqual(uploaded, int(response.wsgi_request.META["CONTENT_LENGTH"]))
+        self.assertGreater(uploaded, len(data))
+
+        # Тело JSON - не загрузка файла
+        before = self.transferred("upload", "file-bulk-delete")
+        self.client.post("/api/files/bulk-delete/", {"ids": [1]}, format="json")
+        self.assertEqual(self.transferred("upload", "file-bulk-delete"), before)
+
+    def test_download_bytes(self):
+        data = bytes(range(256)) * 20
+        url = f"/api/files/{self.upload('a.bin', data).data['id']}/download/"
+        before = self.transferred("download", "file-download")
+        in_progress = sample("mycloud_transfers_in_progress", direction="download")
+
+        response = self.client.get(url)
+        # Учитывается после отправки ответа
+        self.assertEqual(self.transferred("download", "file-download"), before)
+        b"".join(response.streaming_content)
+        self.assertEqual(
+            self.transferred("download", "file-download"), before + len(data)
+        )
+
+        response = self.client.get(url, headers={"Range": "bytes=0-99"})
+        b"".join(response.streaming_content)
+        self.assertEqual(
+            self.transferred("download", "file-download"), before + len(data) + 100
+        )
+        self.assertEqual(
+            sample("mycloud_transfers_in_progress", direction="download"), in_progress
+        )
+
+    @override_settings(FILE_DELIVERY_BACKEND="nginx")
+    def test_nginx_download_is_not_counted(self):
+        url = f"/api/files/{self.upload('a.bin', b'data').data['id']}/download/"
+        before = self.transferred("download", "file-download")
+
+        response = self.client.get(url)
+
+        self.assertIn("X-Accel-Redirect", response)
+        self.assertEqual(self.transferred("download", "file-download"), before)
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+
+from cloud_storage.models import File
+from cloud_storage.pagination import KeysetPagination
+
+from .base import CloudStorageTestCase
+
+
+class KeysetPaginationTests(CloudStorageTestCase):
+    """Постраничная выдача списка файлов по курсору, фильтры и сортировка"""
+
+    def setUp(self):
+        super().setUp()
+        # Повторяющиеся размеры и имена: порядок внутри них задает id
+        File.objects.bulk_create(
+            File(
+                user=self.user,
+                original_name=f"f{i % 7}.txt",
+                file_path=f"x/{i}",
+                size=i % 5,
+            )
+            for i in range(23)
+        )
+        other = self.create_user("bob")
+        File.objects.create(user=other, original_name="f1.txt", file_path="y", size=1)
+
+    def collect(self, url):
+        """Все страницы выдачи: (ответы, записи)"""
+        pages, results = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response)
+            results += response.data["results"]
+            url = response.data["next"]
+        return pages, results
+
+    def test_default_page_size(self):
+        response = self.client.get("/api/files/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 23)
+        self.assertIsNone(response.data["next"])
+
+        with mock.patch.object(KeysetPagination, "default_page_size", 10):
+            pages, results = self.collect("/api/files/")
+        self.assertEqual([len(page.data["results"]) for page in pages], [10, 10, 3])
+        self.assertIn("page_size=10", pages[0].data["next"])
+        self.assertEqual(len({item["id"] for item in results}), 23)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, "max_page_size", 20):
+            response = self.client.get("/api/files/?page_size=100000")
+
+        self.assertEqual(len(response.data["results"]), 20)
+        self.assertIn("page_size=20", response.data["next"])
+
+    def test_pages_cover_all_files_once(self):
+        pages, results = self.collect("/api/files/?page_size=5")
+
+        self.assertEqual(len(pages), 5)
+        ids = [item["id"] for item in results]
+        self.assertEqual(len(ids), 23)
+        self.assertEqual(len(set(ids)), 23)
+        # По умолчанию - новые сначала
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_ordering(self):
+        for ordering, field in [
+            ("size", "size"),
+            ("-size", "size"),
+            ("name", "original_name"),
+            ("-name", "original_name"),
+        ]:
+            with self.subTest(ordering=ordering):
+                _, results = self.collect(
+                    f"/api/files/?page_size=4&ordering={ordering}"
+                )
+                ids = [item["id"] for item in results]
+                self.assertEqual(len(set(ids)), 23)
+                keys = [(item[field], item["id"]) for item in results]
+                self.assertEqual(keys, sorted(keys, reverse=ordering.startswith("-")))
+
+    def test_filters(self):
+        now = timezone.now()
+        File.objects.filter(user=self.user, size=0).update(
+            upload_date=now - timedelta(days=3), last_download_date=now
+        )
+
+        def count(query):
+            response = self.client.get(f"/api/files/?{query}")
+            self.assertEqual(response.status_code, 200)
+            return len(response.data["results"])
+
+        self.assertEqual(count("name=f1"), 4)
+        self.assertEqual(count("size_min=2&size_max=3"), 9)
+        self.assertEqual(count("downloaded=true"), 5)
+        self.assertEqual(count("downloaded=false"), 18)
+        self.assertEqual(
+            count(f"uploaded_before={(now - timedelta(days=1)).date()}"), 5
+        )
+
+    def test_filters_combine_with_pages(self):
+        _, results = self.collect("/api/files/?page_size=2&size_min=4&ordering=name")
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(item["size"] == 4 for item in results))
+
+    def test_invalid_parameters(self):
+        for query in ["ordering=bad", "size_min=x", "page_size=x"]:
+            with self.subTest(query=query):
+                self.assertEqual(
+                    self.client.get(f"/api/files/?{query}").status_code, 400
+                )
+        self.assertEqual(self.client.get("/api/files/?cursor=zzz").status_code, 404)
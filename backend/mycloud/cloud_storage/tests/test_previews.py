@@ -0,0 +1,167 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import override_settings
+
+from cloud_storage import previews
+from cloud_storage.models import File, Job
+from cloud_storage.previews import cache_path, preview_key
+
+from .base import CloudStorageTestCase
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def png_bytes(width=600, height=400):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class PreviewCacheMixin:
+    """Отдельный каталог кеша превью и сброшенный счетчик его размера"""
+
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings_override = override_settings(PREVIEW_CACHE_DIR=cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch.object(previews, "_cache_bytes", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@override_settings(PREVIEW_RETRY_AFTER=3)
+class PreviewTests(PreviewCacheMixin, CloudStorageTestCase):
+    """Превью изображений: 202 до построения, затем WebP из кеша"""
+
+    def setUp(self):
+        if Image is None:
+            self.skipTest("нет пакета Pillow")
+        super().setUp()
+        self.file_obj = File.objects.get(
+            pk=self.upload("photo.png", png_bytes()).data["id"]
+        )
+
+    def preview(self, size=None, **headers):
+        url = f"/api/files/{self.file_obj.pk}/preview/"
+        if size:
+            url += f"?size={size}"
+        return self.client.get(url, headers=headers)
+
+    def test_miss_returns_202_and_queues_job(self):
+        response = self.preview()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response["Retry-After"], "3")
+        jobs = Job.objects.filter(name="generate_previews")
+        self.assertTrue(jobs.filter(payload={"file_id": self.file_obj.pk}).exists())
+
+        # Повторный запрос не ставит задачу еще раз
+        count = jobs.count()
+        self.assertEqual(self.preview().status_code, 202)
+        self.assertEqual(jobs.count(), count)
+
+    def test_hit_returns_webp(self):
+        self.run_jobs()
+
+        for size, max_side in [(None, 256), ("large", 1024)]:
+            with self.subTest(size=size):
+                response = self.preview(size)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], "image/webp")
+                self.assertIn("immutable", response["Cache-Control"])
+                body = b"".join(response.streaming_content)
+                with Image.open(io.BytesIO(body)) as image:
+                    self.assertEqual(image.format, "WEBP")
+                    self.assertEqual(max(image.size), min(max_side, 600))
+
+    def test_not_modified(self):
+        self.run_jobs()
+        etag = self.preview()["ETag"]
+
+        self.assertEqual(self.preview(**{"If-None-Match": etag}).status_code, 304)
+
+    def test_invalid_size_and_unsupported_file(self):
+        self.assertEqual(self.preview("huge").status_code, 400)
+
+        text_id = self.upload("a.txt", b"text").data["id"]
+        response = self.client.get(f"/api/files/{text_id}/preview/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_same_content_shares_preview(self):
+        other = File.objects.get(pk=self.upload("copy.png", png_bytes()).data["id"])
+
+        self.assertEqual(
+            preview_key(self.file_obj, "small"), preview_key(other, "small")
+        )
+
+
+@override_settings(PREVIEW_CACHE_MAX_BYTES=350)
+class PreviewEvictionTests(PreviewCacheMixin, CloudStorageTestCase):
+    """Вытеснение давно не запрашивавшихся превью при переполнении кеша"""
+
+    def add_preview(self, key, age):
+        path = cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_least_recently_used_are_evicted(self):
+        oldest = self.add_preview("oldest", age=300)
+        older = self.add_preview("older", age=200)
+        recent = self.add_preview("recent", age=100)
+        # Обращение к самому старому превью делает его недавним
+        previews._touch(oldest)
+
+        added = self.add_preview("added", age=400)
+        previews._account(added)
+
+        self.assertFalse(os.path.exists(older))
+        self.assertTrue(os.path.exists(oldest))
+        self.assertTrue(os.path.exists(recent))
+        # Только что построенное превью не удаляется, даже самое старое
+        self.assertTrue(os.path.exists(added))
+        self.assertEqual(previews._cache_bytes, 300)
+
+    @override_settings(PREVIEW_CACHE_MAX_BYTES=1000)
+    def test_cache_within_limit_is_kept(self):
+        paths = [self.add_preview(f"p{i}", age=i) for i in range(3)]
+
+        previews._account(paths[-1])
+
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+        self.assertEqual(previews._cache_bytes, 300)
+
+        # Дальше размер считается без обхода каталога
+        with mock.patch.object(previews, "_scan_cache") as scan:
+            previews._account(self.add_preview("p3", age=0))
+        scan.assert_not_called()
+        self.assertEqual(previews._cache_bytes, 400)
+
+    @override_settings(PREVIEW_CACHE_MAX_BYTES=1024 * 1024)
+    def test_evicted_preview_is_requested_again(self):
+        if Image is None:
+            self.skipTest("нет пакета Pillow")
+        file_obj = File.objects.get(pk=self.upload("a.png", png_bytes()).data["id"])
+        self.run_jobs()
+        url = f"/api/files/{file_obj.pk}/preview/"
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with override_settings(PREVIEW_CACHE_MAX_BYTES=0):
+            previews.evict()
+
+        self.assertEqual(self.client.get(url).status_code, 202)
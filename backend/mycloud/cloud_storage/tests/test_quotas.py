@@ -0,0 +1,101 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from cloud_storage.models import File, UploadSession, User
+
+from .base import CloudStorageTestCase
+
+
+class StorageQuotaTests(CloudStorageTestCase):
+    """Квоты: резерв до чтения тела запроса и его снятие"""
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(storage_quota=5000)
+        self.user.storage_quota = 5000
+
+    def start_session(self, size):
+        return self.client.post(
+            "/api/uploads/", {"original_name": "s.bin", "size": size}, format="json"
+        )
+
+    def test_upload_within_quota(self):
+        response = self.upload("a.bin", b"x" * 3000)
+
+        self.assertEqual(response.status_code, 201)
+        user = self.refresh(self.user)
+        self.assertEqual(user.total_bytes, 3000)
+        self.assertEqual(user.reserved_bytes, 0)
+
+    def test_upload_over_quota_is_rejected(self):
+        self.upload("a.bin", b"x" * 3000)
+
+        response = self.upload("b.bin", b"y" * 3000)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(File.objects.count(), 1)
+        user = self.refresh(self.user)
+        self.assertEqual(user.total_bytes, 3000)
+        self.assertEqual(user.reserved_bytes, 0)
+
+    def test_reservation_is_released_when_upload_fails(self):
+        self.client.raise_request_exception = False
+        with mock.patch("cloud_storage.views.store_blob", side_effect=OSError):
+            response = self.upload("a.bin", b"x" * 3000)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(File.objects.exists())
+        self.assertEqual(self.refresh(self.user).reserved_bytes, 0)
+
+    def test_upload_session_reserves_quota(self):
+        response = self.start_session(4000)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.refresh(self.user).reserved_bytes, 4000)
+
+        # Место занято резервом открытой сессии
+        self.assertEqual(self.start_session(2000).status_code, 413)
+        self.assertEqual(self.upload("a.bin", b"x" * 2000).status_code, 413)
+
+        self.client.delete(f"/api/uploads/{response.data['id']}/")
+        self.assertEqual(self.refresh(self.user).reserved_bytes, 0)
+        self.assertEqual(self.start_session(2000).status_code, 201)
+
+    @override_settings(DEFAULT_STORAGE_QUOTA=1000)
+    def test_default_quota(self):
+        bob = self.create_user("bob")
+        bob_client = self.client_for(bob)
+
+        self.assertEqual(
+            self.upload("a.bin", b"x" * 2000, client=bob_client).status_code, 413
+        )
+        # 0 у пользователя - без ограничений
+        bob.storage_quota = 0
+        bob.save()
+        self.assertEqual(
+            self.upload("a.bin", b"x" * 2000, client=bob_client).status_code, 201
+        )
+
+    def test_admin_sets_quota(self):
+        admin_client = self.client_for(self.create_user("admin", is_admin=True))
+
+        response = admin_client.patch(
+            f"/api/users/{self.user.pk}/", {"storage_quota": 10000}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(self.user).storage_quota, 10000)
+        self.assertEqual(self.upload("a.bin", b"x" * 8000).status_code, 201)
+
+    def test_reconcile_recomputes_reservations(self):
+        session_id = self.start_session(1000).data["id"]
+        User.objects.filter(pk=self.user.pk).update(reserved_bytes=4500)
+
+        call_command("reconcile_storage_stats", stdout=io.StringIO())
+
+        self.assertEqual(self.refresh(self.user).reserved_bytes, 1000)
+        UploadSession.objects.filter(pk=session_id).delete()
+        call_command("reconcile_storage_stats", stdout=io.StringIO())
+        self.assertEqual(self.refresh(self.user).reserved_bytes, 0)
@@ -0,0 +1,104 @@
+from cloud_storage.models import File
+
+from .base import CloudStorageTestCase
+
+
+class RangeRequestTests(CloudStorageTestCase):
+    """Range и условные запросы при скачивании файла"""
+
+    data = bytes(range(256)) * 40
+
+    def setUp(self):
+        super().setUp()
+        self.file_id = self.upload("data.bin", self.data).data["id"]
+        self.url = f"/api/files/{self.file_id}/download/"
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full_download_advertises_ranges(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Length"], str(len(self.data)))
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_single_range(self):
+        response = self.get(Range="bytes=10-19")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.data)}")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(self.body(response), self.data[10:20])
+
+    def test_suffix_and_open_ranges(self):
+        response = self.get(Range="bytes=-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.data[-5:])
+
+        response = self.get(Range=f"bytes={len(self.data) - 3}-")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.data[-3:])
+
+    def test_multiple_ranges(self):
+        response = self.get(Range="bytes=0-1,5-6,6-9")
+
+        self.assertEqual(response.status_code, 206)
+        content_type = response["Content-Type"]
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        boundary = content_type.split("boundary=")[1].encode()
+        body = self.body(response)
+        self.assertEqual(len(body), int(response["Content-Length"]))
+        # Пересекающиеся диапазоны 5-6 и 6-9 отдаются одной частью
+        parts = body.split(b"--" + boundary)[1:-1]
+        self.assertEqual(len(parts), 2)
+        self.assertIn(f"Content-Range: bytes 0-1/{len(self.data)}".encode(), parts[0])
+        self.assertTrue(parts[0].endswith(b"\r\n\r\n" + self.data[0:2] + b"\r\n"))
+        self.assertIn(f"Content-Range: bytes 5-9/{len(self.data)}".encode(), parts[1])
+        self.assertTrue(parts[1].endswith(b"\r\n\r\n" + self.data[5:10] + b"\r\n"))
+
+    def test_unsatisfiable_range(self):
+        response = self.get(Range=f"bytes={len(self.data)}-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+    def test_malformed_range_is_ignored(self):
+        response = self.get(Range="garbage")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_not_modified(self):
+        first = self.get()
+
+        self.assertEqual(self.get(**{"If-None-Match": first["ETag"]}).status_code, 304)
+        self.assertEqual(
+            self.get(**{"If-Modified-Since": first["Last-Modified"]}).status_code, 304
+        )
+        self.assertEqual(self.get(**{"If-None-Match": '"other"'}).status_code, 200)
+
+    def test_if_range(self):
+        etag = self.get()["ETag"]
+
+        response = self.get(Range="bytes=0-0", **{"If-Range": etag})
+        self.assertEqual(response.status_code, 206)
+        # Файл изменился - отдается целиком
+        response = self.get(Range="bytes=0-0", **{"If-Range": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_ranges_by_special_link(self):
+        link = File.objects.get(pk=self.file_id).special_link
+        response = self.client_class().get(
+            f"/api/download/{link}/", headers={"Range": "bytes=5-9"}
+        )
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.data[5:10])
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.test import override_settings
+
+from cloud_storage.models import File
+from cloud_storage.storage import S3Storage
+
+from .base import CloudStorageTestCase
+
+try:
+    import boto3  # noqa: F401
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+MB = 1024 * 1024
+
+
+@unittest.skipIf(mock_aws is None, "Для тестов S3 нужны пакеты boto3 и moto")
+class S3StorageTests(CloudStorageTestCase):
+    """Хранилище в бакете S3 (moto вместо настоящего сервиса)"""
+
+    def setUp(self):
+        super().setUp()
+        for context in (
+            override_settings(
+                FILE_STORAGE_BACKEND="s3",
+                S3_BUCKET="mycloud-test",
+                S3_ENDPOINT_URL="",
+                S3_REGION="us-east-1",
+                S3_ACCESS_KEY_ID="testing",
+                S3_SECRET_ACCESS_KEY="testing",
+                # Минимальный размер части multipart-загрузки в S3 - 5 МБ
+                S3_MULTIPART_THRESHOLD=5 * MB,
+                S3_MULTIPART_CHUNKSIZE=5 * MB,
+                S3_PRESIGNED_URLS=True,
+                S3_PRESIGNED_EXPIRY=300,
+            ),
+            mock_aws(),
+        ):
+            context.__enter__()
+            self.addCleanup(context.__exit__, None, None, None)
+
+        self.storage = S3Storage()
+        self.storage.client.create_bucket(Bucket="mycloud-test")
+        patcher = mock.patch("cloud_storage.storage._storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_source(self, data):
+        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=settings.MEDIA_ROOT)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_small_file_is_put_in_one_request(self):
+        source = self.make_source(b"hello")
+
+        self.storage.save("blobs/ab/small", source)
+
+        self.assertFalse(os.path.exists(source))
+        self.assertTrue(self.storage.exists("blobs/ab/small"))
+        self.assertEqual(self.storage.size("blobs/ab/small"), 5)
+        etag = self.storage.head("blobs/ab/small")["ETag"]
+        self.assertNotIn("-", etag)
+
+    def test_large_file_uses_multipart_upload(self):
+        data = os.urandom(11 * MB)
+        source = self.make_source(data)
+
+        self.storage.save("blobs/cd/large", source, keep_source=True)
+
+        self.assertTrue(os.path.exists(source))
+        # ETag составного объекта оканчивается числом частей
+        etag = self.storage.head("blobs/cd/large")["ETag"].strip('"')
+        self.assertTrue(etag.endswith("-3"), etag)
+        body = b"".join(self.storage.read_range("blobs/cd/large", 0, len(data) - 1))
+        self.assertEqual(body, data)
+
+    def test_read_range(self):
+        data = bytes(range(256)) * 1024
+        self.storage.save("blobs/ef/range", self.make_source(data))
+
+        self.assertEqual(
+            b"".join(self.storage.read_range("blobs/ef/range", 10, 19)), data[10:20]
+        )
+        self.assertEqual(
+            b"".join(self.storage.read_range("blobs/ef/range", 1000, 200000)),
+            data[1000:200001],
+        )
+        self.assertEqual(list(self.storage.read_range("blobs/ef/range", 5, 4)), [])
+
+    def test_missing_object(self):
+        self.assertFalse(self.storage.exists("blobs/00/missing"))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.size("blobs/00/missing")
+        # Удаление отсутствующего объекта не считается ошибкой
+        self.storage.delete("blobs/00/missing")
+
+    def test_presigned_url(self):
+        url = self.storage.url("blobs/ab/key", "text/plain", 'attachment; filename="a"')
+
+        parts = urlsplit(url)
+        self.assertIn("blobs/ab/key", parts.path)
+        query = parse_qs(parts.query)
+        self.assertEqual(query["X-Amz-Expires"], ["300"])
+        self.assertIn("X-Amz-Signature", query)
+        self.assertEqual(query["response-content-type"], ["text/plain"])
+        self.assertEqual(
+            query["response-content-disposition"], ['attachment; filename="a"']
+        )
+
+        with override_settings(S3_PRESIGNED_URLS=False):
+            self.assertIsNone(self.storage.url("blobs/ab/key", "text/plain", ""))
+
+    def test_upload_download_and_delete(self):
+        data = b"s3 content " * 1000
+        file_id = self.upload("a.txt", data).data["id"]
+        file_obj = File.objects.get(pk=file_id)
+        self.assertTrue(self.storage.exists(file_obj.file_path))
+        self.assertIsNone(self.storage.local_path(file_obj.file_path))
+
+        response = self.client.get(f"/api/files/{file_id}/download/")
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(file_obj.file_path, response["Location"])
+        self.assertEqual(response["Cache-Control"], "private, no-store")
+
+        with override_settings(S3_PRESIGNED_URLS=False):
+            response = self.client.get(
+                f"/api/files/{file_id}/download/", headers={"Range": "bytes=3-9"}
+            )
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b"".join(response.streaming_content), data[3:10])
+
+        self.client.delete(f"/api/files/{file_id}/")
+        self.run_jobs()
+        self.assertFalse(self.storage.exists(file_obj.file_path))
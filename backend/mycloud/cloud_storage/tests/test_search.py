@@ -0,0 +1,67 @@
+from .base import CloudStorageTestCase
+
+
+class SearchTests(CloudStorageTestCase):
+    """Поиск по имени и комментарию с выдачей по релевантности"""
+
+    def setUp(self):
+        super().setUp()
+        self.report = self.upload(
+            "annual_report_2024.txt", b"a", comment="финансовый отчёт"
+        ).data["id"]
+        self.upload("photo.txt", b"bb", comment="отпуск, report draft")
+        self.notes = self.upload("notes.txt", b"ccc", comment="misc").data["id"]
+        self.upload(
+            "report_other.txt", b"d", client=self.client_for(self.create_user("bob"))
+        )
+
+    def search(self, **params):
+        return self.client.get("/api/files/search/", params)
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [item["original_name"] for item in response.data["results"]]
+
+    def test_name_match_ranks_above_comment(self):
+        self.assertEqual(
+            self.names(self.search(q="report")),
+            ["annual_report_2024.txt", "photo.txt"],
+        )
+
+    def test_all_words_must_match(self):
+        self.assertEqual(
+            self.names(self.search(q="REPORT 2024")), ["annual_report_2024.txt"]
+        )
+        self.assertEqual(self.names(self.search(q="xyzzy")), [])
+
+    def test_query_is_required(self):
+        response = self.search(q="")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.data)
+
+    def test_ranked_pages(self):
+        first = self.search(q="report", page_size=1)
+        self.assertEqual(self.names(first), ["annual_report_2024.txt"])
+        self.assertIn("page=2", first.data["next"])
+
+        second = self.client.get(first.data["next"])
+        self.assertEqual(self.names(second), ["photo.txt"])
+        self.assertIsNone(second.data["next"])
+
+        self.assertEqual(self.names(self.search(q="report", page_size=1, page=3)), [])
+
+    def test_list_filters_apply(self):
+        self.assertEqual(self.names(self.search(q="report", size_min=2)), ["photo.txt"])
+
+    def test_index_follows_changes(self):
+        self.client.patch(
+            f"/api/files/{self.notes}/",
+            {"original_name": "renamed.txt", "comment": "квартальный"},
+            format="json",
+        )
+        self.client.delete(f"/api/files/{self.report}/")
+
+        self.assertEqual(self.names(self.search(q="renamed")), ["renamed.txt"])
+        self.assertEqual(self.names(self.search(q="misc")), [])
+        self.assertEqual(self.names(self.search(q="annual")), [])
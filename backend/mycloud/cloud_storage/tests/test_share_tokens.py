@@ -0,0 +1,149 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cloud_storage.models import File, ShareTokenRevocation
+from cloud_storage.share_tokens import issue_token
+from cloud_storage.tasks import purge_share_token_revocations
+
+from .base import CloudStorageTestCase
+
+
+class ShareTokenTests(CloudStorageTestCase):
+    """Подписанные ссылки со сроком действия и их отзыв"""
+
+    data = b"shared " * 500
+
+    def setUp(self):
+        super().setUp()
+        self.file_id = self.upload("a.txt", self.data).data["id"]
+        self.anonymous = APIClient()
+
+    def issue(self, **fields):
+        response = self.client.post(
+            f"/api/files/{self.file_id}/share-tokens/", fields, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data["token"]
+
+    def revoke(self, token):
+        return self.client.post(
+            f"/api/files/{self.file_id}/share-tokens/revoke/",
+            {"token": token},
+            format="json",
+        )
+
+    def download(self, token, suffix=""):
+        return self.anonymous.get(f"/api/share/{token}/{suffix}")
+
+    def test_download_by_token(self):
+        token = self.issue(operations=["download"], expires_in=3600)
+
+        response = self.download(token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertEqual(self.download(token, "view/").status_code, 403)
+
+    def test_repeated_check_does_not_read_database(self):
+        token = self.issue()
+        b"".join(self.download(token).streaming_content)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.download(token)
+            b"".join(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        # Остается только запись статистики скачивания
+        selects = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(selects, [])
+
+    def test_tampered_token(self):
+        token = self.issue()
+
+        self.assertEqual(self.download(token[:-2] + "xx").status_code, 404)
+        self.assertEqual(self.download("garbage").status_code, 404)
+
+    def test_expired_token(self):
+        token = self.issue(expires_in=60)
+        self.assertEqual(self.download(token).status_code, 200)
+
+        with mock.patch(
+            "cloud_storage.share_tokens.time.time", return_value=time.time() + 61
+        ):
+            response = self.download(token)
+
+        self.assertEqual(response.status_code, 410)
+        self.assertIn("error", response.json())
+
+        expired, _ = issue_token(File.objects.get(pk=self.file_id), ["download"], -5)
+        self.assertEqual(self.download(expired).status_code, 410)
+
+    def test_ttl_is_limited(self):
+        response = self.client.post(
+            f"/api/files/{self.file_id}/share-tokens/",
+            {"expires_in": 10**9},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_revoked_token(self):
+        token = self.issue()
+        kept = self.issue()
+        # Результат проверки уже в кеше - отзыв должен его сбросить
+        self.assertEqual(self.download(token).status_code, 200)
+
+        self.assertEqual(self.revoke(token).status_code, 204)
+
+        response = self.download(token)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json(), {"error": "Ссылка отозвана"})
+        self.assertEqual(self.download(kept).status_code, 200)
+
+    def test_only_owner_issues_and_revokes(self):
+        token = self.issue()
+        bob = self.client_for(self.create_user("bob"))
+
+        self.assertEqual(
+            bob.post(f"/api/files/{self.file_id}/share-tokens/", {}).status_code, 404
+        )
+        response = bob.post(
+            f"/api/files/{self.file_id}/share-tokens/revoke/",
+            {"token": token},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.download(token).status_code, 200)
+
+    def test_deleted_file(self):
+        token = self.issue()
+        self.download(token)
+
+        self.client.delete(f"/api/files/{self.file_id}/")
+
+        self.assertEqual(self.download(token).status_code, 404)
+
+    def test_expired_revocations_are_purged(self):
+        token = self.issue()
+        self.revoke(token)
+        self.assertEqual(ShareTokenRevocation.objects.count(), 1)
+
+        purge_share_token_revocations()
+        self.assertEqual(ShareTokenRevocation.objects.count(), 1)
+
+        ShareTokenRevocation.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        purge_share_token_revocations()
+        self.assertFalse(ShareTokenRevocation.objects.exists())
@@ -0,0 +1,132 @@
+import os
+
+from django.conf import settings
+
+from cloud_storage.models import File, UploadSession
+
+from .base import CloudStorageTestCase
+
+
+class ChunkedUploadTests(CloudStorageTestCase):
+    """Загрузка по частям: /api/uploads/"""
+
+    data = bytes(range(256)) * 12
+
+    def start(self, **fields):
+        response = self.client.post(
+            "/api/uploads/",
+            {"original_name": "big.bin", "size": len(self.data), **fields},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def put(self, session_id, start, end, total=None, body=None):
+        """Отправляет байты [start, end) данных self.data"""
+        total = len(self.data) if total is None else total
+        return self.client.put(
+            f"/api/uploads/{session_id}/",
+            self.data[start:end] if body is None else body,
+            content_type="application/octet-stream",
+            headers={"Content-Range": f"bytes {start}-{end - 1}/{total}"},
+        )
+
+    def test_ranges_are_merged_in_any_order(self):
+        session_id = self.start()
+        self.assertEqual(
+            self.put(session_id, 2000, 3072).data["received"], [[2000, 3072]]
+        )
+        self.assertEqual(
+            self.put(session_id, 0, 1000).data["received"], [[0, 1000], [2000, 3072]]
+        )
+        # Пересекающиеся части склеиваются в один диапазон
+        response = self.put(session_id, 500, 2500)
+        self.assertEqual(response.data["received"], [[0, 3072]])
+        self.assertEqual(
+            self.client.get(f"/api/uploads/{session_id}/").data["received"],
+            [[0, 3072]],
+        )
+
+    def test_commit_creates_file(self):
+        session_id = self.start(comment="по частям")
+        self.put(session_id, 1024, 3072)
+        self.put(session_id, 0, 1024)
+
+        response = self.client.post(f"/api/uploads/{session_id}/commit/")
+
+        self.assertEqual(response.status_code, 201)
+        file_obj = File.objects.get(pk=response.data["id"])
+        self.assertEqual(file_obj.original_name, "big.bin")
+        self.assertEqual(file_obj.comment, "по частям")
+        self.assertEqual(file_obj.size, len(self.data))
+        with open(self.stored_path(file_obj), "rb") as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+        user = self.refresh(self.user)
+        self.assertEqual(user.files_count, 1)
+        self.assertEqual(user.reserved_bytes, 0)
+
+    def test_commit_incomplete_upload(self):
+        session_id = self.start()
+        self.put(session_id, 0, 1000)
+
+        response = self.client.post(f"/api/uploads/{session_id}/commit/")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["received"], [[0, 1000]])
+        self.assertTrue(UploadSession.objects.filter(pk=session_id).exists())
+
+    def test_second_commit_is_not_found(self):
+        session_id = self.start()
+        self.put(session_id, 0, len(self.data))
+        self.assertEqual(
+            self.client.post(f"/api/uploads/{session_id}/commit/").status_code, 201
+        )
+
+        response = self.client.post(f"/api/uploads/{session_id}/commit/")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(File.objects.count(), 1)
+        self.assertEqual(self.refresh(self.user).reserved_bytes, 0)
+
+    def test_abort_removes_session_and_reservation(self):
+        session_id = self.start()
+        self.put(session_id, 0, 1000)
+        session = UploadSession.objects.get(pk=session_id)
+        temp_path = os.path.join(settings.MEDIA_ROOT, session.file_path)
+        self.assertTrue(os.path.exists(temp_path))
+        self.assertEqual(self.refresh(self.user).reserved_bytes, len(self.data))
+
+        response = self.client.delete(f"/api/uploads/{session_id}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+        self.assertFalse(os.path.exists(temp_path))
+        self.assertEqual(self.refresh(self.user).reserved_bytes, 0)
+        self.assertEqual(self.put(session_id, 0, 10).status_code, 404)
+
+    def test_invalid_ranges(self):
+        session_id = self.start()
+        response = self.client.put(
+            f"/api/uploads/{session_id}/",
+            b"x",
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.put(session_id, 3000, 3100).status_code, 416)
+        self.assertEqual(self.put(session_id, 0, 10, total=10).status_code, 416)
+        # Тело короче заявленного диапазона
+        self.assertEqual(self.put(session_id, 0, 100, body=b"x" * 10).status_code, 400)
+        self.assertEqual(
+            self.client.get(f"/api/uploads/{session_id}/").data["received"], []
+        )
+
+    def test_other_user_cannot_see_session(self):
+        session_id = self.start()
+        other = self.client_for(self.create_user("bob"))
+
+        self.assertEqual(other.get(f"/api/uploads/{session_id}/").status_code, 404)
+        self.assertEqual(
+            other.post(f"/api/uploads/{session_id}/commit/").status_code, 404
+        )
+        self.assertEqual(other.delete(f"/api/uploads/{session_id}/").status_code, 404)
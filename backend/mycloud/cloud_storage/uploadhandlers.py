@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from .blobs import make_temp_path
+from .quotas import reserve_storage
+
+
+class QuotaUploadHandler(FileUploadHandler):
+    """Проверяет квоту по Content-Length до того, как тело запроса прочитано
+
+    Резерв остается на запросе (request.storage_reservation) и снимается
+    представлением после сохранения файла.
+    """
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        user = getattr(self.request, "user", None)
+        if user is None or not user.is_authenticated:
+            return
+        reserve_storage(user, content_length)
+        self.request.storage_reservation = content_length
+
+    def receive_data_chunk(self, raw_data, start):
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class BlobUploadedFile(UploadedFile):
+    """Загруженный файл, уже лежащий во временной папке хранилища блобов"""
+
+    def __init__(self, path, name, content_type, size, charset, extra, sha256):
+        super().__init__(open(path, "rb"), name, content_type, size, charset, extra)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        # Если файл не был перенесен в хранилище (ошибка запроса), удаляем его
+        try:
+            return self.file.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class BlobUploadHandler(FileUploadHandler):
+    """Пишет файл из multipart сразу в хранилище блобов
+
+    Байты попадают на диск один раз: в файл на той же файловой системе, что
+    и MEDIA_ROOT/blobs, откуда блоб затем перемещается переименованием.
+    Хеш и размер считаются по ходу записи.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.path = make_temp_path()
+        self.destination = open(self.path, "wb")
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.destination.write(raw_data)
+        self.digest.update(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.destination.close()
+        return BlobUploadedFile(
+            self.path,
+            self.file_name,
+            self.content_type,
+            file_size,
+            self.charset,
+            self.content_type_extra,
+            self.digest.hexdigest(),
+        )
+
+    def upload_interrupted(self):
+        if hasattr(self, "destination"):
+            self.destination.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
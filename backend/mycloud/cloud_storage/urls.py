@@ -1,12 +1,14 @@
+from django.conf import settings
 from django.urls import path, include
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.http import JsonResponse
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r"users", views.UserViewSet, basename="user")
 router.register(r"files", views.FileViewSet, basename="file")
+router.register(r"uploads", views.UploadSessionViewSet, basename="upload")
 
 
 def csrf_token_view(request):
@@ -24,5 +26,29 @@ urlpatterns = [
     path(
         "download/<uuid:special_link>/", views.download_by_link, name="download-by-link"
     ),
+    path("share/<str:token>/", views.download_by_token, name="share-token-download"),
+    path("share/<str:token>/view/", views.view_by_token, name="share-token-view"),
     path("", include(router.urls)),
 ]
+
+if settings.ASYNC_FILE_SERVING:
+    # Под ASGI отдача файлов обслуживается асинхронными представлениями
+    urlpatterns = [
+        path("files/<int:pk>/download/", async_views.download, name="file-download"),
+        path("files/<int:pk>/view/", async_views.view, name="file-view"),
+        path(
+            "download/<uuid:special_link>/",
+            async_views.download_by_link,
+            name="download-by-link",
+        ),
+        path(
+            "share/<str:token>/",
+            async_views.download_by_token,
+            name="share-token-download",
+        ),
+        path(
+            "share/<str:token>/view/",
+            async_views.view_by_token,
+            name="share-token-view",
+        ),
+    ] + urlpatterns
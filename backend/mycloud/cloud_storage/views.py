@@ -1,34 +1,93 @@
 from rest_framework.authtoken.models import Token
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (
+    action,
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import login, logout
-from django.http import FileResponse, Http404
-from django.utils import timezone
-from .models import User, File
-from .serializers import UserRegistrationSerializer, UserSerializer, FileSerializer
+from django.core.exceptions import ValidationError
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.db import transaction
+from .blobs import (
+    acquire_blob,
+    hash_file,
+    make_temp_path,
+    store_blob,
+    write_temp,
+)
+from .archives import ARCHIVE_FORMATS
+from .bulk import bulk_delete_files, bulk_update_files
+from .caching import get_cached_file, get_current_user_data, get_shared_file
+from .delivery import iterate_in_thread, serve_file
+from .download_stats import record_download, record_downloads
+from .filters import FileFilterBackend
+from .jobs import enqueue
+from .models import User, File, UploadSession
+from .pagination import KeysetPagination, RankedPagination
+from .previews import DEFAULT_PREVIEW_SIZE, PREVIEW_SIZES, preview_response
+from .quotas import release_storage, reserve_storage
+from .search import MAX_QUERY_LENGTH, search_files
+from .serializers import (
+    ArchiveRequestSerializer,
+    BulkDeleteSerializer,
+    BulkUpdateSerializer,
+    RevokeShareTokenSerializer,
+    ShareTokenSerializer,
+    UserRegistrationSerializer,
+    UserSerializer,
+    FileSerializer,
+    UploadSessionSerializer,
+    UploadByHashSerializer,
+)
+from .share_tokens import (
+    InvalidShareToken,
+    check_token,
+    issue_token,
+    load_token,
+    revoke_token,
+    share_response,
+)
+from .storage import get_storage
+from .tasks import discard_upload_session
+from .uploadhandlers import BlobUploadedFile, BlobUploadHandler, QuotaUploadHandler
 import os
+import re
 import logging
 from django.conf import settings
 
 # Логирование (настройки берутся из settings.py)
 logger = logging.getLogger("cloud_storage")
 
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+# acquire_blob вернул None: блоб с тем же хешем записан с другим размером
+BLOB_CONFLICT_ERROR = "Содержимое с таким хешем уже хранится с другим размером"
+
+
+def file_queryset(user, user_id=None):
+    """Файлы, доступные пользователю: свои или выбранного пользователя для админа"""
+    if user_id and user.is_admin:
+        return File.objects.filter(user_id=user_id).select_related("blob")
+    return File.objects.filter(user=user).select_related("blob")
+
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def register_user(request):
     """Регистрация нового пользователя"""
     logger.info(
-        f"Попытка регистрации пользователя: {request.data.get('username', 'unknown')}"
+        "Попытка регистрации пользователя: %s", request.data.get("username", "unknown")
     )
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
         token, created = Token.objects.get_or_create(user=user)
         logger.info(
-            f"Пользователь успешно зарегистрирован: {user.username} (ID: {user.id})"
+            "Пользователь успешно зарегистрирован: %s (ID: %s)", user.username, user.id
         )
         return Response(
             {
@@ -38,7 +97,7 @@ def register_user(request):
             },
             status=status.HTTP_201_CREATED,
         )
-    logger.warning(f"Ошибка регистрации: {serializer.errors}")
+    logger.warning("Ошибка регистрации: %s", serializer.errors)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -48,14 +107,14 @@ def login_user(request):
     """Аутентификация пользователя (использует сессионную аутентификацию)"""
     username = request.data.get("username")
     password = request.data.get("password")
-    logger.info(f"Попытка входа пользователя: {username}")
+    logger.info("Попытка входа пользователя: %s", username)
 
     try:
         user = User.objects.get(username=username)
         if user.check_password(password):
             login(request, user)
             token, created = Token.objects.get_or_create(user=user)
-            logger.info(f"Успешный вход пользователя: {username} (ID: {user.id})")
+            logger.info("Успешный вход пользователя: %s (ID: %s)", username, user.id)
             return Response(
                 {
                     "message": "Успешный вход",
@@ -64,12 +123,12 @@ def login_user(request):
                 }
             )
         else:
-            logger.warning(f"Неверный пароль для пользователя: {username}")
+            logger.warning("Неверный пароль для пользователя: %s", username)
             return Response(
                 {"error": "Неверный пароль"}, status=status.HTTP_401_UNAUTHORIZED
             )
     except User.DoesNotExist:
-        logger.warning(f"Попытка входа несуществующего пользователя: {username}")
+        logger.warning("Попытка входа несуществующего пользователя: %s", username)
         return Response(
             {"error": "Пользователь не найден"}, status=status.HTTP_404_NOT_FOUND
         )
@@ -80,7 +139,7 @@ def login_user(request):
 def logout_user(request):
     """Выход из системы"""
     username = request.user.username
-    logger.info(f"Выход пользователя: {username}")
+    logger.info("Выход пользователя: %s", username)
     logout(request)
     return Response({"message": "Успешный выход"})
 
@@ -89,7 +148,7 @@ def logout_user(request):
 @permission_classes([IsAuthenticated])
 def current_user(request):
     """Получить информацию о текущем пользователе"""
-    return Response(UserSerializer(request.user).data)
+    return Response(get_current_user_data(request.user.pk))
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -102,11 +161,12 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if self.request.user.is_admin:
             logger.debug(
-                f"Администратор {self.request.user.username} запрашивает список пользователей"
+                "Администратор %s запрашивает список пользователей",
+                self.request.user.username,
             )
             return User.objects.all()
         logger.debug(
-            f"Пользователь {self.request.user.username} запрашивает свою информацию"
+            "Пользователь %s запрашивает свою информацию", self.request.user.username
         )
         return User.objects.filter(id=self.request.user.id)
 
@@ -114,7 +174,8 @@ class UserViewSet(viewsets.ModelViewSet):
         """Обновление пользователя (изменение прав администратора)"""
         if not request.user.is_admin:
             logger.warning(
-                f"Попытка обновления пользователя без прав администратора: {request.user.username}"
+                "Попытка обновления пользователя без прав администратора: %s",
+                request.user.username,
             )
             return Response(
                 {"error": "Недостаточно прав"}, status=status.HTTP_403_FORBIDDEN
@@ -127,9 +188,11 @@ class UserViewSet(viewsets.ModelViewSet):
 
         if old_is_admin != user_to_update.is_admin:
             logger.info(
-                f"Изменение прав администратора для {user_to_update.username}: "
-                f"{old_is_admin} -> {user_to_update.is_admin} администратором: "
-                f"{request.user.username}"
+                "Изменение прав администратора для %s: %s -> %s администратором: %s",
+                user_to_update.username,
+                old_is_admin,
+                user_to_update.is_admin,
+                request.user.username,
             )
 
         return result
@@ -137,14 +200,18 @@ class UserViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         if not request.user.is_admin:
             logger.warning(
-                f"Попытка удаления пользователя без прав администратора: {request.user.username}"
+                "Попытка удаления пользователя без прав администратора: %s",
+                request.user.username,
             )
             return Response(
                 {"error": "Недостаточно прав"}, status=status.HTTP_403_FORBIDDEN
             )
         user_to_delete = self.get_object()
         logger.info(
-            f"Удаление пользователя: {user_to_delete.username} (ID: {user_to_delete.id}) администратором: {request.user.username}"
+            "Удаление пользователя: %s (ID: %s) администратором: %s",
+            user_to_delete.username,
+            user_to_delete.id,
+            request.user.username,
         )
         return super().destroy(request, *args, **kwargs)
 
@@ -154,12 +221,34 @@ class FileViewSet(viewsets.ModelViewSet):
 
     serializer_class = FileSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FileFilterBackend]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        user_id = self.request.query_params.get("user_id")
-        if user_id and self.request.user.is_admin:
-            return File.objects.filter(user_id=user_id)
-        return File.objects.filter(user=self.request.user)
+        return file_queryset(
+            self.request.user, self.request.query_params.get("user_id")
+        )
+
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action == "create":
+            # Квота проверяется по Content-Length до чтения тела запроса,
+            # затем файл пишется сразу в хранилище блобов
+            request.upload_handlers = [
+                QuotaUploadHandler(request),
+                BlobUploadHandler(request),
+            ]
+        return drf_request
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # Резерв снимается и при исключении, которое DRF не превращает
+            # в ответ (например, OSError при записи загрузки на диск)
+            reservation = getattr(request, "storage_reservation", 0)
+            if reservation:
+                release_storage(request.user, reservation)
 
     def create(self, request, *args, **kwargs):
         """Загрузка файла"""
@@ -168,114 +257,334 @@ class FileViewSet(viewsets.ModelViewSet):
 
         if not uploaded_file:
             logger.warning(
-                f"Попытка загрузки без файла пользователем: {request.user.username}"
+                "Попытка загрузки без файла пользователем: %s", request.user.username
             )
             return Response(
                 {"error": "Файл не предоставлен"}, status=status.HTTP_400_BAD_REQUEST
             )
 
         logger.info(
-            f"Начало загрузки файла: {uploaded_file.name} (размер: {uploaded_file.size} байт) пользователем: {request.user.username}"
+            "Начало загрузки файла: %s (размер: %s байт) пользователем: %s",
+            uploaded_file.name,
+            uploaded_file.size,
+            request.user.username,
         )
 
-        user_dir = os.path.join(settings.MEDIA_ROOT, request.user.storage_path)
-        os.makedirs(user_dir, exist_ok=True)
-
-        import uuid
-
-        file_extension = os.path.splitext(uploaded_file.name)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(user_dir, unique_filename)
-
+        tmp_path = None
         try:
-            with open(file_path, "wb+") as destination:
-                for chunk in uploaded_file.chunks():
-                    destination.write(chunk)
-
-            file_obj = File.objects.create(
-                user=request.user,
-                original_name=uploaded_file.name,
-                file_path=os.path.join(request.user.storage_path, unique_filename),
-                size=uploaded_file.size,
-                comment=comment,
-            )
+            if isinstance(uploaded_file, BlobUploadedFile):
+                tmp_path = uploaded_file.temporary_file_path()
+                sha256, size = uploaded_file.sha256, uploaded_file.size
+            else:
+                tmp_path, sha256, size = write_temp(uploaded_file.chunks())
+            store_blob(sha256, size, tmp_path)
+            with transaction.atomic():
+                blob = acquire_blob(sha256, size, source_path=tmp_path)
+                if blob is None:
+                    logger.error(
+                        "Блоб %s уже хранится с размером, отличным от %s байт",
+                        sha256,
+                        size,
+                    )
+                    return Response(
+                        {"error": BLOB_CONFLICT_ERROR}, status=status.HTTP_409_CONFLICT
+                    )
+                file_obj = File.objects.create(
+                    user=request.user,
+                    original_name=uploaded_file.name,
+                    file_path=blob.path,
+                    size=size,
+                    comment=comment,
+                    blob=blob,
+                )
 
             logger.info(
-                f"Файл успешно загружен: {uploaded_file.name} (ID: {file_obj.id}) пользователем: {request.user.username}"
+                "Файл успешно загружен: %s (ID: %s) пользователем: %s",
+                uploaded_file.name,
+                file_obj.id,
+                request.user.username,
             )
             return Response(
                 FileSerializer(file_obj).data, status=status.HTTP_201_CREATED
             )
         except Exception as e:
-            logger.error(f"Ошибка при загрузке файла {uploaded_file.name}: {str(e)}")
+            logger.error("Ошибка при загрузке файла %s: %s", uploaded_file.name, e)
             return Response(
                 {"error": "Ошибка при сохранении файла"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+        finally:
+            # Временный файл остается, только если он не попал в хранилище
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @action(detail=False, methods=["post"], url_path="by-hash")
+    def by_hash(self, request):
+        """Копия своего файла без передачи байтов
+
+        Содержимое берется по хешу, только если у пользователя уже есть файл
+        с ним: иначе по хешу и размеру можно было бы получить чужой файл.
+        """
+        serializer = UploadByHashSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        reserve_storage(request.user, data["size"])
+        try:
+            with transaction.atomic():
+                # Блокировка строки файла не дает удалить его, пока берется ссылка
+                owned = (
+                    File.objects.select_for_update(of=("self",))
+                    .filter(
+                        user=request.user,
+                        blob__sha256=data["sha256"],
+                        blob__size=data["size"],
+                    )
+                    .first()
+                )
+                blob = acquire_blob(data["sha256"], data["size"]) if owned else None
+                if blob is None:
+                    return Response(
+                        {"error": "Содержимое с таким хешем не найдено"},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+                file_obj = File.objects.create(
+                    user=request.user,
+                    original_name=data["original_name"],
+                    file_path=blob.path,
+                    size=blob.size,
+                    comment=data.get("comment", ""),
+                    blob=blob,
+                )
+        finally:
+            release_storage(request.user, data["size"])
+
+        logger.info(
+            "Файл загружен по хешу: %s (ID: %s) пользователем: %s",
+            file_obj.original_name,
+            file_obj.id,
+            request.user.username,
+        )
+        return Response(FileSerializer(file_obj).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["get"], pagination_class=RankedPagination)
+    def search(self, request):
+        """Поиск по имени и комментарию (параметр q), по убыванию релевантности
+
+        Фильтры списка (size_min, uploaded_after и т. д.) тоже применяются.
+        """
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"error": "Укажите строку поиска в параметре q"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(query) > MAX_QUERY_LENGTH:
+            return Response(
+                {"error": f"Строка поиска длиннее {MAX_QUERY_LENGTH} символов"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = search_files(self.filter_queryset(self.get_queryset()), query)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["get"])
     def download(self, request, pk=None):
         """Скачивание файла"""
         file_obj = self.get_object()
-        file_full_path = os.path.join(settings.MEDIA_ROOT, file_obj.file_path)
+        storage = get_storage()
 
         logger.info(
-            f"Попытка скачивания файла: {file_obj.original_name} (ID: {file_obj.id}) пользователем: {request.user.username}"
+            "Попытка скачивания файла: %s (ID: %s) пользователем: %s",
+            file_obj.original_name,
+            file_obj.id,
+            request.user.username,
+            extra={"event": "download"},
         )
 
-        if not os.path.exists(file_full_path):
-            logger.error(f"Файл не найден на диске: {file_full_path}")
+        if not storage.exists(file_obj.file_path):
+            logger.error("Файл не найден в хранилище: %s", file_obj.file_path)
             raise Http404("Файл не найден")
 
-        file_obj.last_download_date = timezone.now()
-        file_obj.save()
+        record_download(file_obj)
 
         logger.info(
-            f"Файл успешно скачан: {file_obj.original_name} пользователем: {request.user.username}"
+            "Файл успешно скачан: %s пользователем: %s",
+            file_obj.original_name,
+            request.user.username,
+            extra={"event": "download"},
         )
-        response = FileResponse(open(file_full_path, "rb"))
-        response["Content-Disposition"] = (
-            f'attachment; filename="{file_obj.original_name}"'
-        )
-        return response
+        return serve_file(request, file_obj)
 
     @action(detail=True, methods=["get"])
     def view(self, request, pk=None):
         """Просмотр файла в браузере (для изображений и текстовых файлов)"""
         file_obj = self.get_object()
-        file_full_path = os.path.join(settings.MEDIA_ROOT, file_obj.file_path)
+        storage = get_storage()
 
         logger.info(
-            f"Попытка просмотра файла: {file_obj.original_name} (ID: {file_obj.id}) пользователем: {request.user.username}"
+            "Попытка просмотра файла: %s (ID: %s) пользователем: %s",
+            file_obj.original_name,
+            file_obj.id,
+            request.user.username,
+            extra={"event": "view"},
         )
 
-        if not os.path.exists(file_full_path):
-            logger.error(f"Файл не найден на диске: {file_full_path}")
+        if not storage.exists(file_obj.file_path):
+            logger.error("Файл не найден в хранилище: %s", file_obj.file_path)
             raise Http404("Файл не найден")
 
-        # Определяем тип контента
-        file_extension = os.path.splitext(file_obj.original_name)[1].lower()
-        content_type_map = {
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".png": "image/png",
-            ".gif": "image/gif",
-            ".svg": "image/svg+xml",
-            ".txt": "text/plain",
-            ".html": "text/html",
-            ".css": "text/css",
-            ".js": "text/javascript",
-            ".json": "application/json",
-            ".pdf": "application/pdf",
+        response = serve_file(request, file_obj, inline=True)
+
+        logger.info(
+            "Файл открыт для просмотра: %s пользователем: %s",
+            file_obj.original_name,
+            request.user.username,
+            extra={"event": "view"},
+        )
+        return response
+
+    @action(detail=True, methods=["post"], url_path="share-tokens")
+    def share_tokens(self, request, pk=None):
+        """Подписанная ссылка на файл со сроком действия
+
+        operations - разрешенные операции (download, view), expires_in - срок
+        в секундах, rate_limit - ограничение скорости отдачи (байт/с).
+        """
+        file_obj = self.get_object()
+        serializer = ShareTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        token, share_token = issue_token(
+            file_obj, data["operations"], data["expires_in"], data.get("rate_limit")
+        )
+
+        logger.info(
+            "Создана подписанная ссылка %s на файл: %s (ID: %s) пользователем: %s",
+            share_token.token_id,
+            file_obj.original_name,
+            file_obj.id,
+            request.user.username,
+            extra={"event": "share_link"},
+        )
+        urls = {
+            "download": "share-token-download",
+            "view": "share-token-view",
         }
+        return Response(
+            {
+                "token": token,
+                "token_id": share_token.token_id,
+                "operations": share_token.operations,
+                "expires_at": share_token.expires_at,
+                "rate_limit": share_token.rate_limit,
+                "urls": {
+                    operation: request.build_absolute_uri(
+                        reverse(urls[operation], args=[token])
+                    )
+                    for operation in share_token.operations
+                },
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
-        content_type = content_type_map.get(file_extension, "application/octet-stream")
+    @action(detail=True, methods=["post"], url_path="share-tokens/revoke")
+    def revoke_share_token(self, request, pk=None):
+        """Отзыв подписанной ссылки на файл (token)"""
+        file_obj = self.get_object()
+        serializer = RevokeShareTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            share_token = load_token(
+                serializer.validated_data["token"], check_expiry=False
+            )
+        except InvalidShareToken as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if share_token.file_id != file_obj.id:
+            return Response(
+                {"error": "Ссылка относится к другому файлу"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Ссылка с истекшим сроком и так не действует
+        if share_token.remaining():
+            revoke_token(share_token)
+        logger.info(
+            "Отозвана подписанная ссылка %s на файл: %s пользователем: %s",
+            share_token.token_id,
+            file_obj.original_name,
+            request.user.username,
+            extra={"event": "share_link"},
+        )
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        response = FileResponse(open(file_full_path, "rb"), content_type=content_type)
-        response["Content-Disposition"] = f'inline; filename="{file_obj.original_name}"'
+    @action(detail=True, methods=["get"])
+    def preview(self, request, pk=None):
+        """Уменьшенная копия изображения или первой страницы PDF
+
+        size - small (по умолчанию) или large.
+        """
+        file_obj = self.get_object()
+        size_name = request.query_params.get("size", DEFAULT_PREVIEW_SIZE)
+        if size_name not in PREVIEW_SIZES:
+            return Response(
+                {"error": f"Допустимые размеры превью: {', '.join(PREVIEW_SIZES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        response = preview_response(request, file_obj, size_name)
+        if response is None:
+            raise Http404("Превью для файла недоступно")
+        return response
+
+    @action(detail=False, methods=["post"])
+    def archive(self, request):
+        """Скачивание нескольких файлов одним потоковым ZIP/TAR-архивом
+
+        ids - список ID файлов; администратор может вместо него передать
+        user_id, чтобы скачать все хранилище пользователя.
+        """
+        serializer = ArchiveRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if "ids" in data:
+            files = file_queryset(request.user, data.get("user_id")).filter(
+                id__in=data["ids"]
+            )
+        elif request.user.is_admin:
+            files = File.objects.filter(user_id=data["user_id"])
+        else:
+            return Response(
+                {"error": "Недостаточно прав"}, status=status.HTTP_403_FORBIDDEN
+            )
+        files = list(files.order_by("id")[: settings.ARCHIVE_MAX_FILES + 1])
+        if not files:
+            raise Http404("Файлы не найдены")
+        if len(files) > settings.ARCHIVE_MAX_FILES:
+            return Response(
+                {
+                    "error": f"В архив можно добавить не более {settings.ARCHIVE_MAX_FILES} файлов"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         logger.info(
-            f"Файл открыт для просмотра: {file_obj.original_name} пользователем: {request.user.username}"
+            "Скачивание архива (%s, файлов: %s) пользователем: %s",
+            data["format"],
+            len(files),
+            request.user.username,
+        )
+        record_downloads(files)
+
+        stream, content_type = ARCHIVE_FORMATS[data["format"]]
+        content = stream(files)
+        if settings.ASYNC_FILE_SERVING:
+            content = iterate_in_thread(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="files.{data["format"]}"'
         )
         return response
 
@@ -283,71 +592,404 @@ class FileViewSet(viewsets.ModelViewSet):
         """Обновление файла (переименование, изменение комментария)"""
         file_obj = self.get_object()
         logger.info(
-            f"Обновление файла: {file_obj.original_name} (ID: {file_obj.id}) пользователем: {request.user.username}"
+            "Обновление файла: %s (ID: %s) пользователем: %s",
+            file_obj.original_name,
+            file_obj.id,
+            request.user.username,
         )
 
         # Разрешаем обновление original_name и comment
+        update_fields = []
         if "original_name" in request.data:
             old_name = file_obj.original_name
             file_obj.original_name = request.data["original_name"]
-            logger.info(f"Переименование файла: {old_name} -> {file_obj.original_name}")
+            logger.info(
+                "Переименование файла: %s -> %s", old_name, file_obj.original_name
+            )
+            update_fields.append("original_name")
 
         if "comment" in request.data:
             old_comment = file_obj.comment
             file_obj.comment = request.data["comment"]
             logger.info(
-                f"Изменение комментария к файлу {file_obj.original_name}: '{old_comment}' -> '{file_obj.comment}'"
+                "Изменение комментария к файлу %s: '%s' -> '%s'",
+                file_obj.original_name,
+                old_comment,
+                file_obj.comment,
             )
+            update_fields.append("comment")
 
-        file_obj.save()
+        # Только измененные поля: статистика скачиваний пишется отдельно
+        if update_fields:
+            file_obj.save(update_fields=update_fields)
         return Response(FileSerializer(file_obj).data)
 
     def destroy(self, request, *args, **kwargs):
         """Удаление файла"""
-        file_obj = self.get_object()
+        with transaction.atomic():
+            # Строка перечитывается под блокировкой: ingest_blobs мог перенести
+            # файл в хранилище блобов после того, как он был прочитан
+            file_obj = File.objects.select_for_update().get(pk=self.get_object().pk)
+            logger.info(
+                "Удаление файла: %s (ID: %s) пользователем: %s",
+                file_obj.original_name,
+                file_obj.id,
+                request.user.username,
+            )
+
+            # Файлы из хранилища блобов освобождаются сигналом post_delete
+            if file_obj.blob_id is None:
+                enqueue("delete_stored_files", {"paths": [file_obj.file_path]})
+            self.perform_destroy(file_obj)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["post"], url_path="bulk-delete")
+    def bulk_delete(self, request):
+        """Удаление нескольких файлов одной транзакцией
+
+        Возвращает статус по каждому ID: deleted или not_found.
+        """
+        serializer = BulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+
+        deleted = bulk_delete_files(
+            file_queryset(request.user, request.query_params.get("user_id")).filter(
+                id__in=ids
+            )
+        )
         logger.info(
-            f"Удаление файла: {file_obj.original_name} (ID: {file_obj.id}) пользователем: {request.user.username}"
+            "Массовое удаление файлов (%s из %s) пользователем: %s",
+            len(deleted),
+            len(ids),
+            request.user.username,
+        )
+        return Response(
+            {
+                "results": [
+                    {"id": pk, "status": "deleted" if pk in deleted else "not_found"}
+                    for pk in ids
+                ]
+            }
         )
 
-        file_full_path = os.path.join(settings.MEDIA_ROOT, file_obj.file_path)
-        if os.path.exists(file_full_path):
-            try:
-                os.remove(file_full_path)
-                logger.info(f"Файл удален с диска: {file_full_path}")
-            except Exception as e:
-                logger.error(f"Ошибка при удалении файла с диска: {str(e)}")
+    @action(detail=False, methods=["patch"], url_path="bulk-update")
+    def bulk_update(self, request):
+        """Переименование и изменение комментариев нескольких файлов
+
+        items - список {id, original_name?, comment?}; все найденные файлы
+        обновляются одним запросом, для остальных возвращается not_found.
+        """
+        serializer = BulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = {item.pop("id"): item for item in serializer.validated_data["items"]}
+
+        with transaction.atomic():
+            files = list(
+                file_queryset(request.user, request.query_params.get("user_id"))
+                .select_for_update(of=("self",))
+                .filter(id__in=changes)
+            )
+            bulk_update_files(files, changes)
+        logger.info(
+            "Массовое обновление файлов (%s из %s) пользователем: %s",
+            len(files),
+            len(changes),
+            request.user.username,
+        )
 
-        return super().destroy(request, *args, **kwargs)
+        updated = {file_obj.id: file_obj for file_obj in files}
+        results = []
+        for pk in changes:
+            if pk in updated:
+                results.append(
+                    {
+                        "id": pk,
+                        "status": "updated",
+                        "file": FileSerializer(updated[pk]).data,
+                    }
+                )
+            else:
+                results.append({"id": pk, "status": "not_found"})
+        return Response({"results": results})
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def download_by_link(request, special_link):
     """Скачивание файла по специальной ссылке"""
-    logger.info(f"Попытка скачивания файла по специальной ссылке: {special_link}")
+    logger.info(
+        "Попытка скачивания файла по специальной ссылке: %s",
+        special_link,
+        extra={"event": "share_link"},
+    )
+    # Файл по ссылке берется из кеша, без запроса к БД
+    file_obj = get_shared_file(special_link)
+    if file_obj is None:
+        logger.warning(
+            "Попытка скачивания несуществующего файла по ссылке: %s", special_link
+        )
+        raise Http404("Файл не найден")
+
+    storage = get_storage()
+    if not storage.exists(file_obj.file_path):
+        logger.error(
+            "Файл не найден в хранилище по ссылке %s: %s",
+            special_link,
+            file_obj.file_path,
+        )
+        raise Http404("Файл не найден")
+
+    record_download(file_obj)
+
+    logger.info(
+        "Файл успешно скачан по специальной ссылке: %s",
+        file_obj.original_name,
+        extra={"event": "share_link"},
+    )
+    return serve_file(request, file_obj)
+
+
+def serve_by_token(request, token, operation):
+    """Отдача файла по подписанной ссылке без обращения к БД
+
+    Запрос к БД бывает только при промахе кеша файла или проверки отзыва.
+    """
     try:
-        file_obj = File.objects.get(special_link=special_link)
-        file_full_path = os.path.join(settings.MEDIA_ROOT, file_obj.file_path)
+        share_token = check_token(token, operation)
+    except InvalidShareToken as e:
+        logger.warning("Отклонена подписанная ссылка (%s): %s", operation, e)
+        return Response({"error": str(e)}, status=e.status)
+
+    file_obj = get_cached_file(share_token.file_id)
+    storage = get_storage()
+    if file_obj is None or not storage.exists(file_obj.file_path):
+        logger.warning("Файл по подписанной ссылке %s не найден", share_token.token_id)
+        raise Http404("Файл не найден")
+
+    if operation == "download":
+        record_download(file_obj)
+    logger.info(
+        "Файл отдан по подписанной ссылке %s (%s): %s",
+        share_token.token_id,
+        operation,
+        file_obj.original_name,
+        extra={"event": "share_link"},
+    )
+    response = serve_file(request, file_obj, inline=operation == "view")
+    return share_response(response, share_token)
+
+
+# Без аутентификации: сессия и токен пользователя не читаются из БД
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def download_by_token(request, token):
+    """Скачивание файла по подписанной ссылке"""
+    return serve_by_token(request, token, "download")
 
-        if not os.path.exists(file_full_path):
-            logger.error(
-                f"Файл не найден на диске по ссылке {special_link}: {file_full_path}"
-            )
-            raise Http404("Файл не найден")
 
-        file_obj.last_download_date = timezone.now()
-        file_obj.save()
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def view_by_token(request, token):
+    """Просмотр файла по подписанной ссылке"""
+    return serve_by_token(request, token, "view")
+
+
+class UploadSessionViewSet(viewsets.ViewSet):
+    """API возобновляемой загрузки файлов по частям
+
+    POST   /uploads/              - начать сессию (original_name, size, comment)
+    PUT    /uploads/<id>/         - записать часть (заголовок Content-Range)
+    GET    /uploads/<id>/         - получить уже принятые диапазоны байтов
+    POST   /uploads/<id>/commit/  - завершить загрузку и создать файл
+    DELETE /uploads/<id>/         - отменить загрузку
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get_session(self, pk):
+        try:
+            return UploadSession.objects.get(pk=pk, user=self.request.user)
+        except (UploadSession.DoesNotExist, ValueError, ValidationError):
+            raise Http404("Сессия загрузки не найдена")
+
+    def create(self, request):
+        """Начало загрузки: резервирует место под файл на диске"""
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        original_name = serializer.validated_data["original_name"]
+        size = serializer.validated_data["size"]
+
+        # Резерв квоты держится до завершения или отмены сессии
+        reserve_storage(request.user, size)
+        file_path = make_temp_path()
+        relative_path = os.path.relpath(file_path, settings.MEDIA_ROOT)
+        try:
+            with open(file_path, "wb") as destination:
+                if size:
+                    if hasattr(os, "posix_fallocate"):
+                        os.posix_fallocate(destination.fileno(), 0, size)
+                    else:
+                        destination.truncate(size)
+        except OSError as e:
+            logger.error("Ошибка при резервировании места под %s: %s", original_name, e)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            release_storage(request.user, size)
+            return Response(
+                {"error": "Недостаточно места для файла"},
+                status=status.HTTP_507_INSUFFICIENT_STORAGE,
+            )
 
+        session = serializer.save(user=request.user, file_path=relative_path)
         logger.info(
-            f"Файл успешно скачан по специальной ссылке: {file_obj.original_name}"
+            "Начата загрузка по частям: %s (размер: %s байт, сессия: %s) пользователем: %s",
+            original_name,
+            size,
+            session.id,
+            request.user.username,
         )
-        response = FileResponse(open(file_full_path, "rb"))
-        response["Content-Disposition"] = (
-            f'attachment; filename="{file_obj.original_name}"'
+        return Response(
+            UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED
         )
-        return response
-    except File.DoesNotExist:
-        logger.warning(
-            f"Попытка скачивания несуществующего файла по ссылке: {special_link}"
+
+    def retrieve(self, request, pk=None):
+        """Статус загрузки: список уже принятых диапазонов"""
+        return Response(UploadSessionSerializer(self.get_session(pk)).data)
+
+    def update(self, request, pk=None):
+        """Прием части файла и запись ее прямо в итоговый файл"""
+        session = self.get_session(pk)
+
+        match = CONTENT_RANGE_RE.match(request.headers.get("Content-Range", ""))
+        if not match:
+            return Response(
+                {"error": "Требуется заголовок Content-Range: bytes start-end/total"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        start, end, total = match.groups()
+        start, end = int(start), int(end)
+        length = end - start + 1
+        if end < start or end >= session.size or total not in ("*", str(session.size)):
+            return Response(
+                {"error": "Диапазон выходит за пределы файла"},
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            )
+        max_chunk = settings.UPLOAD_CHUNK_MAX_SIZE
+        if length > max_chunk:
+            return Response(
+                {"error": f"Размер части не должен превышать {max_chunk} байт"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        file_full_path = os.path.join(settings.MEDIA_ROOT, session.file_path)
+        written = 0
+        try:
+            with open(file_full_path, "r+b") as destination:
+                destination.seek(start)
+                while written < length:
+                    data = request.read(min(64 * 1024, length - written))
+                    if not data:
+                        break
+                    destination.write(data)
+                    written += len(data)
+        except OSError as e:
+            logger.error("Ошибка записи части файла (сессия %s): %s", session.id, e)
+            return Response(
+                {"error": "Ошибка при сохранении части файла"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        if written != length:
+            logger.warning(
+                "Получена неполная часть файла (сессия %s): %s из %s байт",
+                session.id,
+                written,
+                length,
+            )
+            return Response(
+                {"error": "Тело запроса короче указанного диапазона"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        session.chunks.create(offset=start, length=length)
+        logger.debug("Принята часть %s-%s (сессия %s)", start, end, session.id)
+        return Response(UploadSessionSerializer(session).data)
+
+    partial_update = update
+
+    @action(detail=True, methods=["post"])
+    def commit(self, request, pk=None):
+        """Завершение загрузки: создает запись File"""
+        session = self.get_session(pk)
+        if not session.is_complete():
+            return Response(
+                {
+                    "error": "Файл загружен не полностью",
+                    "received": session.received_ranges(),
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        file_full_path = os.path.join(settings.MEDIA_ROOT, session.file_path)
+        try:
+            sha256, size = hash_file(file_full_path)
+        except FileNotFoundError:
+            # Файл уже забрал параллельный commit или удалила отмена загрузки
+            raise Http404("Сессия загрузки не найдена")
+        store_blob(sha256, size, file_full_path)
+        with transaction.atomic():
+            # Сессию завершает только один запрос: параллельный commit ждет
+            # блокировку и затем не находит сессию
+            session = (
+                UploadSession.objects.select_for_update()
+                .filter(pk=session.pk)
+                .select_related("user")
+                .first()
+            )
+            if session is not None:
+                blob = acquire_blob(sha256, size, source_path=file_full_path)
+                if blob is not None:
+                    file_obj = File.objects.create(
+                        user=session.user,
+                        original_name=session.original_name,
+                        file_path=blob.path,
+                        size=size,
+                        comment=session.comment,
+                        blob=blob,
+                    )
+                    session.delete()
+                    release_storage(session.user, session.size)
+        if session is None:
+            # Содержимое уже сохранено store_blob; если ссылок на блоб так и
+            # не появилось, его удалит purge_unused_blobs
+            raise Http404("Сессия загрузки не найдена")
+        if blob is None:
+            logger.error(
+                "Блоб %s уже хранится с размером, отличным от %s байт (сессия %s)",
+                sha256,
+                size,
+                session.id,
+            )
+            discard_upload_session(session)
+            return Response(
+                {"error": BLOB_CONFLICT_ERROR}, status=status.HTTP_409_CONFLICT
+            )
+
+        logger.info(
+            "Файл успешно загружен по частям: %s (ID: %s) пользователем: %s",
+            file_obj.original_name,
+            file_obj.id,
+            request.user.username,
         )
-        raise Http404("Файл не найден")
+        return Response(FileSerializer(file_obj).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        """Отмена загрузки и удаление частично записанного файла"""
+        session = self.get_session(pk)
+        discard_upload_session(session)
+        logger.info("Загрузка по частям отменена (сессия %s)", session.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,26 @@
+"""
+Хуки Gunicorn для метрик Prometheus в multiprocess-режиме
+
+Gunicorn читает этот файл из рабочего каталога автоматически. Хуки работают,
+только если задана переменная окружения PROMETHEUS_MULTIPROC_DIR.
+"""
+
+import glob
+import os
+
+
+def on_starting(server):
+    # Значения прошлого запуска не должны попасть в метрики нового
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for name in glob.glob(os.path.join(path, "*.db")):
+            os.remove(name)
+
+
+def child_exit(server, worker):
+    # Идущие передачи завершившегося воркера больше не учитываются
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
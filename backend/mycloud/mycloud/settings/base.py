@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'cloud_storage',
     'rest_framework',
     'rest_framework.authtoken',
@@ -29,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cloud_storage.middleware.request_id_middleware',
+    'cloud_storage.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -68,9 +71,34 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Соединение живет DB_CONN_MAX_AGE секунд и переиспользуется следующими
+        # запросами того же процесса (0 - новое соединение на каждый запрос);
+        # перед повторным использованием проверяется, что оно не разорвано
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() == 'true',
+        'OPTIONS': {},
     }
 }
 
+# Пул соединений psycopg 3 (pip install "psycopg[binary,pool]"): каждый
+# процесс держит от DB_POOL_MIN_SIZE до DB_POOL_MAX_SIZE открытых соединений
+# и выдает их запросам. С пулом CONN_MAX_AGE не используется.
+if os.getenv('DB_POOL', 'False').lower() == 'true':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        # Сколько секунд запрос ждет свободное соединение
+        'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+    }
+
+# Подключение через PgBouncer в режиме pool_mode = transaction: соединение
+# с сервером выдается только на время транзакции, поэтому серверные курсоры
+# (QuerySet.iterator()) отключаются. Подготовленные выражения Django
+# по умолчанию не использует.
+if os.getenv('DB_PGBOUNCER', 'False').lower() == 'true':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,6 +129,132 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Отдача файлов: django (через воркер), nginx (X-Accel-Redirect), apache (X-Sendfile)
+FILE_DELIVERY_BACKEND = os.getenv('FILE_DELIVERY_BACKEND', 'django')
+# Префикс internal-location в nginx, указывающего на MEDIA_ROOT
+FILE_DELIVERY_INTERNAL_PREFIX = os.getenv('FILE_DELIVERY_INTERNAL_PREFIX', '/protected/')
+
+# Асинхронная отдача файлов (имеет смысл только при запуске под ASGI-сервером)
+ASYNC_FILE_SERVING = os.getenv('ASYNC_FILE_SERVING', 'False').lower() == 'true'
+
+# Квота хранилища по умолчанию (байты), 0 - без ограничений
+DEFAULT_STORAGE_QUOTA = int(os.getenv('DEFAULT_STORAGE_QUOTA', '0'))
+
+# Статистика скачиваний копится в памяти и сбрасывается в БД раз в N секунд
+# (0 - писать сразу при каждом скачивании)
+DOWNLOAD_STATS_FLUSH_INTERVAL = int(os.getenv('DOWNLOAD_STATS_FLUSH_INTERVAL', '10'))
+
+# Максимальное число файлов в одном архиве при массовом скачивании
+ARCHIVE_MAX_FILES = int(os.getenv('ARCHIVE_MAX_FILES', '10000'))
+
+# Массовые операции: максимум файлов в одном запросе
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '10000'))
+
+# Хранилище содержимого файлов: local (MEDIA_ROOT) или s3 (S3-совместимое,
+# в том числе MinIO). Временные файлы загрузок всегда пишутся в MEDIA_ROOT.
+FILE_STORAGE_BACKEND = os.getenv('FILE_STORAGE_BACKEND', 'local')
+
+S3_BUCKET = os.getenv('S3_BUCKET', '')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL', '')
+S3_REGION = os.getenv('S3_REGION', '')
+S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID', '')
+S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY', '')
+# path - для MinIO и других хранилищ без DNS-имен бакетов
+S3_ADDRESSING_STYLE = os.getenv('S3_ADDRESSING_STYLE', 'path')
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '20'))
+# Файлы больше порога отправляются multipart-загрузкой частями по CHUNKSIZE
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', str(16 * 1024 * 1024)))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv('S3_MULTIPART_CHUNKSIZE', str(16 * 1024 * 1024)))
+S3_MULTIPART_CONCURRENCY = int(os.getenv('S3_MULTIPART_CONCURRENCY', '4'))
+# Скачивание перенаправлением на подписанную ссылку (время жизни в секундах)
+S3_PRESIGNED_URLS = os.getenv('S3_PRESIGNED_URLS', 'True').lower() == 'true'
+S3_PRESIGNED_EXPIRY = int(os.getenv('S3_PRESIGNED_EXPIRY', '300'))
+
+# Превью изображений и PDF: дисковый кеш с вытеснением давно не
+# использованных и размер исходного файла, до которого превью строится
+PREVIEW_CACHE_DIR = os.getenv('PREVIEW_CACHE_DIR', str(BASE_DIR / 'preview_cache'))
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv('PREVIEW_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+PREVIEW_MAX_SOURCE_SIZE = int(os.getenv('PREVIEW_MAX_SOURCE_SIZE', str(100 * 1024 * 1024)))
+PREVIEW_PDF_TIMEOUT = int(os.getenv('PREVIEW_PDF_TIMEOUT', '30'))
+# Через сколько секунд повторить запрос превью, которое еще строится
+PREVIEW_RETRY_AFTER = int(os.getenv('PREVIEW_RETRY_AFTER', '2'))
+
+# Сжатие текстовых файлов при отдаче через Django (gzip, br, zstd по
+# Accept-Encoding) для файлов не меньше COMPRESSION_MIN_SIZE байт.
+# PRECOMPRESS_ENCODINGS - кодировки, сжатые копии в которых сохраняются при
+# загрузке, через запятую (например, "gzip,br,zstd"); пусто - сжимать на лету
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+PRECOMPRESS_ENCODINGS = [
+    encoding.strip()
+    for encoding in os.getenv('PRECOMPRESS_ENCODINGS', '').split(',')
+    if encoding.strip()
+]
+
+# Фоновые задачи (manage.py run_jobs). JOBS_EAGER=True выполняет задачи
+# сразу после фиксации транзакции без воркера - только для разработки.
+# Упавшая задача повторяется через JOBS_RETRY_DELAY * 2^(попытка-1) секунд,
+# но не реже раза в JOBS_RETRY_MAX_DELAY; задача, которую воркер держит
+# дольше JOBS_LOCK_TIMEOUT секунд, считается упавшей попыткой
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False').lower() == 'true'
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', '10'))
+JOBS_RETRY_MAX_DELAY = int(os.getenv('JOBS_RETRY_MAX_DELAY', '3600'))
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', '3600'))
+# Сколько дней хранить записи выполненных и упавших задач
+JOBS_RETENTION_DAYS = int(os.getenv('JOBS_RETENTION_DAYS', '7'))
+
+# Незавершенная загрузка по частям отменяется через UPLOAD_SESSION_TTL секунд
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', str(72 * 60 * 60)))
+
+# Кеш: Redis (или совместимый сервер, например Valkey), если задан REDIS_URL
+# (redis://127.0.0.1:6379/1), иначе память процесса. При нескольких
+# процессах Gunicorn нужен Redis: сброс записей в памяти одного процесса
+# не виден остальным до истечения *_CACHE_TIMEOUT
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'mycloud',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Время жизни кеша токенов, файлов по специальным ссылкам и ответа
+# current_user (секунды)
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', '300'))
+SHARE_LINK_CACHE_TIMEOUT = int(os.getenv('SHARE_LINK_CACHE_TIMEOUT', '300'))
+CURRENT_USER_CACHE_TIMEOUT = int(os.getenv('CURRENT_USER_CACHE_TIMEOUT', '60'))
+
+# Метрики Prometheus (GET /metrics, нужен пакет prometheus_client).
+# Prometheus передает токен в Authorization: Bearer <токен>; без токена
+# метрики видны только сотрудникам, вошедшим в админку
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Скорость передачи учитывается для загрузок и скачиваний от этого размера
+METRICS_THROUGHPUT_MIN_BYTES = int(os.getenv('METRICS_THROUGHPUT_MIN_BYTES', str(1024 * 1024)))
+
+# Админка: для таблиц больше этого числа строк (по статистике PostgreSQL)
+# число строк в списке оценивается, а не считается COUNT(*)
+ADMIN_ESTIMATED_COUNT_MIN = int(os.getenv('ADMIN_ESTIMATED_COUNT_MIN', '100000'))
+
+# Подписанные ссылки на файлы (POST /api/files/<id>/share-tokens/): срок
+# действия по умолчанию и максимальный (секунды)
+SHARE_TOKEN_DEFAULT_TTL = int(os.getenv('SHARE_TOKEN_DEFAULT_TTL', str(24 * 60 * 60)))
+SHARE_TOKEN_MAX_TTL = int(os.getenv('SHARE_TOKEN_MAX_TTL', str(30 * 24 * 60 * 60)))
+# Сколько секунд внешний кеш (nginx, CDN) может отдавать ответ по ссылке -
+# столько же отозванная ссылка может работать через этот кеш
+SHARE_TOKEN_CACHE_MAX_AGE = int(os.getenv('SHARE_TOKEN_CACHE_MAX_AGE', '300'))
+# Время кеширования проверки отзыва для неотозванной ссылки (секунды)
+SHARE_TOKEN_REVOCATION_CACHE_TIMEOUT = int(os.getenv('SHARE_TOKEN_REVOCATION_CACHE_TIMEOUT', '60'))
+
+# Загрузка файлов по частям: максимальный размер одной части (байты)
+UPLOAD_CHUNK_MAX_SIZE = int(os.getenv('UPLOAD_CHUNK_MAX_SIZE', str(64 * 1024 * 1024)))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -110,7 +264,7 @@ AUTH_USER_MODEL = 'cloud_storage.User'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'cloud_storage.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -146,6 +300,45 @@ CORS_ALLOW_HEADERS = [
 ]
 
 # Logging configuration
+# Записи передаются в файл и консоль фоновым потоком (cloud_storage.log),
+# в файл - в JSON по одной на строку. Ротация файла: external - внешним
+# logrotate (файл переоткрывается после переименования; безопасно, когда
+# в файл пишут несколько процессов Gunicorn и run_jobs), size - по размеру
+# LOG_MAX_BYTES, time - по времени LOG_ROTATE_WHEN. size и time ротируют
+# файл в каждом процессе отдельно - только для одного процесса
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FILE = os.getenv('LOG_FILE', str(BASE_DIR / 'logs' / 'django.log'))
+LOG_ROTATION = os.getenv('LOG_ROTATION', 'external')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', 'midnight')
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '10'))
+# Максимум записей в очереди; при переполнении записи отбрасываются
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# Доля записей частых событий, которая попадает в журнал, например
+# "download=0.1,view=0.1,share_link=0.1" (события download, view, share_link)
+LOG_SAMPLE_RATES = {
+    event.strip(): float(rate)
+    for event, _, rate in (
+        item.partition('=') for item in os.getenv('LOG_SAMPLE_RATES', '').split(',')
+    )
+    if event.strip()
+}
+
+if LOG_ROTATION == 'time':
+    LOG_FILE_HANDLER = {
+        'class': 'logging.handlers.TimedRotatingFileHandler',
+        'when': LOG_ROTATE_WHEN,
+        'backupCount': LOG_BACKUP_COUNT,
+    }
+elif LOG_ROTATION == 'size':
+    LOG_FILE_HANDLER = {
+        'class': 'logging.handlers.RotatingFileHandler',
+        'maxBytes': LOG_MAX_BYTES,
+        'backupCount': LOG_BACKUP_COUNT,
+    }
+else:
+    LOG_FILE_HANDLER = {'class': 'logging.handlers.WatchedFileHandler'}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -158,6 +351,15 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'cloud_storage.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'cloud_storage.log.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
     },
     'handlers': {
         'console': {
@@ -165,24 +367,37 @@ LOGGING = {
             'formatter': 'verbose',
         },
         'file': {
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'django.log',
-            'formatter': 'verbose',
+            **LOG_FILE_HANDLER,
+            'filename': LOG_FILE,
+            'formatter': 'json',
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+        'queue': {
+            'class': 'cloud_storage.log.BackgroundHandler',
+            'output': 'cloud_storage.log.output',
+            'queue_size': LOG_QUEUE_SIZE,
+            'filters': ['sampling'],
         },
     },
     'root': {
-        'handlers': ['console'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
             'propagate': False,
         },
         'cloud_storage': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        # Обработчики, в которые пишет фоновый поток обработчика queue
+        'cloud_storage.log.output': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
             'propagate': False,
         },
     },
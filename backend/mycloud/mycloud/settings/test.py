@@ -0,0 +1,46 @@
+"""
+Настройки для тестов
+
+python manage.py test cloud_storage --settings=mycloud.settings.test
+
+БД - SQLite, файлы, превью и журнал - во временном каталоге. Фоновые задачи
+сами не выполняются: тесты запускают их явно.
+"""
+import atexit
+import shutil
+import tempfile
+
+from .dev import *
+
+TEST_ROOT = tempfile.mkdtemp(prefix='mycloud-test-')
+atexit.register(shutil.rmtree, TEST_ROOT, ignore_errors=True)
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(TEST_ROOT, 'db.sqlite3'),
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+MEDIA_ROOT = os.path.join(TEST_ROOT, 'media')
+PREVIEW_CACHE_DIR = os.path.join(TEST_ROOT, 'preview_cache')
+FILE_STORAGE_BACKEND = 'local'
+FILE_DELIVERY_BACKEND = 'django'
+ASYNC_FILE_SERVING = False
+DEFAULT_STORAGE_QUOTA = 0
+DOWNLOAD_STATS_FLUSH_INTERVAL = 0
+PRECOMPRESS_ENCODINGS = []
+JOBS_EAGER = False
+METRICS_TOKEN = ''
+
+LOGGING['handlers']['file']['filename'] = os.path.join(TEST_ROOT, 'test.log')
+# Ожидаемые ошибки и 404 не засоряют вывод тестов
+LOGGING['handlers']['console']['level'] = 'CRITICAL'
@@ -137,8 +137,15 @@ export const api = {
 
   // Получить список файлов
   getFiles: async (userId = null) => {
-    const url = userId ? `/files/?user_id=${userId}` : '/files/';
-    return apiRequest(url);
+    let url = userId ? `/files/?user_id=${userId}` : '/files/';
+    const files = [];
+    // Список отдается страницами, next - ссылка на следующую
+    while (url) {
+      const page = await apiRequest(url);
+      files.push(...page.results);
+      url = page.next ? `/files/${new URL(page.next).search}` : null;
+    }
+    return files;
   },
 
   // Загрузить файл